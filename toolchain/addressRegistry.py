@@ -0,0 +1,236 @@
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+from clientPool import getNetwork, isEphemeral
+from reportSink import lockedFile
+
+REGISTRY_VERSION = 1
+REGISTRY_DIR = "../contracts"
+
+def networkSuffix(network):
+    # ghostnet keeps the historical names, every other backend (sandbox,
+    # mock, custom node) gets its own files
+    if network == "ghostnet":
+        return ""
+    return "." + re.sub(r'[^A-Za-z0-9_-]+', '_', network).strip('_')
+
+def registryFile(network=None, registryDir=REGISTRY_DIR):
+    return f"{registryDir}/addressRegistry{networkSuffix(network or getNetwork())}.json"
+
+def legacyFile(network=None, registryDir=REGISTRY_DIR):
+    return f"{registryDir}/addressList{networkSuffix(network or getNetwork())}.json"
+
+def timestamp():
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+##Registry
+class AddressRegistry:
+    # Every deployment of every contract on one network, with its code hash
+    # and time. "current" maps a contract name to the address traces and
+    # calls use (the latest regular deploy); aliases name any other instance
+    # (bulk deploys register "<Contract>#<n>").
+    # Reads are served from memory and reloaded only when the file changes;
+    # updates take a process and file lock, re-read the file, and replace it
+    # atomically, so parallel deployers never lose each other's entries.
+    # Without registryFile (the mock chain) the registry is memory only.
+    def __init__(self, registryFile, network, legacyFile=None):
+        self.registryFile = Path(registryFile) if registryFile else None
+        self.lockFile = f"{registryFile}.lock" if registryFile else None
+        self.network = network
+        self.legacyFile = legacyFile
+        self.lock = threading.Lock()
+        self.data = None
+        self.stamp = None
+        self.addresses = {}
+
+    def _empty(self):
+        return {"version": REGISTRY_VERSION, "network": self.network, "deployments": {}, "current": {}, "aliases": {}}
+
+    def _fileStamp(self):
+        if self.registryFile is None:
+            return None
+        try:
+            stat = self.registryFile.stat()
+            return (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+
+    def _read(self):
+        data = self._empty()
+        if self.registryFile is None:
+            return data
+        try:
+            with open(self.registryFile, 'r', encoding='utf-8') as file:
+                data.update(json.load(file))
+        except FileNotFoundError:
+            self._importLegacy(data)
+        return data
+
+    def _importLegacy(self, data):
+        # One-time import of addressList(.network).json: name -> address.
+        # The file is never written again: it is a frozen seed, the
+        # registry is the source of truth from then on.
+        if not self.legacyFile or not Path(self.legacyFile).exists():
+            return
+        with open(self.legacyFile, 'r', encoding='utf-8') as file:
+            legacy = json.load(file)
+        imported = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(Path(self.legacyFile).stat().st_mtime))
+        for name, address in legacy.items():
+            data["deployments"].setdefault(name, []).append(
+                {"address": address, "network": self.network, "codeHash": None, "timestamp": imported})
+            data["current"][name] = address
+
+    def _index(self):
+        # Must be called holding self.lock: address -> (name, deployment)
+        self.addresses = {entry["address"]: (name, entry)
+                          for name, entries in self.data["deployments"].items() for entry in entries}
+
+    def _load(self):
+        # Must be called holding self.lock
+        stamp = self._fileStamp()
+        if self.data is None or stamp != self.stamp:
+            self.data = self._read()
+            self.stamp = stamp
+            self._index()
+        return self.data
+
+    def _update(self, change):
+        # change(data) runs on the latest file content under both locks
+        if self.registryFile is None:
+            with self.lock:
+                result = change(self._load())
+                self._index()
+                return result
+        with lockedFile(self.lockFile, 'a'), self.lock:
+            self.stamp = None
+            data = self._load()
+            result = change(data)
+            self.registryFile.parent.mkdir(parents=True, exist_ok=True)
+            tmpFile = f"{self.registryFile}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmpFile, 'w', encoding='utf-8') as file:
+                json.dump(data, file, indent=4)
+            os.replace(tmpFile, self.registryFile)
+            self.stamp = self._fileStamp()
+            self._index()
+            return result
+
+    ##Updates
+    def register(self, name, address, codeHash=None, wallet=None, current=True, aliases=()):
+        # -> the address name pointed to before, if any
+        entry = {"address": address, "network": self.network, "codeHash": codeHash, "timestamp": timestamp()}
+        if wallet is not None:
+            entry["wallet"] = str(wallet)
+
+        def change(data):
+            data["deployments"].setdefault(name, []).append(entry)
+            previous = data["current"].get(name)
+            if current:
+                data["current"][name] = address
+            for alias in aliases:
+                data["aliases"][alias] = address
+            return previous
+        return self._update(change)
+
+    def registerInstances(self, name, instances, codeHash=None):
+        # instances: [(address, wallet)] from a bulk deploy. They are
+        # numbered after the existing "<name>#<n>" aliases and do not change
+        # the current address. -> the aliases, in order
+        def change(data):
+            prefix = f"{name}#"
+            number = 1 + max((int(a[len(prefix):]) for a in data["aliases"] if a.startswith(prefix) and a[len(prefix):].isdigit()), default=0)
+            aliases = []
+            for address, wallet in instances:
+                alias = f"{prefix}{number}"
+                number += 1
+                entry = {"address": address, "network": self.network, "codeHash": codeHash,
+                         "timestamp": timestamp(), "alias": alias}
+                if wallet is not None:
+                    entry["wallet"] = str(wallet)
+                data["deployments"].setdefault(name, []).append(entry)
+                data["aliases"][alias] = address
+                aliases.append(alias)
+            return aliases
+        return self._update(change)
+
+    def alias(self, alias, address):
+        def change(data):
+            data["aliases"][alias] = address
+        self._update(change)
+
+    ##Lookups
+    def lookup(self, nameOrAlias):
+        # Current address of a contract name, or the address of an alias
+        with self.lock:
+            data = self._load()
+            return data["current"].get(nameOrAlias) or data["aliases"].get(nameOrAlias)
+
+    def deployment(self, address):
+        # -> (name, deployment entry) or None
+        with self.lock:
+            self._load()
+            return self.addresses.get(address)
+
+    def deployments(self, name):
+        with self.lock:
+            return list(self._load()["deployments"].get(name, []))
+
+    def addressMap(self):
+        # {contract name: current address}; aliased instances are left out so
+        # that contract selectors list each contract once
+        with self.lock:
+            return dict(self._load()["current"])
+
+    def aliasMap(self):
+        # {alias: address}, e.g. the "<Contract>#<n>" instances of a bulk deploy
+        with self.lock:
+            return dict(self._load()["aliases"])
+
+
+_registries = {}
+_registriesLock = threading.Lock()
+
+def getRegistry(network=None):
+    # One registry per network, shared by every thread of the process
+    network = network or getNetwork()
+    with _registriesLock:
+        registry = _registries.get(network)
+        if registry is None:
+            if isEphemeral(network):
+                # its addresses would point to nothing in the next process
+                registry = AddressRegistry(None, network)
+            else:
+                registry = AddressRegistry(registryFile(network), network, legacyFile=legacyFile(network))
+            _registries[network] = registry
+        return registry
+
+def main():
+    parser = argparse.ArgumentParser(description="Deployed contract addresses of a network.")
+    parser.add_argument("--network", help="defaults to TOOLCHAIN_NETWORK")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="current address of every contract, and the aliases")
+    history = subparsers.add_parser("history", help="every deployment of a contract")
+    history.add_argument("contract")
+    lookup = subparsers.add_parser("lookup", help="address of a contract name or alias")
+    lookup.add_argument("name")
+    alias = subparsers.add_parser("alias", help="name an address")
+    alias.add_argument("alias")
+    alias.add_argument("address")
+    args = parser.parse_args()
+
+    registry = getRegistry(args.network)
+    if args.command == "list":
+        print(json.dumps({"contracts": registry.addressMap(), "aliases": registry.aliasMap()}, indent=4))
+    elif args.command == "history":
+        print(json.dumps(registry.deployments(args.contract), indent=4))
+    elif args.command == "lookup":
+        print(registry.lookup(args.name))
+    elif args.command == "alias":
+        registry.alias(args.alias, args.address)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+import asyncio
+import json
+import threading
+from http import HTTPStatus
+
+from pytezos.crypto.encoding import base58_decode, base58_encode
+from pytezos.michelson.forge import forge_base58
+from pytezos.operation import DEFAULT_GAS_RESERVE, DEFAULT_BURN_RESERVE, DEFAULT_OPERATIONS_TTL, MAX_OPERATIONS_TTL
+from pytezos.operation.fees import calculate_fee, FeeThresholds
+from pytezos.rpc.kind import validation_passes
+from pytezos.operation.result import OperationResult
+from pytezos.rpc.node import RpcError, RpcForbiddenError, RpcNotFoundError
+
+from clientPool import SessionRpcNode, POOL_MAXSIZE, RPC_TIMEOUT
+from confirmationTracker import getTracker, shellKey, TIMEOUT
+from estimateCache import getEstimates
+from spans import span, carryContext
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Retries of a 5xx answer the node marks temporary, as pytezos' RpcNode does
+RETRY_ATTEMPTS = 6
+RETRY_DELAY = 0.25
+RETRY_MAX_DELAY = 2.0
+
+##Transport
+class ThreadTransport:
+    # Any pytezos RpcNode, the pooled session of clientPool or the mock node:
+    # the blocking call runs on the loop's worker threads
+    def __init__(self, node):
+        self.node = node
+
+    async def request(self, method, path, params=None, data=None):
+        if method == "GET":
+            return await asyncio.to_thread(self.node.get, path, params)
+        return await asyncio.to_thread(self.node.post, path, params, data)
+
+    async def close(self):
+        pass
+
+class AiohttpTransport:
+    # An HTTP node read without threads: the requests of every wallet share
+    # one aiohttp session on the loop. Answers and errors are the ones of
+    # pytezos' RpcNode.
+    def __init__(self, uri, headers=None):
+        self.uri = uri.rstrip("/")
+        self.headers = {"content-type": "application/json", "user-agent": "PyTezos", **(headers or {})}
+        self.session = None
+
+    async def request(self, method, path, params=None, data=None):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=POOL_MAXSIZE),
+                                                 timeout=aiohttp.ClientTimeout(total=RPC_TIMEOUT))
+        # requests sends True as "True", aiohttp refuses booleans
+        params = {name: str(value) if isinstance(value, bool) else value for name, value in (params or {}).items()}
+        delay = RETRY_DELAY
+        for attempt in range(RETRY_ATTEMPTS):
+            async with self.session.request(method, self.uri + path, params=params, headers=self.headers,
+                                            json=data if method == "POST" else None) as response:
+                status, text = response.status, await response.text()
+                isJson = response.content_type == "application/json"
+            if status >= 500 and attempt < RETRY_ATTEMPTS - 1 and isTransient(text, isJson):
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX_DELAY)
+                continue
+            break
+
+        if status in (401, 403):
+            raise RpcForbiddenError(f"{HTTPStatus(status).phrase}: {path}")
+        if status == 404:
+            raise RpcNotFoundError(f"Not found: {path}")
+        if status != 200:
+            raise responseError(text, isJson)
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return text
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+def jsonErrors(text, isJson):
+    if not isJson:
+        return None
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return None
+
+def isTransient(text, isJson):
+    # Octez infrastructure hiccups, never the protocol's own errors
+    errors = jsonErrors(text, isJson)
+    if not isinstance(errors, list):
+        return False
+    if any(isinstance(e, dict) and e.get("id", "").startswith("proto.") for e in errors):
+        return False
+    return any(isinstance(e, dict) and e.get("kind") == "temporary" for e in errors)
+
+def responseError(text, isJson):
+    # RpcError.from_response for an aiohttp answer
+    errors = jsonErrors(text, isJson)
+    if isinstance(errors, list):
+        return RpcError.from_errors(errors)
+    return RpcError(errors if errors is not None else text)
+
+def newTransport(node):
+    # HTTP nodes get native async I/O when aiohttp is installed; the mock
+    # node, and any node without it, run on the loop's worker threads
+    if aiohttp is not None and isinstance(node, SessionRpcNode):
+        return AiohttpTransport(node.uri[0], getattr(node, "headers", None))
+    return ThreadTransport(node)
+
+##Async RPC
+class AsyncRpc:
+    # The subset of the Tezos RPC used by the toolchain. Chain constants, the
+    # sandbox flag and the mempool fee thresholds are read once per node.
+    def __init__(self, transport):
+        self.transport = transport
+        self.constants = None
+        self.sandboxed = None
+        self.feeThresholds = None
+
+    async def get(self, path, params=None):
+        return await self.transport.request("GET", path, params)
+
+    async def post(self, path, data, params=None):
+        return await self.transport.request("POST", path, params, data)
+
+    async def header(self):
+        return await self.get("/chains/main/blocks/head/header")
+
+    async def blockHash(self, blockId):
+        return await self.get(f"/chains/main/blocks/{blockId}/hash")
+
+    async def getConstants(self):
+        if self.constants is None:
+            self.constants = await self.get("/chains/main/blocks/head/context/constants")
+        return self.constants
+
+    async def operationsTtl(self):
+        if self.sandboxed is None:
+            version = await self.get("/version")
+            self.sandboxed = 'SANDBOXED' in version['network_version']['chain_name']
+        return MAX_OPERATIONS_TTL if self.sandboxed else DEFAULT_OPERATIONS_TTL
+
+    async def counter(self, address):
+        return int(await self.get(f"/chains/main/blocks/head/context/contracts/{address}/counter"))
+
+    async def script(self, address):
+        return await self.get(f"/chains/main/blocks/head/context/contracts/{address}/script")
+
+    async def runOperation(self, opg):
+        return await self.post("/chains/main/blocks/head/helpers/scripts/run_operation", {
+            "operation": {
+                "branch": opg.branch,
+                "contents": opg.contents,
+                "signature": base58_encode(b'0' * 64, b'sig').decode()
+            },
+            "chain_id": opg.chain_id
+        })
+
+    async def mempoolFilter(self):
+        return await self.get("/chains/main/mempool/filter")
+
+    async def inject(self, payloadHex, _async=False):
+        return await self.post("/injection/operation", payloadHex, params={"async": _async})
+
+
+_rpcs = {}
+_rpcsLock = threading.Lock()
+
+def getAsyncRpc(client):
+    # One AsyncRpc per node, shared by every wallet
+    key = shellKey(client)
+    with _rpcsLock:
+        rpc = _rpcs.get(key)
+        if rpc is None:
+            rpc = AsyncRpc(newTransport(client.shell.node))
+            _rpcs[key] = rpc
+        return rpc
+
+##Event loop
+_loop = None
+_loopLock = threading.Lock()
+
+def eventLoop():
+    # A single background loop owns the sessions; the sync wrappers of
+    # contractUtils submit their coroutines to it from any thread
+    global _loop
+    with _loopLock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="async-rpc", daemon=True).start()
+        return _loop
+
+def runSync(coroutine):
+    # the caller's span attributes follow the coroutine onto the loop
+    return asyncio.run_coroutine_threadsafe(carryContext(coroutine), eventLoop()).result()
+
+##Operations
+async def fillAsync(rpc, opg):
+    # Same fields as OperationGroup.fill, read concurrently
+    source = opg.key.public_key_hash()
+    with span("fill"):
+        ttl = await rpc.operationsTtl()
+        header, branch, constants, counter = await asyncio.gather(
+            rpc.header(),
+            rpc.blockHash(f"head~{MAX_OPERATIONS_TTL - ttl}"),
+            rpc.getConstants(),
+            rpc.counter(source)
+        )
+
+    gasLimit = int(constants["hard_gas_limit_per_operation"]) // len(opg.contents)
+    storageLimit = int(constants["hard_storage_limit_per_operation"]) // len(opg.contents)
+    contents = []
+    for index, content in enumerate(opg.contents):
+        content = dict(content, source=source, counter=str(counter + 1 + index), fee="0",
+                       gas_limit=str(gasLimit), storage_limit=str(storageLimit))
+        contents.append(content)
+    return opg._spawn(contents=contents, protocol=header["protocol"], chain_id=header["chain_id"], branch=branch)
+
+async def feeThresholds(rpc, opg):
+    # context.get_fee_thresholds without the blocking read of the node's
+    # mempool filter. Every operation spawns a new context, so the node's
+    # thresholds are cached on the rpc; explicit ones are taken as they are.
+    if opg.context.fee_thresholds != 'node':
+        return opg.context.fee_thresholds
+    if rpc.feeThresholds is None:
+        rpc.feeThresholds = FeeThresholds.from_mempool_filter(await rpc.mempoolFilter())
+    return rpc.feeThresholds
+
+def applyLimits(opg, limits, thresholds):
+    # limits: [(gasLimit, storageLimit)] per content; the group fee goes to
+    # the first content, as autofill does
+    extraSize = 32 + 64
+    contents = []
+    fee = 0
+    for content, (gasLimit, storageLimit) in zip(opg.contents, limits):
+        content = dict(content, gas_limit=str(gasLimit), storage_limit=str(storageLimit), fee="0")
+        content.pop("metadata", None)
+        fee += calculate_fee(content, gasLimit, extra_size=1 + extraSize // len(opg.contents), thresholds=thresholds)
+        contents.append(content)
+    contents[0]["fee"] = str(fee)
+    return opg._spawn(contents=contents)
+
+async def autofillAsync(rpc, opg):
+    # Simulation through run_operation, then limits and fee like autofill
+    with span("simulate"):
+        result = await rpc.runOperation(opg)
+    if not OperationResult.is_applied(result):
+        raise RpcError.from_errors(OperationResult.errors(result))
+
+    limits = []
+    for content in result["contents"]:
+        if validation_passes[content["kind"]] != 3:
+            limits.append((0, 0))
+            continue
+        gasLimit = OperationResult.consumed_gas(content)
+        storageLimit = OperationResult.paid_storage_size_diff(content) + OperationResult.burned(content)
+        if content["kind"] in ("origination", "transaction"):
+            gasLimit += DEFAULT_GAS_RESERVE
+            storageLimit += DEFAULT_BURN_RESERVE
+        limits.append((gasLimit, storageLimit))
+    return applyLimits(opg, limits, await feeThresholds(rpc, opg))
+
+def signForged(opg):
+    # OperationGroup.sign, with the bytes forged once and reused for the
+    # injected payload -> (signed group, payload hex)
+    with span("forge"):
+        forged = bytes.fromhex(opg.forge())
+    with span("sign"):
+        watermark = b'\x03' if validation_passes[opg.contents[0]['kind']] else b'\x02' + base58_decode(opg.chain_id.encode())
+        signature = opg.key.sign(message=watermark + forged, generic=True)
+    return opg._spawn(signature=signature), (forged + forge_base58(signature)).hex()
+
+async def injectAsync(rpc, payload):
+    with span("inject"):
+        return await rpc.inject(payload)
+
+async def sendAsync(rpc, opg, estimateKey=None):
+    # Fill, estimate, sign and inject. With an estimateKey a cached estimate
+    # replaces the simulation; a rejected one is dropped and the operation
+    # simulated. Returns (signed group, key if the cached estimate was used).
+    estimates = getEstimates()
+    filled = await fillAsync(rpc, opg)
+
+    # the estimate file is read and written off the loop
+    estimate = await asyncio.to_thread(estimates.lookup, estimateKey) if estimateKey else None
+    if estimate is not None:
+        signed, payload = signForged(applyLimits(filled, [estimate], await feeThresholds(rpc, filled)))
+        try:
+            await injectAsync(rpc, payload)
+            return signed, estimateKey
+        except Exception as e:
+            print(f"Cached estimate rejected ({e}), simulating again")
+            await asyncio.to_thread(estimates.invalidate, estimateKey)
+
+    signed, payload = signForged(await autofillAsync(rpc, filled))
+    if estimateKey:
+        content = signed.contents[0]
+        await asyncio.to_thread(estimates.store, estimateKey, content["gas_limit"], content["storage_limit"])
+    await injectAsync(rpc, payload)
+    return signed, None
+
+async def waitForOperationAsync(client, opHash, timeout=TIMEOUT):
+    # Awaits the shared confirmation tracker: no thread per pending operation
+    try:
+        return await asyncio.wrap_future(getTracker(client).watch(opHash, timeout=timeout))
+    except TimeoutError:
+        return None
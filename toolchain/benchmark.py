@@ -0,0 +1,194 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from bulkCompile import compileAll, CONTRACTS_PATH, MAX_JOBS
+from buildCache import ARTIFACTS
+from clientPool import setNetwork, getNetwork
+from csvUtils import csvReader
+from folderScan import folderScan
+from jsonUtils import jsonReader
+from execution import deployContract, executionSetupAll, jsonRows
+from resultsStore import getStore, median, percentile
+from traceExecutor import isFailed
+
+BENCHMARK_FILE = "benchmark.json"
+RUNS = 5
+METRICS = ["BakerFee", "EstimatedFee", "Gas", "Storage", "TotalCost", "Weight", "Latency"]
+
+##Discovery
+def benchmarkTraces(contractsPath=CONTRACTS_PATH, only=None):
+    # Contracts of the archive with a trace in execution_traces/; the CSV
+    # trace wins over the JSON one
+    contracts = set(folderScan(contractsPath))
+    traces = {c: jsonRows(rows) for c, rows in (jsonReader() or {}).items()}
+    traces.update(csvReader() or {})
+    return {c: rows for c, rows in sorted(traces.items())
+            if c in contracts and (not only or c in only)}
+
+def gitCommit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+##Runs
+def runOnce(contract, rows, wallet, balance, mode):
+    # One fresh instance: origination, then the whole trace on it.
+    # -> [sample], origination first, steps in trace order
+    start_time = time.time()
+    contractInfo = deployContract(contract, wallet, balance)
+    contractInfo["Latency"] = round(time.time() - start_time, 3)
+    samples = [dict(contractInfo, step="origination", entryPoint="origination")]
+
+    # same-contract steps run one after the other: the time between two
+    # completions is the latency of the later step, the first one is timed
+    # from its submission (the trace planning is left out)
+    doneAt = {}
+    last = [time.time()]
+    def started():
+        last[0] = time.time()
+    def stepDone(contract, stepId, result):
+        now = time.time()
+        doneAt[stepId] = round(now - last[0], 3)
+        last[0] = now
+
+    results = executionSetupAll({contract: rows}, mode=mode, onStepDone=stepDone, onStart=started)[contract]
+    for stepId, row in rows.items():
+        result = results.get(stepId)
+        if isFailed(result):
+            samples.append({"step": stepId, "entryPoint": row[0], "error": (result or {}).get("error", "failed")})
+            continue
+        samples.append(dict(result, step=stepId, Latency=doneAt.get(stepId)))
+    return samples
+
+def roundStat(value, digits=6):
+    # medians and percentiles interpolate: drop the float noise
+    return round(value, digits) if isinstance(value, float) else value
+
+def summarize(values):
+    values = sorted(v for v in values if v is not None)
+    return {
+        "min": values[0] if values else None,
+        "median": roundStat(median(values)),
+        "p95": roundStat(percentile(values, 0.95)),
+        "max": values[-1] if values else None
+    }
+
+def benchmarkContract(contract, rows, runs=RUNS, wallet="1", balance=0, mode="inject"):
+    steps = {}
+    store = getStore()
+    for run in range(runs):
+        print(f"{contract}: run {run + 1}/{runs}")
+        try:
+            samples = runOnce(contract, rows, wallet, balance, mode)
+        except Exception as e:
+            print(f"{contract}: run {run + 1} failed: {e}")
+            samples = [{"step": "origination", "entryPoint": "origination", "error": str(e)}]
+
+        runId = store.newRun(f"benchmark {contract} {mode} {run + 1}/{runs}")
+        for sample in samples:
+            entry = steps.setdefault(str(sample["step"]), {"step": str(sample["step"]), "entrypoint": sample["entryPoint"],
+                                                           "failures": 0, "samples": {m: [] for m in METRICS}})
+            if "error" in sample:
+                entry["failures"] += 1
+                entry.setdefault("errors", []).append(sample["error"])
+                continue
+            for metric in METRICS:
+                entry["samples"][metric].append(sample.get(metric, 0 if metric == "Storage" else None))
+            if sample["step"] != "origination":
+                # simulated samples and the mock backend are kept apart from
+                # the node receipts of the shared history
+                store.recordCall(runId, dict(sample, contract=contract), mode=sample.get("mode", mode), network=getNetwork())
+
+    for entry in steps.values():
+        entry["stats"] = {metric: summarize(entry["samples"][metric]) for metric in METRICS}
+    return {"contract": contract, "runs": runs, "michelsonSize": michelsonSize(contract), "steps": list(steps.values())}
+
+def michelsonSize(contract):
+    michelson = Path(contract) / ARTIFACTS[0]
+    return michelson.stat().st_size if michelson.exists() else None
+
+def prepare(contracts, contractsPath=CONTRACTS_PATH, jobs=MAX_JOBS, compile=True):
+    # Compiled artifacts for every contract; a failed compilation falls
+    # back on artifacts already on disk
+    ready = {}
+    compiled = compileAll(contractsPath, jobs=jobs, contracts=set(contracts)) if compile else []
+    status = {r["contract"]: r["status"] for r in compiled}
+    for contract in contracts:
+        if all((Path(contract) / artifact).exists() for artifact in ARTIFACTS):
+            if status.get(contract, "cached") not in ("ok", "cached"):
+                print(f"{contract}: compilation {status[contract]}, using the artifacts on disk")
+            ready[contract] = True
+        else:
+            print(f"{contract}: not compiled, skipped")
+            ready[contract] = False
+    return ready
+
+def runBenchmark(runs=RUNS, only=None, wallet="1", balance=0, mode="inject", compile=True, contractsPath=CONTRACTS_PATH):
+    traces = benchmarkTraces(contractsPath, only)
+    ready = prepare(list(traces), contractsPath, compile=compile)
+    return {
+        "network": getNetwork(),
+        "mode": mode,
+        "runs": runs,
+        "commit": gitCommit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "contracts": [benchmarkContract(c, rows, runs, wallet, balance, mode) for c, rows in traces.items() if ready[c]],
+        "skipped": [c for c in traces if not ready[c]]
+    }
+
+##Output
+def formatTables(benchmark, metrics=METRICS):
+    # One Markdown table per metric: min/median/p95/max per step
+    lines = [f"Benchmark on {benchmark['network']} ({benchmark['mode']}), {benchmark['runs']} runs, commit {benchmark['commit']}"]
+    for metric in metrics:
+        lines += ["", f"### {metric}", "",
+                  "| Contract | Step | Entrypoint | Samples | Failed | min | median | p95 | max |",
+                  "|:---|:---|:---|---:|---:|---:|---:|---:|---:|"]
+        for result in benchmark["contracts"]:
+            for entry in result["steps"]:
+                values = entry["stats"][metric]
+                count = sum(1 for v in entry["samples"][metric] if v is not None)
+                lines.append(f"| {result['contract']} | {entry['step']} | {entry['entrypoint']} | {count} | {entry['failures']} | "
+                             f"{values['min']} | {values['median']} | {values['p95']} | {values['max']} |")
+    if benchmark["skipped"]:
+        lines += ["", "Skipped (not compiled): " + ", ".join(benchmark["skipped"])]
+    return "\n".join(lines)
+
+def saveBenchmark(benchmark, outputFile=BENCHMARK_FILE):
+    # Sorted keys and fixed indentation so two artifacts diff cleanly
+    with open(outputFile, 'w', encoding='utf-8') as file:
+        json.dump(benchmark, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run every contract trace N times and report cost and latency distributions.")
+    parser.add_argument("--network", help="ghostnet, sandbox, mock or an RPC URL")
+    parser.add_argument("--runs", type=int, default=RUNS)
+    parser.add_argument("--contract", action="append", help="only this contract, repeatable")
+    parser.add_argument("--wallet", default="1", help="wallet originating the instances")
+    parser.add_argument("--balance", type=int, default=0, help="initial balance in tez")
+    parser.add_argument("--mode", choices=["inject", "simulate"], default="inject")
+    parser.add_argument("--no-compile", action="store_true", help="use the artifacts already on disk")
+    parser.add_argument("--contracts-path", default=CONTRACTS_PATH)
+    parser.add_argument("--output", default=BENCHMARK_FILE)
+    parser.add_argument("--metric", action="append", choices=METRICS, help="tables to print (default all)")
+    args = parser.parse_args()
+    if args.network:
+        setNetwork(args.network)
+
+    # progress goes to stderr, the tables to stdout
+    with redirect_stdout(sys.stderr):
+        benchmark = runBenchmark(args.runs, args.contract, args.wallet, args.balance, args.mode,
+                                 compile=not args.no_compile, contractsPath=args.contracts_path)
+    saveBenchmark(benchmark, args.output)
+    print(formatTables(benchmark, args.metric or METRICS))
+    print(f"\nSaved to {args.output}")
+
+if __name__ == "__main__":
+    main()
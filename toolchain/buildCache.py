@@ -0,0 +1,176 @@
+import ast
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+MANIFEST_FILE = "build_manifest.json"
+ARTIFACTS = ["step_001_cont_0_contract.tz", "step_001_cont_0_storage.tz"]
+SCENARIO_RE = re.compile(r"test_scenario\(\s*[\"']([^\"']+)[\"']")
+
+_manifestLock = threading.Lock()
+
+def fileHash(path):
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+def smartpyVersion():
+    from importlib.metadata import version, PackageNotFoundError
+    for package in ("smartpy", "smartpy-tezos"):
+        try:
+            return version(package)
+        except PackageNotFoundError:
+            continue
+    return "unknown"
+
+##Build inputs
+def outputDir(contractPath):
+    # SmartPy writes the artifacts into ./<scenario name>/ (cwd = toolchain)
+    source = Path(contractPath).read_text(encoding='utf-8')
+    match = SCENARIO_RE.search(source)
+    return match.group(1) if match else Path(contractPath).stem
+
+def callsInput(path):
+    # True if the module calls the input builtin (input(...) or
+    # builtins.input(...)) and does not define its own input at module
+    # level; comments, strings and methods named input do not count.
+    # Unparsable sources are assumed to.
+    try:
+        tree = ast.parse(Path(path).read_text(encoding='utf-8'))
+    except (SyntaxError, ValueError):
+        return True
+
+    shadowed = False
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            shadowed |= node.name == "input"
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            shadowed |= any((alias.asname or alias.name) == "input" for alias in node.names)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            shadowed |= any(isinstance(t, ast.Name) and t.id == "input" for t in targets)
+
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        func = node.func
+        if isinstance(func, ast.Name) and func.id == "input" and not shadowed:
+            return True
+        if isinstance(func, ast.Attribute) and func.attr == "input" \
+                and isinstance(func.value, ast.Name) and func.value.id == "builtins":
+            return True
+    return False
+
+def isInteractive(contractPath):
+    # Contracts that read input() at compile time, directly or through a
+    # local module, cannot be cached: the artifacts depend on what was
+    # typed, not only on the source.
+    return any(callsInput(path) for path in localImports(contractPath))
+
+def localImports(contractPath):
+    # The contract's own source, the local modules it imports and every
+    # module of the contract's sub-packages (e.g. FA2_ModifiedLib/fa2_lib.py)
+    contractPath = Path(contractPath)
+    root = contractPath.parent
+    inputs = {contractPath}
+
+    tree = ast.parse(contractPath.read_text(encoding='utf-8'))
+    for node in ast.walk(tree):
+        names = []
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            names = [node.module] + [f"{node.module}.{alias.name}" for alias in node.names]
+        for name in names:
+            candidate = root.joinpath(*name.split("."))
+            for path in (candidate.with_suffix(".py"), candidate / "__init__.py"):
+                if path.exists():
+                    inputs.add(path)
+
+    for child in root.iterdir():
+        if child.is_dir():
+            inputs.update(child.rglob("*.py"))
+
+    return sorted(inputs)
+
+def sourceFingerprint(contractPath):
+    inputs = {str(path): fileHash(path) for path in localImports(contractPath)}
+    digest = hashlib.sha256()
+    for path, sha in sorted(inputs.items()):
+        digest.update(f"{Path(path).name}:{sha}\n".encode())
+    digest.update(f"smartpy:{smartpyVersion()}".encode())
+    return digest.hexdigest(), inputs
+
+##Manifest
+def loadManifest(manifestFile=MANIFEST_FILE):
+    try:
+        with open(manifestFile, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def sourceKey(contractPath):
+    # Manifest entries are per source: variants of a contract share their
+    # output folder but not their fingerprint
+    return str(Path(contractPath).resolve())
+
+def artifactHashes(target):
+    return {artifact: fileHash(Path(target) / artifact) for artifact in ARTIFACTS if (Path(target) / artifact).exists()}
+
+def recordBuild(contractPath, buildTime, artifacts=None, manifestFile=MANIFEST_FILE):
+    # artifacts: the hashes taken right after this source was compiled, when
+    # another variant may have overwritten the shared output folder since
+    target = outputDir(contractPath)
+    fingerprint, inputs = sourceFingerprint(contractPath)
+    if artifacts is None:
+        artifacts = artifactHashes(target)
+
+    with _manifestLock:
+        manifest = loadManifest(manifestFile)
+        manifest[sourceKey(contractPath)] = {
+            "source": str(contractPath),
+            "output": target,
+            "fingerprint": fingerprint,
+            "inputs": inputs,
+            "smartpy": smartpyVersion(),
+            "buildTime": round(buildTime, 3),
+            "builtAt": int(time.time()),
+            "artifacts": artifacts
+        }
+        tmpFile = f"{manifestFile}.{os.getpid()}.tmp"
+        with open(tmpFile, 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, indent=4)
+        os.replace(tmpFile, manifestFile)
+
+def artifactStatus(target, contractPath=None, manifestFile=MANIFEST_FILE):
+    # "missing": no artifacts, "unknown": not built through the cache,
+    # "stale": source/imports/SmartPy changed, or the artifacts were edited
+    # or overwritten by another variant, "fresh". Without contractPath the
+    # artifacts are checked against the variant that produced them.
+    if not all((Path(target) / artifact).exists() for artifact in ARTIFACTS):
+        return "missing"
+
+    manifest = loadManifest(manifestFile)
+    onDisk = artifactHashes(target)
+    if contractPath is not None:
+        entry = manifest.get(sourceKey(contractPath))
+    else:
+        entries = [e for e in manifest.values() if e.get("output") == target]
+        entry = next((e for e in entries if e["artifacts"] == onDisk), entries[0] if entries else None)
+    if entry is None or entry.get("output") != target:
+        return "unknown"
+
+    source = entry["source"]
+    if not Path(source).exists() or sourceFingerprint(source)[0] != entry["fingerprint"]:
+        return "stale"
+    if entry["artifacts"] != onDisk:
+        return "stale"
+    return "fresh"
+
+def isUpToDate(contractPath, manifestFile=MANIFEST_FILE):
+    if isInteractive(contractPath):
+        return False
+    return artifactStatus(outputDir(contractPath), contractPath, manifestFile) == "fresh"
@@ -0,0 +1,159 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from folderScan import folderScan
+from buildCache import outputDir, isUpToDate, recordBuild, artifactHashes, ARTIFACTS
+from spans import recordSpan
+
+CONTRACTS_PATH = "../contracts"
+MAX_JOBS = max(1, (os.cpu_count() or 2) - 1)
+COMPILE_TIMEOUT = 600
+
+##Discovery
+def contractSources(contractsPath=CONTRACTS_PATH):
+    # Every top-level .py of every contract folder, variants included
+    # (OracleBet2-4.py, Vesting2.py, Auction_no_withdraw.py, ...)
+    sources = []
+    for folder in sorted(folderScan(contractsPath)):
+        folderPath = Path(contractsPath) / folder
+        if not folderPath.is_dir():
+            continue
+        for source in sorted(folderPath.glob("*.py")):
+            sources.append((folder, str(source)))
+    return sources
+
+def groupByOutput(sources):
+    # Variants of one contract write to the same ./<scenario>/ folder, so they
+    # must be compiled one after the other in the same worker. Each one is
+    # recorded with the artifacts it produced: only the variant whose
+    # artifacts are on disk counts as up to date.
+    groups = {}
+    for folder, source in sources:
+        groups.setdefault(outputDir(source), []).append((folder, source))
+    return groups
+
+##Worker
+def compileGroup(target, sources, force=False):
+    results = []
+    for folder, source in sources:
+        result = {
+            "contract": folder,
+            "source": source,
+            "output": target,
+            "status": "failed",
+            "wallTime": 0.0,
+            "michelsonSize": None,
+            "log": None
+        }
+
+        if not force and isUpToDate(source):
+            result["status"] = "cached"
+        else:
+            logPath = Path(target) / f"log_{Path(source).stem}.txt"
+            start_time = time.time()
+            try:
+                completed = subprocess.run(
+                    [sys.executable, source],
+                    stdin=subprocess.DEVNULL,
+                    capture_output=True,
+                    text=True,
+                    timeout=COMPILE_TIMEOUT
+                )
+                output = completed.stdout + completed.stderr
+                result["status"] = "ok" if completed.returncode == 0 else "failed"
+                if completed.returncode != 0 and "EOFError" in completed.stderr:
+                    result["status"] = "interactive"
+            except subprocess.TimeoutExpired as e:
+                output = f"{e.stdout or ''}{e.stderr or ''}\nTIMEOUT after {COMPILE_TIMEOUT}s"
+            result["wallTime"] = round(time.time() - start_time, 3)
+
+            logPath.parent.mkdir(parents=True, exist_ok=True)
+            logPath.write_text(output if isinstance(output, str) else output.decode(errors="replace"), encoding='utf-8')
+            result["log"] = str(logPath)
+            if result["status"] == "ok":
+                # before the next variant overwrites them
+                result["artifacts"] = artifactHashes(target)
+
+        michelson = Path(target) / ARTIFACTS[0]
+        if result["status"] in ("ok", "cached") and michelson.exists():
+            result["michelsonSize"] = michelson.stat().st_size
+        results.append(result)
+    return results
+
+##Bulk compile
+def compileAll(contractsPath=CONTRACTS_PATH, jobs=MAX_JOBS, force=False, contracts=None):
+    # contracts: optional list of contract folders; only their main source
+    # (<folder>/<folder>.py, as in the menu) is compiled
+    sources = contractSources(contractsPath)
+    if contracts is not None:
+        sources = [(folder, source) for folder, source in sources if folder in contracts and Path(source).stem == folder]
+    groups = groupByOutput(sources)
+    results = []
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(compileGroup, target, sources, force): target for target, sources in groups.items()}
+        for future in as_completed(futures):
+            target = futures[future]
+            try:
+                groupResults = future.result()
+            except Exception as e:
+                groupResults = [{"contract": folder, "source": source, "output": target, "status": "failed",
+                                 "wallTime": 0.0, "michelsonSize": None, "log": str(e)}
+                                for folder, source in groups[target]]
+            results.extend(groupResults)
+
+            # compiled in a worker process: the span is rebuilt from its wall time
+            finished = time.time()
+            for r in groupResults:
+                if r["status"] != "cached":
+                    recordSpan("compile", finished - r["wallTime"], finished, contract=r["contract"], source=r["source"])
+
+            # every variant is recorded with the artifacts it produced, from
+            # the parent: the manifest is not shared between processes
+            for r in groupResults:
+                if r["status"] == "ok":
+                    recordBuild(r["source"], buildTime=r["wallTime"], artifacts=r.pop("artifacts"))
+
+    results.sort(key=lambda r: r["source"])
+    return results
+
+def summaryTable(results):
+    header = ["Contract", "Source", "Status", "Wall time (s)", "Michelson (B)"]
+    rows = [[r["contract"], Path(r["source"]).name, r["status"], f"{r['wallTime']:.2f}",
+             "-" if r["michelsonSize"] is None else str(r["michelsonSize"])] for r in results]
+    widths = [max(len(str(x)) for x in column) for column in zip(header, *rows)]
+
+    lines = ["| " + " | ".join(h.ljust(w) for h, w in zip(header, widths)) + " |",
+             "|" + "|".join("-" * (w + 2) for w in widths) + "|"]
+    for row in rows:
+        lines.append("| " + " | ".join(c.ljust(w) for c, w in zip(row, widths)) + " |")
+
+    ok = sum(1 for r in results if r["status"] in ("ok", "cached"))
+    total = sum(r["wallTime"] for r in results)
+    lines.append(f"\n{ok}/{len(results)} contracts compiled, {total:.2f}s of compiler time")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile every contract of the archive in parallel.")
+    parser.add_argument("--contracts", default=CONTRACTS_PATH)
+    parser.add_argument("--jobs", type=int, default=MAX_JOBS)
+    parser.add_argument("--force", action="store_true", help="ignore the build cache")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    results = compileAll(args.contracts, jobs=args.jobs, force=args.force)
+    if args.json:
+        print(json.dumps(results, indent=4))
+    else:
+        print(summaryTable(results))
+        print(f"Elapsed: {time.time() - start_time:.2f}s")
+
+if __name__ == "__main__":
+    main()
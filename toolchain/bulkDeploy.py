@@ -0,0 +1,163 @@
+import asyncio
+import traceback
+
+from pytezos.operation.forge import forge_operation
+
+from asyncRpc import getAsyncRpc, runSync, fillAsync, autofillAsync, sendAsync
+from clientPool import getClient, getNetwork
+from addressRegistry import getRegistry
+from contractCache import codeHash
+from resultsStore import getStore
+from contractUtils import awaitOperationAsync, contentWeights, MUTEZ_CONV, BRANCH_BYTES, SIGNATURE_BYTES
+from michelsonCache import loadScript, parseMichelson
+from spans import span, tagged
+from tracePlan import tezAmount
+
+# Used when the node does not publish max_operation_data_length
+MAX_OPERATION_SIZE = 32768
+# Share of hard_gas_limit_per_block one group may use, so that it still fits
+# a block next to other operations
+BLOCK_GAS_SHARE = 0.5
+
+##Packing
+def mutez(balance):
+    # tez -> int mutez, exactly: 1.001 tez is 1001000, not 1000999.9999999999
+    return int(tezAmount(balance) * MUTEZ_CONV)
+
+def packOriginations(sizes, gasLimit, storageLimit, constants):
+    # sizes: forged bytes of every origination; gasLimit, storageLimit: the
+    # limits of one of them. -> [[instance index, ...]] in order, each group
+    # under the operation size and the block gas share. The group is
+    # simulated with the per-operation hard limits split between its
+    # contents, which caps its length too.
+    maxSize = int(constants.get("max_operation_data_length", MAX_OPERATION_SIZE)) - BRANCH_BYTES - SIGNATURE_BYTES
+    maxGas = int(int(constants["hard_gas_limit_per_block"]) * BLOCK_GAS_SHARE)
+    maxCount = max(1, min(int(constants["hard_gas_limit_per_operation"]) // gasLimit,
+                          int(constants["hard_storage_limit_per_operation"]) // max(1, storageLimit)))
+
+    groups = [[]]
+    size = gas = 0
+    for index, instanceSize in enumerate(sizes):
+        if instanceSize > maxSize:
+            raise ValueError(f"origination {index} is {instanceSize} bytes, over the {maxSize} bytes of an operation")
+        if groups[-1] and (size + instanceSize > maxSize or gas + gasLimit > maxGas or len(groups[-1]) == maxCount):
+            groups.append([])
+            size = gas = 0
+        groups[-1].append(index)
+        size += instanceSize
+        gas += gasLimit
+    return groups
+
+def originationSizes(template, code, storages, balances):
+    # template: a filled origination content; only script and balance vary
+    return [len(forge_operation(dict(template, balance=str(mutez(balance)),
+                                     script={"code": code, "storage": storage})))
+            for storage, balance in zip(storages, balances)]
+
+##Reports
+def bulkInfoResults(opResult, instances, weights):
+    # One contractInfoResult-shaped report per origination of the group. Gas
+    # and storage come from each content's receipt; the group fee, paid by
+    # the first content, is split evenly between the instances.
+    contents = opResult["contents"]
+    fee = sum(int(content.get("fee", 0)) for content in contents)
+    reports = []
+    for position, (instance, content) in enumerate(zip(instances, contents)):
+        result = content.get("metadata", {}).get("operation_result", {})
+        share = fee // len(contents) + (fee % len(contents) if position == 0 else 0)
+        storage = int(result.get("paid_storage_size_diff", 0)) * 250
+        reports.append({
+            "instance": instance,
+            "hash": opResult["hash"],
+            "address": (result.get("originated_contracts") or [None])[0],
+            "BakerFee": share,
+            "Gas": int(result.get("consumed_milligas", 0)),
+            "Storage": storage,
+            "TotalCost": share + storage,
+            "Weight": weights[position],
+            "SignatureBytes": SIGNATURE_BYTES // len(contents),
+            "BatchIndex": position,
+            "BatchSize": len(contents)
+        })
+    return reports
+
+##Bulk origination
+async def sendGroupsAsync(client, groups, code, storages, balances):
+    # The groups of one wallet go one after the other: its counter only
+    # moves once the previous group is included
+    rpc = getAsyncRpc(client)
+    reports = []
+    for group in groups:
+        try:
+            opg = client.bulk(*[client.origination(script={"code": code, "storage": storages[i]},
+                                                   balance=mutez(balances[i])) for i in group])
+            signed, _ = await sendAsync(rpc, opg)
+            opResult = await awaitOperationAsync(client, signed.hash())
+            if not opResult:
+                raise Exception("group not included")
+            for report in bulkInfoResults(opResult, group, contentWeights(signed.contents)):
+                reports.append(dict(report, source=client.key.public_key_hash()))
+        except Exception as e:
+            print(traceback.format_exc())
+            reports += [{"instance": i, "error": str(e)} for i in group]
+    return reports
+
+async def bulkOriginationAsync(clients, code, storages, balances):
+    # clients: the wallets originating the instances, groups are dealt to
+    # them in turn and the wallets send concurrently
+    client = clients[0]
+    rpc = getAsyncRpc(client)
+    with span("simulate", instances=len(storages)):
+        probe = await fillAsync(rpc, client.origination(script={"code": code, "storage": storages[0]},
+                                                        balance=mutez(balances[0])))
+        template = (await autofillAsync(rpc, probe)).contents[0]
+    constants = await rpc.getConstants()
+
+    groups = packOriginations(originationSizes(template, code, storages, balances), int(template["gas_limit"]),
+                              int(template["storage_limit"]), constants)
+    print(f"{len(storages)} originations in {len(groups)} operation groups from {len(clients)} wallets")
+
+    walletGroups = [groups[i::len(clients)] for i in range(len(clients))]
+    results = await asyncio.gather(*(sendGroupsAsync(c, g, code, storages, balances)
+                                     for c, g in zip(clients, walletGroups) if g))
+    return sorted((report for reports in results for report in reports), key=lambda report: report["instance"])
+
+def bulkOrigination(clients, code, storages, balances):
+    return runSync(bulkOriginationAsync(clients, code, storages, balances))
+
+def instanceStorages(contract, count, storages=None):
+    # storages: Michelson text or Micheline per instance, default the
+    # compiled initial storage for every one
+    code, initialStorage = loadScript(contract)
+    if storages is None:
+        return code, [initialStorage] * count
+    if len(storages) != count:
+        raise ValueError(f"{len(storages)} storages given for {count} instances")
+    return code, [parseMichelson(s) if isinstance(s, str) else s for s in storages]
+
+def bulkDeployContract(contract, count, wallets=("1",), storages=None, balances=0):
+    # Originates count instances of ./<contract>/ and registers every address
+    # under the alias "<contract>#<n>". -> per-instance reports, failed ones
+    # with "error"
+    code, storages = instanceStorages(contract, count, storages)
+    balances = list(balances) if isinstance(balances, (list, tuple)) else [balances] * count
+    clients = [getClient(str(wallet)) for wallet in wallets]
+    walletOf = {client.key.public_key_hash(): str(wallet) for client, wallet in zip(clients, wallets)}
+    with tagged(contract=contract, entrypoint="origination"):
+        reports = bulkOrigination(clients, code, storages, balances)
+
+    deployed = [report for report in reports if "error" not in report]
+    for report in reports:
+        report["contract"] = contract
+        if "source" in report:
+            report["wallet"] = walletOf.get(report.pop("source"))
+
+    # one registry update for the whole batch
+    aliases = getRegistry().registerInstances(contract, [(r["address"], r["wallet"]) for r in deployed],
+                                              codeHash=codeHash(code))
+    store = getStore()
+    runId = store.newRun(f"bulk deploy {contract} x{count}")
+    for report, alias in zip(deployed, aliases):
+        report["name"] = alias
+        store.recordOrigination(runId, contract, report, wallet=report["wallet"], mode="inject", network=getNetwork())
+    return reports
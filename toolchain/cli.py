@@ -0,0 +1,216 @@
+import argparse
+import json
+import sys
+import time
+from contextlib import redirect_stdout
+
+from clientPool import setNetwork, getNetwork
+from bulkCompile import compileAll, CONTRACTS_PATH, MAX_JOBS
+from traceExecutor import executeTraces, isFailed, MAX_WORKERS
+from reportSink import materializeJson, materializeMarkdown, REPORT_FILE, MARKDOWN_FILE
+from resultsStore import getStore, MODES
+from spans import readSpans, latencySummary, SPAN_FILE
+from execution import deployContract, callContract, runTraces
+from bulkDeploy import bulkDeployContract
+from tracePlan import tezAmount
+
+##Jobs
+def runJob(job):
+    command = job["command"]
+    if command == "deploy":
+        return deployContract(job["contract"], str(job["wallet"]), job.get("balance", 0))
+    if command == "call":
+        return callContract(job["contract"], str(job["wallet"]), job["entrypoint"], job.get("parameters", []),
+                            job.get("amount", 0), mode=job.get("mode", "inject"))
+    raise ValueError(f"Unknown job command: {command}")
+
+def runJobs(jobs, maxWorkers=MAX_WORKERS):
+    # Deploy/call jobs share the trace scheduler: jobs on the same contract
+    # run in manifest order, jobs of the same wallet never overlap, anything
+    # else runs concurrently. Compile jobs are handed to bulkCompile first.
+    results = [None] * len(jobs)
+
+    compileJobs = [i for i, job in enumerate(jobs) if job["command"] == "compile"]
+    if compileJobs:
+        contracts = {jobs[i]["contract"] for i in compileJobs}
+        force = any(jobs[i].get("force") for i in compileJobs)
+        compiled = compileAll(CONTRACTS_PATH, jobs=maxWorkers, force=force, contracts=contracts)
+        for i in compileJobs:
+            results[i] = [r for r in compiled if r["contract"] == jobs[i]["contract"]]
+
+    traces = {}
+    for i, job in enumerate(jobs):
+        if job["command"] != "compile":
+            traces.setdefault(job.get("contract"), {})[i] = job
+    executed = executeTraces(traces, runStep=lambda contract, i, job: runJob(job),
+                             maxWorkers=maxWorkers, walletOf=lambda job: job.get("wallet"))
+    for contractResults in executed.values():
+        for i, result in contractResults.items():
+            results[i] = result
+
+    return [dict(job=job, result=result, ok=jobSucceeded(result)) for job, result in zip(jobs, results)]
+
+def jobSucceeded(result):
+    if isinstance(result, list):
+        return all(r["status"] in ("ok", "cached") for r in result)
+    return result is not None and not isFailed(result)
+
+def loadManifest(manifestFile):
+    # {"network": "mock", "jobs": [{"command": "deploy", "contract": "OracleBet", "wallet": "1"}, ...]}
+    with open(manifestFile, 'r', encoding='utf-8') as file:
+        manifest = json.load(file)
+    if isinstance(manifest, list):
+        manifest = {"jobs": manifest}
+    return manifest
+
+##Commands
+def compileCommand(args):
+    contracts = None if args.all else args.contracts
+    results = compileAll(args.contracts_path, jobs=args.jobs, force=args.force, contracts=contracts)
+    return results, all(r["status"] in ("ok", "cached") for r in results)
+
+def deployCommand(args):
+    jobs = [{"command": "deploy", "contract": c, "wallet": args.wallet, "balance": args.balance} for c in args.contracts]
+    results = runJobs(jobs, args.jobs)
+    return results, all(r["ok"] for r in results)
+
+def bulkDeployCommand(args):
+    storages = None
+    if args.storages:
+        # JSON list with one Michelson string or Micheline value per instance
+        with open(args.storages, 'r', encoding='utf-8') as file:
+            storages = json.load(file)
+    results = bulkDeployContract(args.contract, args.count, wallets=args.wallet or ["1"], storages=storages,
+                                 balances=args.balance)
+    return results, all("error" not in r for r in results)
+
+def callCommand(args):
+    job = {"command": "call", "contract": args.contract, "entrypoint": args.entrypoint, "wallet": args.wallet,
+           "parameters": args.param, "amount": args.amount, "mode": args.mode}
+    results = runJobs([job], 1)
+    return results[0], results[0]["ok"]
+
+def traceCommand(args):
+    actors = None
+    if args.actors:
+        with open(args.actors, 'r', encoding='utf-8') as file:
+            actors = json.load(file)
+    if args.format == "cardano" and args.mode == "interpret":
+        raise ValueError("Cardano-based traces run with --mode inject or simulate")
+    results = runTraces(args.format, mode=args.mode, batch=args.batch, maxWorkers=args.jobs, only=args.trace,
+                        timeScale=args.time_scale, actors=actors, pipeline=args.pipeline)
+    ok = all(not isFailed(r) for steps in results.values() for r in steps.values())
+    return results, ok
+
+def reportCommand(args):
+    view = materializeJson(args.input, args.json_view)
+    materializeMarkdown(args.input, args.md)
+    stats = getStore().entrypointStats(args.contract, args.entrypoint, args.run, mode=args.mode, network=args.network)
+    spans = [s for s in readSpans(args.spans)
+             if (args.contract is None or s["attributes"].get("contract") == args.contract)
+             and (args.entrypoint is None or s["attributes"].get("entrypoint") == args.entrypoint)]
+    latency = latencySummary((s["name"], s["duration_ms"]) for s in spans)
+    return {"operations": sum(len(ops) for ops in view.values()), "json": args.json_view, "md": args.md,
+            "stats": stats, "latency": latency}, True
+
+def runCommand(args):
+    manifest = loadManifest(args.manifest)
+    if manifest.get("network") and not args.network:
+        setNetwork(manifest["network"])
+    results = runJobs(manifest["jobs"], args.jobs or manifest.get("maxWorkers", MAX_WORKERS))
+    return results, all(r["ok"] for r in results)
+
+def buildParser():
+    parser = argparse.ArgumentParser(prog="main.py", description="Tezos toolchain batch CLI (JSON on stdout).")
+    parser.add_argument("--network", help="ghostnet, sandbox, mock or an RPC URL")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compile_ = subparsers.add_parser("compile", help="compile contracts of the archive")
+    compile_.add_argument("contracts", nargs="*")
+    compile_.add_argument("--all", action="store_true")
+    compile_.add_argument("--force", action="store_true", help="ignore the build cache")
+    compile_.add_argument("--jobs", type=int, default=MAX_JOBS)
+    compile_.add_argument("--contracts-path", default=CONTRACTS_PATH)
+    compile_.set_defaults(handler=compileCommand)
+
+    deploy = subparsers.add_parser("deploy", help="originate compiled contracts")
+    deploy.add_argument("contracts", nargs="+")
+    deploy.add_argument("--wallet", required=True)
+    deploy.add_argument("--balance", type=int, default=0, help="initial balance in tez")
+    deploy.add_argument("--jobs", type=int, default=MAX_WORKERS)
+    deploy.set_defaults(handler=deployCommand)
+
+    bulkDeploy = subparsers.add_parser("bulk-deploy", help="originate many instances of a contract in packed operation groups")
+    bulkDeploy.add_argument("contract")
+    bulkDeploy.add_argument("--count", type=int, required=True)
+    bulkDeploy.add_argument("--wallet", action="append", help="originating wallet, repeatable (groups are shared out)")
+    bulkDeploy.add_argument("--balance", type=int, default=0, help="initial balance in tez of every instance")
+    bulkDeploy.add_argument("--storages", help="JSON file with one initial storage per instance")
+    bulkDeploy.set_defaults(handler=bulkDeployCommand)
+
+    call = subparsers.add_parser("call", help="call an entrypoint of a deployed contract")
+    call.add_argument("contract")
+    call.add_argument("entrypoint")
+    call.add_argument("--wallet", required=True)
+    call.add_argument("--param", action="append", default=[], help="value or name=value, repeatable")
+    call.add_argument("--amount", type=tezAmount, default=0, help="tez sent with the call, e.g. 0.5")
+    # a single call is injected or simulated, never interpreted offline
+    call.add_argument("--mode", choices=[m for m in MODES if m != "interpret"], default="inject")
+    call.set_defaults(handler=callCommand)
+
+    trace = subparsers.add_parser("trace", help="execution traces")
+    traceCommands = trace.add_subparsers(dest="traceCommand", required=True)
+    traceRun = traceCommands.add_parser("run", help="run the traces of execution_traces/")
+    traceRun.add_argument("--format", choices=["csv", "json", "cardano"], default="csv")
+    traceRun.add_argument("--time-scale", type=float, default=1.0, help="factor applied to waiting_time (cardano)")
+    traceRun.add_argument("--actors", help="JSON file mapping actor names to wallet ids (cardano)")
+    traceRun.add_argument("--mode", choices=MODES, default="inject")
+    traceRun.add_argument("--batch", action="store_true", help="one operation group per run of same-wallet steps")
+    traceRun.add_argument("--pipeline-wallets", "--pipeline", dest="pipeline", type=int, default=0, metavar="K",
+                          help="up to K wallets with an operation in flight (one each), without waiting for each inclusion")
+    traceRun.add_argument("--trace", action="append", help="only this trace, repeatable")
+    traceRun.add_argument("--jobs", type=int, default=MAX_WORKERS)
+    traceRun.set_defaults(handler=traceCommand)
+
+    report = subparsers.add_parser("report", help="materialize the report views and print cost statistics")
+    report.add_argument("--input", default=REPORT_FILE + ".jsonl")
+    report.add_argument("--json-view", default=REPORT_FILE + ".json")
+    report.add_argument("--md", default=MARKDOWN_FILE)
+    report.add_argument("--contract")
+    report.add_argument("--entrypoint")
+    report.add_argument("--run")
+    report.add_argument("--mode", default="inject", choices=MODES, help="statistics over the reports of this mode")
+    report.add_argument("--network", help="statistics over this network only")
+    report.add_argument("--spans", default=SPAN_FILE or "spans.jsonl", help="span log for the latency histograms")
+    report.set_defaults(handler=reportCommand)
+
+    run = subparsers.add_parser("run", help="run the deploy/call/compile jobs of a manifest file")
+    run.add_argument("manifest")
+    run.add_argument("--jobs", type=int)
+    run.set_defaults(handler=runCommand)
+    return parser
+
+def main(argv=None):
+    args = buildParser().parse_args(argv)
+    if args.network:
+        setNetwork(args.network)
+
+    # progress messages go to stderr so that stdout is only the JSON result
+    start_time = time.time()
+    with redirect_stdout(sys.stderr):
+        try:
+            results, ok = args.handler(args)
+        except Exception as e:
+            results, ok = {"error": str(e)}, False
+
+    print(json.dumps({
+        "command": args.command,
+        "network": getNetwork(),
+        "ok": ok,
+        "elapsed": round(time.time() - start_time, 3),
+        "results": results
+    }, indent=4, default=str))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+import contextvars
+import json
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from pytezos import pytezos
+import pytezos.rpc.node as rpcNode
+from pytezos.rpc.node import RpcNode
+from pytezos.rpc.shell import ShellQuery
+
+WALLET_FILE = "wallet.json"
+# Backend selection: TOOLCHAIN_NETWORK=ghostnet|sandbox|mock|<rpc url>
+NETWORK = os.environ.get("TOOLCHAIN_NETWORK", "ghostnet")
+# Seconds between the mock chain's blocks, 0 bakes one per injection
+MOCK_BLOCK_TIME = float(os.environ.get("TOOLCHAIN_BLOCK_TIME", "0"))
+NETWORKS = {
+    "ghostnet": "https://rpc.ghostnet.teztnets.com/",
+    "sandbox": "http://localhost:20000/",
+    "mock": "mock://local"
+}
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 16
+RPC_TIMEOUT = 60
+
+##Keep-alive RPC node
+_session = contextvars.ContextVar("session", default=None)
+
+class PooledRequests:
+    # Stands in for the requests module of pytezos.rpc.node, whose RpcNode
+    # has no session of its own: a request made by a SessionRpcNode goes
+    # through that node's session, any other one through requests.request
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+    def request(self, method, url, **kwargs):
+        session = _session.get()
+        if session is None:
+            return requests.request(method, url, **kwargs)
+        return session.request(method, url, **kwargs)
+
+rpcNode.requests = PooledRequests()
+
+class SessionRpcNode(RpcNode):
+    # pytezos' RpcNode, transient retries and 401/403/404 handling included,
+    # with every request sent through one requests.Session so TCP/TLS
+    # connections are kept alive and pooled.
+    def __init__(self, uri, session=None):
+        super().__init__(uri)
+        self.session = session or newSession()
+
+    def request(self, method, path, **kwargs):
+        kwargs['timeout'] = kwargs.get('timeout') or RPC_TIMEOUT
+        token = _session.set(self.session)
+        try:
+            return super().request(method, path, **kwargs)
+        finally:
+            _session.reset(token)
+
+def newSession():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def networkUri(network):
+    return NETWORKS.get(network, network)
+
+def isEphemeral(network):
+    # The mock chain lives in the process: nothing that refers to its
+    # contracts may outlive it on disk
+    return networkUri(network).startswith("mock://")
+
+def newNode(network):
+    uri = networkUri(network)
+    if uri.startswith("mock://"):
+        # In-process ledger, one per network name
+        from mockNode import MockRpcNode, getChain
+        return MockRpcNode(getChain(network, blockTime=MOCK_BLOCK_TIME), uri=uri)
+    return SessionRpcNode(uri)
+
+##Pool
+class ClientPool:
+    # Loads wallet.json once and keeps one configured client per
+    # (network, wallet). All clients of a network share the same shell, hence
+    # the same HTTP session and confirmation tracker.
+    def __init__(self, walletFile=WALLET_FILE, network=NETWORK):
+        self.walletFile = walletFile
+        self.network = network
+        self.lock = threading.Lock()
+        self.wallets = None
+        self.shells = {}
+        self.clients = {}
+        self.counters = {"hits": 0, "misses": 0, "walletLoads": 0}
+
+    def loadWallets(self):
+        with self.lock:
+            if self.wallets is None:
+                with open(self.walletFile, 'r', encoding='utf-8') as file:
+                    self.wallets = json.load(file)
+                self.counters["walletLoads"] += 1
+            return self.wallets
+
+    def walletIds(self):
+        return list(self.loadWallets().keys())
+
+    def getShell(self, network=None):
+        network = network or self.network
+        with self.lock:
+            shell = self.shells.get(network)
+            if shell is None:
+                shell = ShellQuery(newNode(network))
+                self.shells[network] = shell
+            return shell
+
+    def getClient(self, walletId, network=None):
+        network = network or self.network
+        walletId = str(walletId)
+        key = self.loadWallets().get(walletId)
+        if key is None:
+            raise KeyError(f"Wallet {walletId} not found in {self.walletFile}")
+
+        shell = self.getShell(network)
+        with self.lock:
+            client = self.clients.get((network, walletId))
+            if client is None:
+                self.counters["misses"] += 1
+                client = pytezos.using(shell=shell, key=key)
+                self.clients[(network, walletId)] = client
+            else:
+                self.counters["hits"] += 1
+            return client
+
+    def getReadClient(self, network=None):
+        # Keyless client for read-only RPC (contract interfaces, storage)
+        network = network or self.network
+        shell = self.getShell(network)
+        with self.lock:
+            client = self.clients.get((network, None))
+            if client is None:
+                self.counters["misses"] += 1
+                client = pytezos.using(shell=shell)
+                self.clients[(network, None)] = client
+            else:
+                self.counters["hits"] += 1
+            return client
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, clients=len(self.clients))
+
+    def clear(self):
+        with self.lock:
+            self.wallets = None
+            self.shells = {}
+            self.clients = {}
+
+
+_pool = None
+_poolLock = threading.Lock()
+
+def getPool():
+    global _pool
+    with _poolLock:
+        if _pool is None:
+            _pool = ClientPool()
+        return _pool
+
+def setNetwork(network):
+    # Switches the default backend of the shared pool (CLI flag, dapp sidebar)
+    pool = getPool()
+    with pool.lock:
+        pool.network = network
+
+def getNetwork():
+    return getPool().network
+
+def getClient(walletId, network=None):
+    return getPool().getClient(walletId, network)
+
+def getReadClient(network=None):
+    return getPool().getReadClient(network)
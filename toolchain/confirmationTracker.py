@@ -0,0 +1,212 @@
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+CONFIRMATIONS = 1
+POLL_INTERVAL = 2
+LOOKBACK = 10
+TIMEOUT = 500
+
+##RPC adapters
+class ShellRpc:
+    # Reads only what the tracker needs from a pytezos shell: the head level
+    # and the manager operations of a single block.
+    def __init__(self, shell):
+        self.shell = shell
+
+    def headLevel(self):
+        return int(self.shell.head.header()["level"])
+
+    def blockOperations(self, level):
+        return self.shell.blocks[level].operations.managers()
+
+
+class ScriptedRpc:
+    # Local fake RPC serving scripted blocks, used to exercise the tracker
+    # without a node. Each block is a list of operation dicts with a "hash".
+    def __init__(self, blocks=None, startLevel=1):
+        self.lock = threading.Lock()
+        self.startLevel = startLevel
+        self.blocks = [list(block) for block in (blocks or [])]
+        self.calls = {"head": 0, "block": 0}
+
+    def bake(self, operations=()):
+        with self.lock:
+            self.blocks.append([dict(op) for op in operations])
+            return self.startLevel + len(self.blocks) - 1
+
+    def headLevel(self):
+        with self.lock:
+            self.calls["head"] += 1
+            return self.startLevel + len(self.blocks) - 1
+
+    def blockOperations(self, level):
+        with self.lock:
+            self.calls["block"] += 1
+            index = level - self.startLevel
+            if index < 0 or index >= len(self.blocks):
+                return []
+            return list(self.blocks[index])
+
+
+##Tracker
+class ConfirmationTracker:
+    # A single head follower shared by every pending operation: each new block
+    # is downloaded once, its operation hashes are indexed and the matching
+    # waiters are resolved once the requested depth is reached.
+    def __init__(self, rpc, confirmations=CONFIRMATIONS, pollInterval=POLL_INTERVAL, lookback=LOOKBACK):
+        self.rpc = rpc
+        self.confirmations = max(1, confirmations)
+        self.pollInterval = pollInterval
+        self.lookback = lookback
+
+        self.lock = threading.Lock()
+        self.wakeUp = threading.Event()
+        self.pending = {}
+        self.included = {}
+        self.lastLevel = None
+        self.headLevel = None
+        self.follower = None
+
+    def watch(self, opHash, callback=None, timeout=TIMEOUT, confirmations=None):
+        future = Future()
+        if callback:
+            future.add_done_callback(callback)
+
+        depth = max(1, confirmations or self.confirmations)
+        deadline = time.time() + timeout if timeout else None
+
+        with self.lock:
+            self.pending.setdefault(opHash, []).append((future, depth, deadline))
+            self._resolve(opHash)
+            if self.follower is None or not self.follower.is_alive():
+                self.follower = threading.Thread(target=self._follow, name="confirmation-tracker", daemon=True)
+                self.follower.start()
+
+        self.wakeUp.set()
+        return future
+
+    def wait(self, opHash, timeout=TIMEOUT, confirmations=None):
+        future = self.watch(opHash, timeout=timeout, confirmations=confirmations)
+        try:
+            return future.result(timeout=timeout + self.pollInterval if timeout else None)
+        except (TimeoutError, FutureTimeout):
+            self._forget(opHash, future)
+            return None
+
+    def stats(self):
+        with self.lock:
+            return {
+                "pending": sum(len(waiters) for waiters in self.pending.values()),
+                "indexed": len(self.included),
+                "headLevel": self.headLevel
+            }
+
+    def _forget(self, opHash, future):
+        with self.lock:
+            waiters = [w for w in self.pending.get(opHash, []) if w[0] is not future]
+            if waiters:
+                self.pending[opHash] = waiters
+            else:
+                self.pending.pop(opHash, None)
+
+    def _resolve(self, opHash):
+        # Must be called holding self.lock
+        if opHash not in self.included or self.headLevel is None:
+            return
+        level, operation = self.included[opHash]
+        depth = self.headLevel - level + 1
+        waiters = []
+        for future, wanted, deadline in self.pending.get(opHash, []):
+            if depth >= wanted:
+                if not future.done():
+                    future.set_result(operation)
+            else:
+                waiters.append((future, wanted, deadline))
+        if waiters:
+            self.pending[opHash] = waiters
+        else:
+            self.pending.pop(opHash, None)
+
+    def _expire(self):
+        # Must be called holding self.lock
+        now = time.time()
+        for opHash in list(self.pending):
+            waiters = []
+            for future, wanted, deadline in self.pending[opHash]:
+                if deadline is not None and now >= deadline:
+                    if not future.done():
+                        future.set_exception(TimeoutError(f"Operation {opHash} not confirmed in time"))
+                else:
+                    waiters.append((future, wanted, deadline))
+            if waiters:
+                self.pending[opHash] = waiters
+            else:
+                del self.pending[opHash]
+
+    def _index(self, level, operations):
+        # Must be called holding self.lock
+        for operation in operations:
+            opHash = operation.get("hash")
+            if opHash:
+                self.included.setdefault(opHash, (level, operation))
+
+        # keep only the blocks that can still matter for the lookback window
+        oldest = level - self.lookback - max(self.confirmations, 1)
+        for opHash in [h for h, (lvl, _) in self.included.items() if lvl < oldest and h not in self.pending]:
+            del self.included[opHash]
+
+    def _follow(self):
+        while True:
+            with self.lock:
+                if not self.pending:
+                    self.follower = None
+                    return
+
+            try:
+                head = self.rpc.headLevel()
+                if self.lastLevel is None or head - self.lastLevel > self.lookback:
+                    self.lastLevel = head - self.lookback
+
+                for level in range(self.lastLevel + 1, head + 1):
+                    operations = self.rpc.blockOperations(level)
+                    with self.lock:
+                        self._index(level, operations)
+                        self.lastLevel = level
+
+                with self.lock:
+                    self.headLevel = head
+                    for opHash in list(self.pending):
+                        self._resolve(opHash)
+            except Exception as e:
+                print(f"Confirmation tracker error: {e}")
+
+            with self.lock:
+                self._expire()
+
+            self.wakeUp.wait(self.pollInterval)
+            self.wakeUp.clear()
+
+
+##Shared trackers
+_trackers = {}
+_trackersLock = threading.Lock()
+
+def shellKey(client):
+    node = client.shell.node
+    uri = getattr(node, "uri", None)
+    return uri[0] if isinstance(uri, list) else str(uri or id(node))
+
+def getTracker(client, confirmations=CONFIRMATIONS):
+    key = (shellKey(client), confirmations)
+    with _trackersLock:
+        tracker = _trackers.get(key)
+        if tracker is None:
+            # local backends bake in milliseconds and advertise a faster poll
+            pollInterval = getattr(client.shell.node, "pollInterval", POLL_INTERVAL)
+            tracker = ConfirmationTracker(ShellRpc(client.shell), confirmations=confirmations, pollInterval=pollInterval)
+            _trackers[key] = tracker
+        return tracker
+
+def waitForOperation(client, opHash, timeout=TIMEOUT, confirmations=CONFIRMATIONS):
+    return getTracker(client, confirmations).wait(opHash, timeout=timeout)
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+from pytezos.contract.interface import ContractInterface
+from pytezos.michelson.program import MichelsonProgram
+from clientPool import isEphemeral
+from confirmationTracker import shellKey
+
+CACHE_FILE = "cache/contracts.json"
+
+def codeHash(code):
+    return hashlib.sha256(json.dumps(code, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+##Cache
+class ContractCache:
+    # Entries are keyed by (network, address, code hash) and hold the contract
+    # code plus the entrypointAnalyse schema. The code is persisted on disk;
+    # the parsed interface class lives in memory only, so a contract is
+    # fetched and parsed at most once per process and never again on disk hit.
+    # Entries of the mock chain stay in memory: its addresses are reused by
+    # the next process for other contracts.
+    def __init__(self, cacheFile=CACHE_FILE):
+        self.cacheFile = Path(cacheFile)
+        self.lock = threading.Lock()
+        self.entries = None
+        self.classes = {}
+        self.counters = {"hits": 0, "misses": 0}
+
+    def _load(self):
+        # Must be called holding self.lock
+        if self.entries is None:
+            try:
+                with open(self.cacheFile, 'r', encoding='utf-8') as file:
+                    self.entries = {k: e for k, e in json.load(file).items() if not isEphemeral(e["network"])}
+            except (FileNotFoundError, json.JSONDecodeError):
+                self.entries = {}
+        return self.entries
+
+    def _save(self):
+        # Must be called holding self.lock
+        self.cacheFile.parent.mkdir(parents=True, exist_ok=True)
+        tmpFile = f"{self.cacheFile}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmpFile, 'w', encoding='utf-8') as file:
+            json.dump({k: e for k, e in self.entries.items() if not isEphemeral(e["network"])}, file)
+        os.replace(tmpFile, self.cacheFile)
+
+    def _key(self, network, address):
+        return f"{network}|{address}"
+
+    def lookup(self, network, address):
+        with self.lock:
+            return self._load().get(self._key(network, address))
+
+    def store(self, network, address, code):
+        entry = {
+            "network": network,
+            "address": address,
+            "codeHash": codeHash(code),
+            "code": code,
+            "schema": None
+        }
+        with self.lock:
+            self._load()[self._key(network, address)] = entry
+            self._save()
+        return entry
+
+    def storeSchema(self, network, address, schema):
+        with self.lock:
+            entry = self._load().get(self._key(network, address))
+            if entry is not None:
+                entry["schema"] = schema
+                self._save()
+
+    def interfaceClass(self, entry):
+        classKey = (entry["network"], entry["address"], entry["codeHash"])
+        with self.lock:
+            cls = self.classes.get(classKey)
+        if cls is None:
+            program = MichelsonProgram.match(entry["code"])
+            cls = type(ContractInterface.__name__, (ContractInterface,), {'program': program})
+            with self.lock:
+                self.classes[classKey] = cls
+        return cls
+
+    def invalidate(self, address=None, network=None):
+        with self.lock:
+            entries = self._load()
+            for key in [k for k, e in entries.items()
+                        if (address is None or e["address"] == address) and (network is None or e["network"] == network)]:
+                entry = entries.pop(key)
+                self.classes.pop((entry["network"], entry["address"], entry["codeHash"]), None)
+            self._save()
+
+    def count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, entries=len(self._load()))
+
+
+_cache = ContractCache()
+
+def getCache():
+    return _cache
+
+def getContract(client, address):
+    # Drop-in replacement for client.contract(address) that skips the script
+    # download and the type-tree parse on a cache hit.
+    network = shellKey(client)
+    entry = _cache.lookup(network, address)
+    if entry is None:
+        _cache.count("misses")
+        script = client.shell.contracts[address].script()
+        entry = _cache.store(network, address, script["code"])
+    else:
+        _cache.count("hits")
+
+    context = client._spawn_context(address=address, script={"code": entry["code"], "storage": None})
+    return _cache.interfaceClass(entry)(context)
+
+def getSchema(client, address, analyse):
+    # analyse(contract) -> schema; the result is stored alongside the code
+    network = shellKey(client)
+    entry = _cache.lookup(network, address)
+    if entry is not None and entry.get("schema") is not None:
+        return entry["schema"]
+
+    schema = analyse(getContract(client, address))
+    if schema is not None:
+        _cache.storeSchema(network, address, schema)
+    return schema
+
+def invalidateAddress(address):
+    if address:
+        _cache.invalidate(address=address)
@@ -1,30 +1,70 @@
 from pytezos import pytezos
+from pytezos.contract.call import ContractCall
 import traceback
-from pytezos.michelson.parse import michelson_to_micheline
+from pytezos.operation.forge import forge_operation
+from pytezos.operation import DEFAULT_GAS_RESERVE, DEFAULT_BURN_RESERVE
+from pytezos.operation.fees import calculate_fee
+from pytezos.operation.result import OperationResult
 import time
 import subprocess
 import sys
+import asyncio
+from confirmationTracker import waitForOperation, shellKey, TIMEOUT
+from contractCache import getCache, getContract, getSchema
+from buildCache import isUpToDate, outputDir, recordBuild
+from estimateCache import estimateKey, isExhausted, operationFailure, getEstimates
+from asyncRpc import getAsyncRpc, runSync, sendAsync, waitForOperationAsync
+from spans import span
+from michelsonCache import parseMichelson
 
 MUTEZ_CONV = 1000000
+BRANCH_BYTES = 32
+SIGNATURE_BYTES = 64
 ##Compiler
-def compileContract(contractPath) :
+def compileContract(contractPath, force=False) :
+    try:
+        if not force and isUpToDate(contractPath):
+            print(f">>> '{contractPath}' unchanged, reusing the artifacts in './{outputDir(contractPath)}'")
+            return True
+    except FileNotFoundError:
+        print(f"ERROR: '{contractPath}' not found.")
+        return False
+
     print(f">>> Compiling '{contractPath}'...")
 
     try:
-        subprocess.run([sys.executable, contractPath], check=True)
+        start_time = time.time()
+        with span("compile", source=contractPath):
+            subprocess.run([sys.executable, contractPath], check=True)
+        recordBuild(contractPath, buildTime=time.time() - start_time)
 
         print(f"\n>>> '{contractPath}' compiled!")
+        return True
 
     except FileNotFoundError:
         print(f"ERROR: '{contractPath}' not found.")
     except subprocess.CalledProcessError:
         print(f"\nERROR: '{contractPath}' raise an exception.")
+    return False
 
 ##Deploy
+# The RPC traffic of origination, entrypointCall and entrypointAnalyse runs
+# on the asyncRpc event loop; the sync functions are thin wrappers over the
+# *Async coroutines, which can also be awaited directly.
 def origination(client, michelsonCode, initialStorage, initialBalance):
+    return runSync(originationAsync(client, michelsonCode, initialStorage, initialBalance))
 
-    parsed_code = michelson_to_micheline(michelsonCode)
-    parsed_storage = michelson_to_micheline(initialStorage)
+async def originationAsync(client, michelsonCode, initialStorage, initialBalance):
+    with span("origination"):
+        return await originateAsync(client, michelsonCode, initialStorage, initialBalance)
+
+async def originateAsync(client, michelsonCode, initialStorage, initialBalance):
+
+    # Michelson text is parsed through the artifact cache; Micheline
+    # (michelsonCache.loadScript) is used as is
+    with span("parse"):
+        parsed_code = parseMichelson(michelsonCode) if isinstance(michelsonCode, str) else michelsonCode
+        parsed_storage = parseMichelson(initialStorage) if isinstance(initialStorage, str) else initialStorage
 
     print("Origination")
 
@@ -35,30 +75,9 @@ def origination(client, michelsonCode, initialStorage, initialBalance):
                 'storage': parsed_storage
             },
             balance = initialBalance * MUTEZ_CONV
-        ).autofill().sign()
-        
-        op_hash = op_group.inject(_async=False)['hash']
-        print(f"Operation send! Hash: {op_hash}")
-        
-        start_time = time.time()
-        timeout = 500 
-        op_result = None
-        
-        while time.time() - start_time < timeout:
-            try:
-                op_result = client.shell.blocks[-10:].find_operation(op_hash)
-                print(f"Operation Found")
-                break 
-            except StopIteration:
-                print(f"   -> Not yet completed (time passed: {int(time.time() - start_time)}s)")
-                time.sleep(15)
-
-        if not op_result:
-            print(f"\n❌ TIMEOUT: The operation has not be included after {timeout} seconds.")
-            print("Operation could be failed or not choosen by bakers. (check fees)")
-            return None
-        
-        return op_result
+        )
+        op_group, _ = await sendAsync(getAsyncRpc(client), op_group)
+        return await awaitOperationAsync(client, op_group.hash())
 
     except Exception as e:
         print(traceback.format_exc())
@@ -94,6 +113,8 @@ def contractInfoResult(op_result):
         
         total_cost_mutez = fee_mutez + storage_burn_cost_mutez
         deployReport["TotalCost"] = total_cost_mutez
+        deployReport["EstimatedFee"] = estimatedFee(content)
+        deployReport["mode"] = op_result.get("mode", "inject")
         
         return deployReport
 
@@ -101,59 +122,167 @@ def contractInfoResult(op_result):
         print(f"Errore: {e}")
 
 ##Contract Call
-def entrypointCall(client, contractAddress, entrypointName, parameters, tezAmount):
+def parseParameters(parameters):
+    if not parameters:
+        return []
 
-    contract_interface = client.contract(contractAddress)
-
-    print(f"\n Calling {entrypointName} entrypoint...\n")
-    
     parametersDict = {}
-    if parameters != [] and "=" in parameters[0]:
+    if "=" in parameters[0]:
         for param in parameters:
             paramSplitted = param.split("=")
             parametersDict[paramSplitted[0]] = paramSplitted[1]
-        parameters = [parametersDict]            
+        parameters = [parametersDict]
+    return parameters
+
+def buildCall(client, contractAddress, entrypointName, parameters, tezAmount):
+    # tezAmount may be fractional (tracePlan passes a Decimal)
+    amount = int(tezAmount * MUTEZ_CONV)
+    if isinstance(parameters, dict):
+        # already typed Micheline {entrypoint, value} (tracePlan): no interface lookup
+        return ContractCall(client._spawn_context(address=contractAddress), parameters=parameters,
+                            amount=amount)
+
+    contract_interface = getContract(client, contractAddress)
+    parameters = parseParameters(parameters)
+
+    entrypoint = getattr(contract_interface, entrypointName)
+    if parameters == []:
+        return entrypoint().with_amount(amount)
+    return entrypoint(*parameters).with_amount(amount)
+
+def entrypointCall(client, contractAddress, entrypointName, parameters, tezAmount):
+    return runSync(entrypointCallAsync(client, contractAddress, entrypointName, parameters, tezAmount))
+
+async def entrypointCallAsync(client, contractAddress, entrypointName, parameters, tezAmount):
+    with span("call", entrypoint=entrypointName):
+        return await callAsync(client, contractAddress, entrypointName, parameters, tezAmount)
+
+async def callAsync(client, contractAddress, entrypointName, parameters, tezAmount):
+
+    print(f"\n Calling {entrypointName} entrypoint...\n")
 
     try:
-        entrypoint = getattr(contract_interface, entrypointName)
-        if parameters == []:
-            op = entrypoint().with_amount(tezAmount * MUTEZ_CONV).send()
-        else:
-            op = entrypoint(*parameters).with_amount(tezAmount * MUTEZ_CONV).send()
-        
-        forged_op = op.forge()
-   
+        rpc = getAsyncRpc(client)
+        if not isinstance(parameters, dict):
+            await loadContractAsync(rpc, client, contractAddress)
+        # the interface parse and the cache file stay off the event loop
+        call = await asyncio.to_thread(buildCall, client, contractAddress, entrypointName, parameters, tezAmount)
+        key = estimateKey(client, contractAddress, call.parameters, call.amount)
+
+        op, cachedKey = await sendAsync(rpc, call.as_transaction(), key)
+        op_result = await awaitOperationAsync(client, op.hash())
+
+        if op_result and cachedKey and isExhausted(op_result):
+            # the cached limits were too low: simulate and send again
+            print("Cached estimate exhausted, simulating again")
+            await asyncio.to_thread(getEstimates().invalidate, cachedKey)
+            op, cachedKey = await sendAsync(rpc, call.as_transaction())
+            op_result = await awaitOperationAsync(client, op.hash())
+
+        if not op_result:
+            return {"error": f"operation {op.hash()} not included after {TIMEOUT}s"}
+
+        # any other failure is the call's own: callInfoResult reports it
+        op_result["limits"] = "cached" if cachedKey else "simulated"
+
+        op_result["weight"] = operationWeight(op.contents)
+        return op_result
+    except Exception as e:
+        # rejected by the node (simulation, injection): the reason is the report
+        return {"error": errorReason(e)}
+
+def errorReason(error):
+    # RpcError carries the node's error objects: keep their ids and messages
+    details = [d for d in error.args if isinstance(d, dict)]
+    if not details:
+        return str(error)
+    return "; ".join(f"{d.get('id')}: {d['message']}" if d.get("message") else str(d.get("id")) for d in details)
+
+async def awaitOperationAsync(client, op_hash):
+    print(f"Operation Send! Hash: {op_hash}")
+
+    start_time = time.time()
+    timeout = TIMEOUT
+
+    # Attendi la conferma
+    with span("inclusion", hash=op_hash):
+        op_result = await waitForOperationAsync(client, op_hash, timeout=timeout)
+
+    if not op_result:
+        print(f"\n❌ TIMEOUT: The operation has not be included after {timeout} seconds.")
+        print("Operation could be failed or not choosen by bakers. (check fees)")
+        return None
+
+    print(f"   -> Operation Found (time passed: {int(time.time() - start_time)}s)")
+    return op_result
+
+async def loadContractAsync(rpc, client, contractAddress):
+    # Fills contractCache with the contract code, so that getContract and
+    # getSchema do not download it again synchronously
+    network = shellKey(client)
+    if await asyncio.to_thread(getCache().lookup, network, contractAddress) is None:
+        script = await rpc.script(contractAddress)
+        await asyncio.to_thread(getCache().store, network, contractAddress, script["code"])
+
+def entrypointBatchCall(client, calls):
+    # calls: list of (contractAddress, entrypointName, parameters, tezAmount)
+    # All the calls are packed into one operation group signed by client's key,
+    # so they share a single signature, branch and inclusion wait.
+    print(f"\n Calling {len(calls)} entrypoints in one operation group...\n")
+
+    try:
+        contractCalls = [buildCall(client, *call) for call in calls]
+        with span("send", calls=len(calls)):
+            op = client.bulk(*contractCalls).send()
+
         op_hash = op.hash()
         print(f"Operation Send! Hash: {op_hash}")
-        
+
         start_time = time.time()
-        timeout = 500 
-        op_result = None
-        
-        # Attendi la conferma
-        while time.time() - start_time < timeout:
-            try:
-                op_result = client.shell.blocks[-10:].find_operation(op_hash)
-                print(f"   -> Operation Found")
-                break 
-            except StopIteration:
-                print(f"   -> Not yet completed (time passed: {int(time.time() - start_time)}s)")
-                time.sleep(15)
+        timeout = TIMEOUT
+        with span("inclusion", hash=op_hash):
+            op_result = waitForOperation(client, op_hash, timeout=timeout)
 
         if not op_result:
             print(f"\n❌ TIMEOUT: The operation has not be included after {timeout} seconds.")
             print("Operation could be failed or not choosen by bakers. (check fees)")
+            return {"error": f"operation {op_hash} not included after {timeout}s"}
+
+        print(f"   -> Operation Found (time passed: {int(time.time() - start_time)}s)")
 
-        op_result["weight"] = len(forged_op) // 2
+        op_result["weights"] = contentWeights(op.contents)
         return op_result
     except Exception as e:
-        print(f"Si è verificato un errore: {e}")
+        return {"error": errorReason(e)}
+
+def operationWeight(contents):
+    # Weight of every report, whatever the mode: bytes of the forged
+    # operation (branch and contents, len(op.forge()) // 2), signature
+    # excluded; the signature is reported apart as SignatureBytes
+    return BRANCH_BYTES + sum(len(forge_operation(content)) for content in contents)
+
+def contentWeights(contents):
+    # Bytes of every content on its own, plus an equal share of the branch
+    # the group pays once; they add up to operationWeight
+    groupOverhead = BRANCH_BYTES
+    sizes = [len(forge_operation(content)) for content in contents]
+    share = groupOverhead / len(sizes) if sizes else 0
+    return [int(round(size + share)) for size in sizes]
 
 def entrypointAnalyse(client, contractAddress):
+    return runSync(entrypointAnalyseAsync(client, contractAddress))
+
+async def entrypointAnalyseAsync(client, contractAddress):
+    try:
+        await loadContractAsync(getAsyncRpc(client), client, contractAddress)
+        return await asyncio.to_thread(getSchema, client, contractAddress, analyse=contractSchema)
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+def contractSchema(contract):
     entrypointSchema = {}
     
     try:
-        contract = client.contract(contractAddress)
         if len(contract.entrypoints) > 1:
             del contract.entrypoints["default"]
         
@@ -186,40 +315,98 @@ def entrypointAnalyse(client, contractAddress):
     except Exception as e:
         print(f"An error occurred: {e}")
         
-def callInfoResult(opResult):
+def estimatedFee(content, groupSize=1):
+    # The fee autofill asks for the gas and storage this receipt consumed
+    # (default thresholds). Unlike the fee paid, it does not depend on the
+    # limits the operation was sent with (cached estimate or simulation).
+    gasLimit = OperationResult.consumed_gas(content)
+    storageLimit = int(content.get('metadata', {}).get('operation_result', {}).get('paid_storage_size_diff', 0)) + OperationResult.burned(content)
+    if content.get('kind') in ("origination", "transaction"):
+        gasLimit += DEFAULT_GAS_RESERVE
+        storageLimit += DEFAULT_BURN_RESERVE
+    content = {k: v for k, v in content.items() if k != 'metadata'}
+    content.update(fee="0", gas_limit=str(gasLimit), storage_limit=str(storageLimit))
+    return calculate_fee(content, gasLimit, extra_size=1 + (BRANCH_BYTES + SIGNATURE_BYTES) // groupSize)
+
+def callInfoResult(opResult, groupSize=1):
     #print("\n" + "="*20 + " COST ANALYZIS " + "="*20)
     callReport = {}
     
     try:
+        # the call never made it to a receipt
+        if "error" in opResult:
+            return {"error": opResult["error"]}
+
         callReport["Hash"] = opResult["hash"]
         content = opResult['contents'][0]
         metadata = content.get('metadata', {})
         op_result_info = metadata.get('operation_result', {})
         
 
+        # inject (node receipt), simulate (run_operation) or interpret
+        # (offline estimate)
+        callReport["mode"] = opResult.get("mode", "inject")
+
         # BakerFee
         fee_mutez = int(content.get('fee', 0))
         callReport["BakerFee"] = fee_mutez
 
+        # Included but not applied: the fee is paid, the call did nothing
+        failure = operationFailure(opResult)
+        if failure:
+            callReport["error"] = failure
+            return callReport
+
+        callReport["EstimatedFee"] = estimatedFee(content, groupSize)
+        callReport["Limits"] = opResult.get("limits", "simulated")
+
         # Gas
         consumed_milligas = int(op_result_info.get('consumed_milligas', 0))
         callReport["Gas"] = consumed_milligas
 
         # Storage Fee (Burn)
-        if ('paid_storage_size_diff' in op_result_info):
-            storage_size_diff = int(op_result_info.get('paid_storage_size_diff', 0))
-            storage_burn_cost_mutez = storage_size_diff * 250
-            callReport["Storage"] = storage_burn_cost_mutez
-        else:
-            storage_burn_cost_mutez = 0
+        storage_size_diff = int(op_result_info.get('paid_storage_size_diff', 0))
+        storage_burn_cost_mutez = storage_size_diff * 250
+        callReport["Storage"] = storage_burn_cost_mutez
             
         
         total_cost_mutez = fee_mutez + storage_burn_cost_mutez
         callReport["TotalCost"] = total_cost_mutez
         
         callReport["Weight"] = opResult["weight"]
+        callReport["SignatureBytes"] = SIGNATURE_BYTES // groupSize
         
         return callReport
 
     except (KeyError, IndexError, TypeError) as e:
-        print(f"Errore: {e}")
\ No newline at end of file
+        print(f"Errore: {e}")
+
+def batchInfoResult(opResult):
+    # One callInfoResult-shaped report per transaction of the group. Fees,
+    # gas and storage are read from each content's own receipt, while Weight
+    # is the content size plus its share of the group overhead.
+    batchReport = []
+
+    try:
+        if "error" in opResult:
+            return {"error": opResult["error"]}
+
+        contents = opResult['contents']
+        weights = opResult.get("weights", [0] * len(contents))
+
+        for index, content in enumerate(contents):
+            if content.get('kind') != 'transaction':
+                continue
+            callReport = callInfoResult({
+                "hash": opResult["hash"],
+                "contents": [content],
+                "weight": weights[index]
+            }, groupSize=len(contents))
+            callReport["BatchIndex"] = index
+            callReport["BatchSize"] = len(contents)
+            batchReport.append(callReport)
+
+        return batchReport
+
+    except (KeyError, IndexError, TypeError) as e:
+        print(f"Errore: {e}")
@@ -0,0 +1,123 @@
+import json
+from pathlib import Path
+
+from clientPool import getPool
+from traceExecutor import scheduleTraces, MAX_WORKERS
+from tracePlan import tezAmount
+
+TRACES_PATH = "execution_traces/cardano_based_traces"
+CHAIN = "tezos"
+# Trace file -> contract folder, when the trace does not name it in its
+# "tezos" section
+CONTRACT_ALIASES = {
+    "auction": "Auction",
+    "bet": "Bet",
+    "htlc": "HTLC",
+    "transfer": "SimpleTransfer",
+    "vesting": "Vesting"
+}
+
+# Keys every "tezos" section must give: the Cardano datum in "parameters" is
+# not Tezos input and the step's actors do not say who signs
+STEP_KEYS = ("signer", "parameters", "amount")
+
+##Schema
+def isContractActor(actor):
+    # "auction_info account" is the script itself, not a signer
+    return actor.endswith(" account")
+
+def traceRoles(trace):
+    # trace_actors: [{"seller": "alice"}, {"best_bidder": "bob"}, ...]
+    # -> {"seller": ["alice"], "best_bidder": ["bob", ...]}
+    roles = {}
+    for entry in trace.get("trace_actors", []):
+        for role, name in entry.items():
+            roles.setdefault(role, []).append(str(name))
+    return roles
+
+def actorWallets(roles, walletIds, overrides=None):
+    # Every distinct actor name gets its own wallet, in order of appearance,
+    # cycling over wallet.json when there are more actors than wallets
+    overrides = overrides or {}
+    wallets = {}
+    for names in roles.values():
+        for name in names:
+            if name not in wallets:
+                wallets[name] = str(overrides.get(name, walletIds[len(wallets) % len(walletIds)]))
+    return wallets
+
+def parseTrace(trace, traceName, walletIds, overrides=None):
+    # -> (contract, [(stepId, waitingTime, row)]) with CSV-shaped rows
+    # [entrypoint, wallet, *parameters, tezAmount]. The chain section
+    # ("tezos": {...}) of every step gives its signer (a role or an actor
+    # name), parameters and amount, and may override contract and
+    # entrypoint. A step that cannot be mapped raises ValueError.
+    roles = traceRoles(trace)
+    wallets = actorWallets(roles, walletIds, overrides)
+    contract = trace.get(CHAIN, {}).get("contract") or CONTRACT_ALIASES.get(traceName, traceName.capitalize())
+
+    steps = []
+    uses = {}
+    for step in sorted(trace["trace_execution"], key=lambda s: int(s["sequence_id"])):
+        section = step.get(CHAIN) or {}
+        missing = [key for key in STEP_KEYS if key not in section]
+        if missing:
+            raise ValueError(f"{traceName} step {step['sequence_id']}: no {CHAIN} {', '.join(missing)}")
+        signer = str(section["signer"])
+        if isContractActor(signer):
+            raise ValueError(f"{traceName} step {step['sequence_id']}: {signer} cannot sign")
+
+        # a role held by several actors rotates over them, one per step
+        if signer in roles:
+            names = roles[signer]
+            name = names[uses.get(signer, 0) % len(names)]
+            uses[signer] = uses.get(signer, 0) + 1
+        else:
+            name = signer
+        if name not in wallets:
+            raise ValueError(f"{traceName} step {step['sequence_id']}: unknown actor {signer}")
+
+        # "0.5" or 0.5 tez: exact, planRow takes the Decimal as is
+        try:
+            amount = tezAmount(section["amount"])
+        except ValueError as e:
+            raise ValueError(f"{traceName} step {step['sequence_id']}: {e}")
+
+        row = [section.get("entrypoint", step["function_name"]), wallets[name],
+               *section["parameters"], amount]
+        steps.append((step["sequence_id"], float(step.get("waiting_time") or 0), row))
+
+    return contract, steps
+
+def crossTraceReader(tracesPath=TRACES_PATH):
+    traces = {}
+    for path in sorted(Path(tracesPath).glob("*.json")):
+        with open(path, 'r', encoding='utf-8') as file:
+            traces[path.stem] = json.load(file)
+    return traces
+
+##Runner
+def executeCrossTraces(traces, runStep, maxWorkers=MAX_WORKERS, timeScale=1.0, overrides=None, walletIds=None):
+    # runStep(contract, stepId, row) -> infoResult, e.g. execution.executionStepCsv.
+    # Results are keyed by trace name and sequence_id. A trace with a step
+    # that cannot be mapped is not run: every step of it gets the error.
+    walletIds = walletIds or getPool().walletIds()
+    contracts = {}
+    timelines = {}
+    rejected = {}
+    for traceName, trace in traces.items():
+        try:
+            contracts[traceName], timelines[traceName] = parseTrace(trace, traceName, walletIds, overrides)
+        except ValueError as e:
+            rejected[traceName] = {step["sequence_id"]: {"contract": traceName, "step": step["sequence_id"], "error": str(e)}
+                                   for step in trace.get("trace_execution", [])}
+
+    def run(traceName, stepId, row):
+        infoResult = runStep(contracts[traceName], stepId, row)
+        if infoResult is not None:
+            infoResult["trace"] = traceName
+        return infoResult
+
+    results = scheduleTraces(timelines, run, maxWorkers=maxWorkers, timeScale=timeScale)
+    results.update(rejected)
+    return results
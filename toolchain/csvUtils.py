@@ -6,6 +6,8 @@ def csvReader():
     executionTracesDict = {}
     try:
         for trace in executionTraces:
+            if not trace.endswith(".csv"):
+                continue
             fileName = "execution_traces/"+trace
             rows = {}
             
@@ -14,6 +16,8 @@ def csvReader():
 
                 i = 0
                 for row in csv_read:
+                    if not row:
+                        continue
                     rows[row.pop(0)] = row
                     i += 1
                     
@@ -25,18 +29,3 @@ def csvReader():
         print(f"Error: File '{fileName}' not found.")
     except Exception as e:
         print(f"Error: {e}")
-    
-
-
-def csvWriter(fileName, op_result):
-    '''
-    with open(fileName, mode='r', newline='', encoding='utf-8') as file_csv:
-        csv_read = csv.reader(file_csv)
-    ''' 
-        
-    newRow = [op_result["contract"], op_result["entryPoint"], op_result["TotalCost"], op_result["Weight"], op_result["Hash"]]
-    with open(fileName, mode='a', newline='', encoding='utf-8') as file_csv:
-        writer = csv.writer(file_csv)
-
-        writer.writerow(newRow)
-    
\ No newline at end of file
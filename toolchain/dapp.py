@@ -3,18 +3,18 @@ from pathlib import Path
 
 from contractUtils import (
     compileContract,
-    origination,
-    contractInfoResult,
-    entrypointAnalyse,
-    entrypointCall,
-    callInfoResult
+    entrypointAnalyse
 )
 from folderScan import folderScan
-from csvUtils import csvReader, csvWriter
-from jsonUtils import getAddress, addressUpdate, jsonWriter
-from pytezos import pytezos
-import json
-from main import executionSetup
+from buildCache import artifactStatus
+from csvUtils import csvReader
+from jsonUtils import getAddress
+from clientPool import getPool, getNetwork, setNetwork, NETWORKS
+from jobQueue import JobQueue
+from execution import executionSetupAll, openSink, deployContract, callContract
+from traceExecutor import isFailed
+
+JOBS_REFRESH = 2
 
 st.set_page_config(
     page_title="Tezos Smart Contract Toolchain",
@@ -24,15 +24,36 @@ st.set_page_config(
 st.title("🏗️ Tezos Smart Contract Toolchain")
 st.caption("An interface to compile, deploy, and interact with Tezos smart contracts.")
 
+##Cached resources
+# Reruns happen on every widget change: the clients, the job queue and the
+# data read from disk or from the node are kept across them.
+@st.cache_resource
+def get_job_queue():
+    return JobQueue()
+
+@st.cache_resource
+def load_client(network, wallet_id):
+    return getPool().getClient(wallet_id, network=network)
+
+@st.cache_data(ttl=60)
+def contract_list():
+    return sorted(folderScan("../contracts"))
+
+@st.cache_data(ttl=60)
+def wallet_list():
+    return sorted(getPool().walletIds(), key=lambda walletId: (len(walletId), walletId))
+
+@st.cache_data
+def entrypoint_schema(network, contract_address):
+    # The interface of a deployed contract never changes: keyed by address
+    return entrypointAnalyse(client=load_client(network, wallet_list()[0]), contractAddress=contract_address)
+
 def get_client(wallet_id):
     try:
-        with open("wallet.json", 'r', encoding='utf-8') as f:
-            wallets = json.load(f)
-        key = wallets.get(str(wallet_id))
-        if not key:
-            st.error(f"Wallet with ID {wallet_id} not found in wallet.json.")
-            return None
-        return pytezos.using(shell="ghostnet", key=key)
+        return load_client(getNetwork(), wallet_id)
+    except KeyError:
+        st.error(f"Wallet with ID {wallet_id} not found in wallet.json.")
+        return None
     except FileNotFoundError:
         st.error("The wallet.json file was not found. Make sure it is in the correct directory.")
         return None
@@ -40,25 +61,65 @@ def get_client(wallet_id):
         st.error(f"Error during client configuration: {e}")
         return None
 
+##Jobs
+# Run on the queue's worker threads: no st.* calls, progress goes through job
+def compile_job(job, contract_path, force):
+    job.update(total=1, message=f"Compiling {contract_path}")
+    if not compileContract(contractPath=contract_path, force=force):
+        raise Exception("Compilation failed. Check the console log for details.")
+    job.update(done=1, message="The Michelson files have been generated in the contract's directory.")
+    return {"contract": contract_path}
+
+def deploy_job(job, contract, wallet_id, initial_balance):
+    job.update(total=1, message=f"Originating {contract} from wallet {wallet_id}")
+    contract_info = deployContract(contract, wallet_id, initial_balance)
+    job.update(done=1, message=f"Deployed at {contract_info['address']}")
+    return contract_info
+
+def call_job(job, contract, wallet_id, entrypoint, parameters, tez_amount, save):
+    job.update(total=1, message=f"Calling {entrypoint} of {contract}")
+    info_result = callContract(contract, wallet_id, entrypoint, parameters, tez_amount)
+    if isFailed(info_result):
+        raise Exception(info_result.get("error", info_result) if info_result else "call failed")
+    job.update(done=1)
+    if save:
+        exportResult(info_result)
+        job.update(message="Result saved to file.")
+    return info_result
+
+def trace_job(job, execution_traces, mode, batch, pipeline):
+    job.update(total=sum(len(rows) for rows in execution_traces.values()))
+    all_results = executionSetupAll(execution_traces, batch=batch, mode=mode, pipeline=pipeline, onStepDone=job.stepDone)
+    with openSink(f"dapp trace {mode}") as sink:
+        for contract, results in all_results.items():
+            for element, result in results.items():
+                if not isFailed(result):
+                    exportResult(result, sink)
+    job.update(message="Results saved.")
+    return all_results
+
+def submit_job(label, fn, *args, wallets=()):
+    # jobs sharing a wallet run one after the other, in submission order
+    job = get_job_queue().submit(label, fn, *args, wallets=wallets)
+    st.info(f"Job #{job.id} submitted: follow it in the Jobs panel.")
+    return job
+
+##Views
 def compile_view(client):
     st.header("1. Compile SmartPy Contracts")
-    contracts = folderScan("../contracts")
+    contracts = contract_list()
     contract_to_compile = st.selectbox("Select a contract to compile:", options=contracts, key="compile_select")
 
+    force_compile = st.checkbox("Recompile even if nothing changed")
+
     if st.button("🚀 Compile"):
         if contract_to_compile and client:
             contract_path = f"../contracts/{contract_to_compile}/{contract_to_compile}.py"
-            with st.spinner(f"Compiling {contract_path}..."):
-                try:
-                    compileContract(contractPath=contract_path)
-                    st.success(f"Contract '{contract_to_compile}' compiled successfully!")
-                    st.info("The Michelson files have been generated in the contract's directory.")
-                except Exception as e:
-                    st.error(f"Error during compilation: {e}")
-
-def deploy_view(client):
+            submit_job(f"Compile {contract_to_compile}", compile_job, contract_path, force_compile)
+
+def deploy_view(client, wallet_id):
     st.header("2. Deploy a Contract (Origination)")
-    contracts = folderScan("../contracts")
+    contracts = contract_list()
     contract_to_deploy = st.selectbox("Select a contract to deploy:", options=contracts, key="deploy_select")
 
     initial_balance = st.number_input("Initial balance (in tez):", min_value=0, value=1, step=1)
@@ -72,39 +133,21 @@ def deploy_view(client):
                 st.error("Contract not compiled. Compile it before deploying.")
                 return
 
-            michelson_code = Path(michelson_path_str).read_text()
-            storage_code = Path(storage_path_str).read_text()
-
-            with st.spinner("Origination in progress... The operation may take a few minutes."):
-                try:
-                    op_result = origination(
-                        client=client,
-                        michelsonCode=michelson_code,
-                        initialStorage=storage_code,
-                        initialBalance=initial_balance
-                    )
-                    if op_result:
-                        contract_info = contractInfoResult(op_result=op_result)
-                        addressUpdate(contract=contract_to_deploy, newAddress=contract_info["address"])
-                        st.success(f"Contract '{contract_to_deploy}' deployed successfully!")
-                        st.write("New contract address:")
-                        st.code(contract_info["address"], language="text")
-                        st.write("Operation hash:")
-                        st.code(contract_info["hash"], language="text")
-                    else:
-                        st.error("Origination failed. Check the console log for details.")
-                except Exception as e:
-                    st.error(f"Error during deployment: {e}")
-
-def interact_view(client):
+            if artifactStatus(contract_to_deploy) == "stale":
+                st.warning("The compiled artifacts are older than the contract source. Recompile it to deploy the latest version.")
+
+            submit_job(f"Deploy {contract_to_deploy}", deploy_job, contract_to_deploy, wallet_id, initial_balance,
+                       wallets=[wallet_id])
+
+def interact_view(client, wallet_id):
     st.header("3. Interact with a Contract")
     try:
         deployed_contracts = getAddress()
         if not deployed_contracts:
-            st.warning("No deployed contracts found in `addressList.json`.")
+            st.warning("No deployed contracts found in the address registry.")
             return
     except Exception:
-        st.error("`addressList.json` not found or corrupted.")
+        st.error("The address registry is corrupted.")
         return
 
     contract_name = st.selectbox("Select a contract to interact with:", options=list(deployed_contracts.keys()))
@@ -114,7 +157,7 @@ def interact_view(client):
         st.info(f"Contract address: `{contract_address}`")
 
         try:
-            entrypoints_schema = entrypointAnalyse(client=client, contractAddress=contract_address)
+            entrypoints_schema = entrypoint_schema(getNetwork(), contract_address)
             entrypoint_name = st.selectbox("Select an entrypoint:", options=list(entrypoints_schema.keys()))
 
             params_input = ""
@@ -122,31 +165,13 @@ def interact_view(client):
                 params_input = st.text_input("Enter the parameters (comma-separated if multiple):", placeholder="value1,value2")
 
             tez_amount = st.number_input("Amount of Tez to send:", min_value=0.0, value=0.0, step=0.1, format="%.6f")
+            save_result = st.checkbox("Save result to CSV/JSON")
 
             if st.button("➡️ Execute Call"):
                 parameters = params_input.split(',') if params_input else []
-                with st.spinner(f"Calling entrypoint '{entrypoint_name}'..."):
-                    try:
-                        op_result = entrypointCall(
-                            client=client,
-                            contractAddress=contract_address,
-                            entrypointName=entrypoint_name,
-                            parameters=parameters,
-                            tezAmount=tez_amount
-                        )
-                        info_result = callInfoResult(opResult=op_result)
-                        info_result["contract"] = contract_name
-                        info_result["entryPoint"] = entrypoint_name
-
-                        st.success("Call executed successfully!")
-                        st.json(info_result)
-
-                        if st.checkbox("Save result to CSV/JSON"):
-                            exportResult(info_result)
-                            st.info("Results exported.")
-
-                    except Exception as e:
-                        st.error(f"Error during call: {e}")
+                submit_job(f"Call {entrypoint_name} of {contract_name}", call_job,
+                           contract_name, wallet_id, entrypoint_name, parameters, tez_amount, save_result,
+                           wallets=[wallet_id])
         except Exception as e:
             st.error(f"Unable to analyze contract entrypoints: {e}")
 
@@ -154,37 +179,76 @@ def trace_view():
     st.header("4. Execute Trace from CSV File")
     st.info("This function executes a series of predefined transactions from the files in `execution_traces/`.")
 
+    modes = {"Inject": "inject", "Simulate on the node": "simulate", "Interpret offline": "interpret"}
+    mode = modes[st.radio("Execution mode", list(modes), horizontal=True)]
+    batch_mode = mode == "inject" and st.checkbox("Batch consecutive calls of the same wallet into one operation group")
+    pipeline = 0
+    if mode == "inject" and not batch_mode:
+        pipeline = st.number_input("Pipelined wallets (wallets with an operation in flight, 0 = wait for each inclusion):",
+                                   min_value=0, value=0, step=1)
+
     if st.button("▶️ Start Trace Execution"):
         try:
             execution_traces = csvReader()
-            if not execution_traces:
-                st.warning("No execution traces found.")
-                return
-
-            with st.spinner("Executing traces..."):
-                all_results = {}
-                for contract, rows in execution_traces.items():
-                    st.write(f"--- Executing trace for **{contract}** ---")
-                    results = executionSetup(contract=contract, rows=rows)
-                    all_results[contract] = results
-                    for element, result in results.items():
-                        st.write(f"Step `{element}` completed.")
-                        exportResult(result)
-
-            st.success("All traces have been executed and the results saved.")
-            st.json(all_results)
-
         except Exception as e:
-            st.error(f"Error during trace execution: {e}")
-
-def exportResult(opResult):
-    fileName = "transactionsOutput"
-    csvWriter(fileName=fileName+".csv", op_result=opResult)
-    jsonWriter(fileName=fileName+".json", opReport=opResult)
-    st.success(f"Result of operation {opResult['entryPoint']} saved to file.")
+            st.error(f"Error reading the traces: {e}")
+            return
+        if not execution_traces:
+            st.warning("No execution traces found.")
+            return
+        # the traces sign with every wallet of wallet.json
+        submit_job(f"Trace {mode}", trace_job, execution_traces, mode, batch_mode, int(pipeline),
+                   wallets=[] if mode == "interpret" else wallet_list())
+
+def job_panel():
+    queue = get_job_queue()
+    jobs = queue.list()
+    st.header("Jobs")
+    if not jobs:
+        st.caption("No jobs yet.")
+        return
+    if st.button("Clear finished jobs"):
+        queue.clearFinished()
+        jobs = queue.list()
+
+    icons = {"queued": "⏳", "running": "🔄", "done": "✅", "failed": "❌"}
+    for job in jobs:
+        state = job.snapshot()
+        st.write(f"{icons[state['status']]} **#{state['id']} {state['label']}** — {state['status']} ({state['elapsed']}s)")
+        progress_text = f"{state['done']}/{state['total']}" if state["total"] else None
+        st.progress(job.progress(), text=progress_text)
+        with st.expander("Details", expanded=state["status"] in ("running", "failed") and state["id"] == jobs[0].id):
+            for message in state["messages"][-20:]:
+                st.text(message)
+            if state["error"]:
+                st.error(state["error"])
+            if state["result"] is not None:
+                st.json(state["result"], expanded=False)
+
+# Redrawn on its own every few seconds, without rerunning the whole page
+if hasattr(st, "fragment"):
+    job_panel = st.fragment(run_every=JOBS_REFRESH)(job_panel)
+
+def exportResult(opResult, sink=None):
+    if sink is not None:
+        sink.write(opResult)
+    else:
+        with openSink(f"dapp {opResult['contract']}") as sink:
+            sink.write(opResult)
 
 st.sidebar.header("🔧 Configuration")
-wallet_selection = st.sidebar.selectbox("Select an Account (from wallet.json):", options=["1", "2", "3"])
+networks = list(NETWORKS) + ([getNetwork()] if getNetwork() not in NETWORKS else [])
+network_selection = st.sidebar.selectbox("Network:", options=networks, index=networks.index(getNetwork()))
+if network_selection != getNetwork():
+    setNetwork(network_selection)
+wallet_selection = st.sidebar.selectbox("Select an Account (from wallet.json):", options=wallet_list())
+st.sidebar.caption(f"Client pool: {getPool().stats()}")
+st.sidebar.caption(f"Active jobs: {get_job_queue().active()}")
+if network_selection == "mock":
+    from mockNode import getChain
+    st.sidebar.caption(f"Mock chain: {getChain(network_selection).stats()}")
+    if st.sidebar.button("Bake a block"):
+        getChain(network_selection).bake()
 
 st.sidebar.header("Features")
 operation = st.sidebar.radio(
@@ -198,10 +262,15 @@ if client or operation == "Execute Trace":
     if operation == "Compile":
         compile_view(client)
     elif operation == "Deploy":
-        deploy_view(client)
+        deploy_view(client, wallet_selection)
     elif operation == "Interact":
-        interact_view(client)
+        interact_view(client, wallet_selection)
     elif operation == "Execute Trace":
         trace_view()
 else:
-    st.error("Cannot proceed without a valid Tezos client. Check the wallet selection and the `wallet.json` file.")
\ No newline at end of file
+    st.error("Cannot proceed without a valid Tezos client. Check the wallet selection and the `wallet.json` file.")
+
+st.divider()
+if not hasattr(st, "fragment") and st.button("🔄 Refresh jobs"):
+    st.rerun()
+job_panel()
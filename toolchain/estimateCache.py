@@ -0,0 +1,123 @@
+import hashlib
+import json
+import math
+import os
+import threading
+from pathlib import Path
+
+from confirmationTracker import shellKey
+from contractCache import getCache
+
+ESTIMATE_FILE = "cache/estimates.json"
+# Extra gas and storage on top of the autofilled limits when a cached
+# estimate is reused, so small variations (another sender, a longer map)
+# still fit
+ESTIMATE_MARGIN = 0.1
+EXHAUSTED_ERRORS = ("gas_exhausted", "storage_exhausted")
+
+##Keys
+def parameterShape(value):
+    # Micheline value with the literals replaced by their kind; strings and
+    # bytes keep their length, which changes the storage a call may pay
+    if isinstance(value, list):
+        return [parameterShape(item) for item in value]
+    if "prim" in value:
+        return [value["prim"], [parameterShape(arg) for arg in value.get("args", [])]]
+    kind = next(iter(value))
+    if kind in ("string", "bytes"):
+        return f"{kind}:{len(value[kind])}"
+    return kind
+
+def estimateKey(client, contractAddress, parameters, amount):
+    # (network, contract code hash, entrypoint, parameter shape, amount > 0)
+    network = shellKey(client)
+    entry = getCache().lookup(network, contractAddress)
+    code = entry["codeHash"] if entry is not None else contractAddress
+    shape = [code, parameters["entrypoint"], parameterShape(parameters["value"]), int(amount) > 0]
+    return network + "|" + hashlib.sha256(json.dumps(shape).encode()).hexdigest()
+
+##Cache
+class EstimateCache:
+    # Gas and storage limits measured by autofill, persisted on disk the same
+    # way as contractCache
+    def __init__(self, estimateFile=ESTIMATE_FILE, margin=ESTIMATE_MARGIN):
+        self.estimateFile = Path(estimateFile)
+        self.margin = margin
+        self.lock = threading.Lock()
+        self.entries = None
+        self.counters = {"hits": 0, "misses": 0, "retries": 0}
+
+    def _load(self):
+        # Must be called holding self.lock
+        if self.entries is None:
+            try:
+                with open(self.estimateFile, 'r', encoding='utf-8') as file:
+                    self.entries = json.load(file)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self.entries = {}
+        return self.entries
+
+    def _save(self):
+        # Must be called holding self.lock
+        self.estimateFile.parent.mkdir(parents=True, exist_ok=True)
+        tmpFile = f"{self.estimateFile}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmpFile, 'w', encoding='utf-8') as file:
+            json.dump(self.entries, file)
+        os.replace(tmpFile, self.estimateFile)
+
+    def lookup(self, key):
+        # -> (gasLimit, storageLimit) with the safety margin, or None
+        with self.lock:
+            entry = self._load().get(key)
+            self.counters["hits" if entry else "misses"] += 1
+        if entry is None:
+            return None
+        return (math.ceil(entry["gas_limit"] * (1 + self.margin)),
+                math.ceil(entry["storage_limit"] * (1 + self.margin)))
+
+    def store(self, key, gasLimit, storageLimit):
+        with self.lock:
+            self._load()[key] = {"gas_limit": int(gasLimit), "storage_limit": int(storageLimit)}
+            self._save()
+
+    def invalidate(self, key):
+        with self.lock:
+            self.counters["retries"] += 1
+            if self._load().pop(key, None) is not None:
+                self._save()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, entries=len(self._load()))
+
+
+_estimates = EstimateCache()
+
+def getEstimates():
+    return _estimates
+
+##Receipts
+def isExhausted(opResult):
+    # True when an operation sent with cached limits failed for lack of gas
+    # or storage, i.e. the estimate was too low rather than the call invalid
+    for content in opResult.get("contents", []):
+        result = content.get("metadata", {}).get("operation_result", {})
+        for error in result.get("errors", []):
+            if any(kind in error.get("id", "") for kind in EXHAUSTED_ERRORS):
+                return True
+    return False
+
+def operationFailure(opResult):
+    # -> "<status>: <error ids>" for the first content (or internal
+    # operation) that was not applied, None when the whole group was.
+    # Included operations can still have failed: the fee is paid, nothing
+    # else happens.
+    for content in opResult.get("contents", []):
+        metadata = content.get("metadata", {})
+        results = [metadata.get("operation_result", {})] + [i.get("result", {}) for i in metadata.get("internal_operation_results", [])]
+        for result in results:
+            status = result.get("status", "applied")
+            if status != "applied":
+                errors = [error.get("id", "") for error in result.get("errors", [])]
+                return f"{status}: {', '.join(errors)}" if errors else status
+    return None
@@ -0,0 +1,201 @@
+from contractUtils import *    
+from csvUtils import *
+from jsonUtils import *
+from functools import partial
+from clientPool import getClient, getReadClient, getPool, getNetwork
+from simulateUtils import simulateCall, interpretTraceCsv
+from reportSink import ReportSink, REPORT_FILE
+from resultsStore import getStore, StoreSink
+from tracePlan import buildPlan, planRow
+from pipeline import executePipelined
+from crossTrace import crossTraceReader, executeCrossTraces
+from traceExecutor import executeTraces, executeBatchedTraces, isFailed, MAX_WORKERS
+from michelsonCache import loadScript
+from contractCache import codeHash
+from spans import tagged, collectSpans, flushSpans, latencySummary, formatLatency
+
+# Deploy, call and trace jobs shared by the interactive menu (main.py), the
+# batch CLI (cli.py), the dapp and the benchmark
+def failedStep(contract, element, step, error):
+    return {"contract": contract, "entryPoint": step.entrypoint, "wallet": step.wallet, "step": element, "error": error}
+
+def executionStepPlanned(contract, element, step, callFunction=entrypointCall):
+    # step: tracePlan.PlannedStep, address and parameters already resolved
+    client = getClient(step.wallet)
+
+    with tagged(contract=contract, entrypoint=step.entrypoint, wallet=step.wallet, step=element):
+        opResult = callFunction(client=client, contractAddress=step.address, entrypointName=step.entrypoint, parameters=step.parameters, tezAmount=step.amount)
+    if opResult is None or "error" in opResult:
+        # rejected by the node, not included or not simulated: no receipt
+        return failedStep(contract, element, step, (opResult or {}).get("error", "no operation result"))
+    infoResult = callInfoResult(opResult=opResult)
+    infoResult["contract"] = contract
+    infoResult["entryPoint"] = step.entrypoint
+    infoResult["wallet"] = step.wallet
+    infoResult["step"] = element
+
+    return infoResult
+
+def executionStepCsv(contract, element, row, callFunction=entrypointCall):
+    return executionStepPlanned(contract, element, planRow(contract, row), callFunction=callFunction)
+
+def executionSetupCsv(contract,rows):
+    return executionSetupAll({contract: rows}, maxWorkers=1)[contract]
+
+def executionBatchPlanned(contract, groupId, group):
+    # group: consecutive (stepId, PlannedStep) pairs signed by the same
+    # wallet, sent as a single operation group
+    calls = [(step.address, step.entrypoint, step.parameters, step.amount) for _, step in group]
+    client = getClient(group[0][1].wallet)
+
+    with tagged(contract=contract, entrypoint="+".join(step.entrypoint for _, step in group), wallet=group[0][1].wallet, step=groupId):
+        opResult = entrypointBatchCall(client=client, calls=calls)
+    if opResult is None or "error" in opResult:
+        # the group is one operation: every step of it failed for that reason
+        error = (opResult or {}).get("error", "no operation result")
+        return {stepId: failedStep(contract, stepId, step, error) for stepId, step in group}
+    infoResults = batchInfoResult(opResult=opResult)
+
+    infoResultDict = {}
+    for (stepId, step), infoResult in zip(group, infoResults):
+        infoResult["contract"] = contract
+        infoResult["entryPoint"] = step.entrypoint
+        infoResult["wallet"] = step.wallet
+        infoResult["step"] = stepId
+        infoResultDict[stepId] = infoResult
+    return infoResultDict
+
+def executionSetupAll(contractExecutionTraces, maxWorkers=MAX_WORKERS, batch=False, mode="inject", pipeline=0, onStepDone=None, onStart=None):
+    # Same-contract steps keep their order, same-wallet steps keep their
+    # counter order, everything else runs concurrently. In batch mode the
+    # consecutive steps of one wallet share a single operation group.
+    # mode "simulate" dry-runs every step on the node, "interpret" replays
+    # the traces offline on the compiled .tz files. pipeline=K keeps up to
+    # K wallets with an operation in flight (one each) without waiting for
+    # each inclusion in turn.
+    # Every row is resolved and typed by tracePlan before anything is sent:
+    # contracts with a bad row are reported and skipped as a whole.
+    # onStepDone(contract, stepId, result) follows the progress, onStart()
+    # runs once the plan is built, right before the first step is sent.
+    if mode == "interpret":
+        return interpretSetupAll(contractExecutionTraces)
+
+    plan = buildPlan(contractExecutionTraces)
+    for contract, stepId, error in plan.errors:
+        print(f"Step {stepId} of {contract} rejected: {error}")
+    if onStepDone:
+        for contract, steps in plan.rejected().items():
+            for stepId, result in steps.items():
+                onStepDone(contract, stepId, result)
+    if onStart:
+        onStart()
+
+    if mode == "simulate":
+        results = executeTraces(plan.runnable(), runStep=partial(executionStepPlanned, callFunction=simulateCall), maxWorkers=maxWorkers, onStepDone=onStepDone)
+    elif pipeline:
+        results = executePipelined(plan.runnable(), depth=pipeline, onStepDone=onStepDone)
+    elif batch:
+        results = executeBatchedTraces(plan.runnable(), runBatch=executionBatchPlanned, maxWorkers=maxWorkers, onStepDone=onStepDone)
+    else:
+        results = executeTraces(plan.runnable(), runStep=executionStepPlanned, maxWorkers=maxWorkers, onStepDone=onStepDone)
+    rejected = plan.rejected()
+    return {contract: results.get(contract, rejected.get(contract, {})) for contract in contractExecutionTraces}
+
+def interpretSetupAll(contractExecutionTraces):
+    wallets = getPool().loadWallets()
+    allResults = {}
+    for contract, rows in contractExecutionTraces.items():
+        michelsonPath = Path(f"./{contract}/step_001_cont_0_contract.tz")
+        storagePath = Path(f"./{contract}/step_001_cont_0_storage.tz")
+        if not michelsonPath.exists() or not storagePath.exists():
+            allResults[contract] = {element: {"contract": contract, "step": element, "error": "contract not compiled"} for element in rows}
+            continue
+        allResults[contract] = interpretTraceCsv(contract, rows, michelsonPath.read_text(), storagePath.read_text(), wallets)
+    return allResults
+
+def jsonRows(rows):
+    # {"1": {"entrypoint": "start", "wallet": 1, "amount": 1, "parameters": [...]}}
+    # -> the CSV row layout [entrypoint, wallet, *parameters, tezAmount]
+    return {element: [step["entrypoint"], str(step["wallet"]), *step.get("parameters", []), step.get("amount", 0)]
+            for element, step in rows.items()}
+
+def executionSetupJson(contract,rows):
+    return executionSetupCsv(contract, jsonRows(rows))
+
+def openSink(label):
+    # Report files plus a new run in the SQLite cost history
+    store = getStore()
+    return ReportSink(REPORT_FILE, extra=[StoreSink(store, store.newRun(label))])
+
+def exportResult(opResult, sink=None):
+    # Without a sink the report is written and flushed immediately; trace
+    # runs pass their own sink and flush it once at the end.
+    if sink is not None:
+        sink.write(opResult)
+        return
+    with openSink(f"interact {opResult['contract']}") as sink:
+        sink.write(opResult)
+    print("\nReport Updated!\n\n")
+        
+    
+      
+##Jobs shared by the menu and the CLI
+def contractSource(contract, stdPath="../contracts/"):
+    return stdPath+contract+"/"+contract+".py"
+
+def deployContract(contract, walletSel, initialBalance):
+    if not Path("./"+contract).exists():
+        raise Exception(f"Contract {contract} must be compiled before")
+    michelsonCode, initialStorage = loadScript(contract)
+    with tagged(contract=contract, entrypoint="origination", wallet=walletSel):
+        op_result = origination(client=getClient(walletSel), michelsonCode=michelsonCode, initialStorage=initialStorage, initialBalance=initialBalance)
+    if op_result is None:
+        raise Exception(f"Origination of {contract} failed")
+    contractInfo = contractInfoResult(op_result=op_result)
+    addressUpdate(contract=contract, newAddress=contractInfo["address"], codeHash=codeHash(michelsonCode), wallet=walletSel)
+    store = getStore()
+    store.recordOrigination(store.newRun(f"deploy {contract}"), contract, contractInfo, wallet=walletSel, network=getNetwork())
+    contractInfo["contract"] = contract
+    return contractInfo
+
+def callContract(contract, walletSel, entrypointSel, parameters, tezAmount, mode="inject"):
+    # Same row layout as the CSV traces: [entrypoint, wallet, *parameters, tezAmount]
+    row = [entrypointSel, walletSel, *(parameters or []), tezAmount]
+    callFunction = simulateCall if mode == "simulate" else entrypointCall
+    return executionStepCsv(contract, None, row, callFunction=callFunction)
+
+def runTraces(formatSel="csv", mode="inject", batch=False, maxWorkers=MAX_WORKERS, only=None, timeScale=1.0, actors=None, pipeline=0):
+    # csv/json: execution_traces/<Contract>.csv|.json, keyed by contract.
+    # cardano: cross-chain traces scheduled on their waiting_time timeline,
+    # keyed by trace name (inject or simulate only).
+    # the per-phase latency of the run is printed at the end, the spans are
+    # appended to spans.jsonl
+    with collectSpans() as durations:
+        if formatSel == "cardano":
+            crossTraces = crossTraceReader()
+            if only:
+                crossTraces = {t: trace for t, trace in crossTraces.items() if t in only}
+            callFunction = simulateCall if mode == "simulate" else entrypointCall
+            allResults = executeCrossTraces(crossTraces, runStep=partial(executionStepCsv, callFunction=callFunction),
+                                            maxWorkers=maxWorkers, timeScale=timeScale, overrides=actors)
+        else:
+            if formatSel == "csv":
+                contractExecutionTraces = csvReader()
+            else:
+                contractExecutionTraces = {c: jsonRows(rows) for c, rows in jsonReader().items()}
+            if only:
+                contractExecutionTraces = {c: rows for c, rows in contractExecutionTraces.items() if c in only}
+            allResults = executionSetupAll(contractExecutionTraces, maxWorkers=maxWorkers, batch=batch, mode=mode, pipeline=pipeline)
+
+        with openSink(f"trace {mode}") as sink:
+            for contract in allResults:
+                results = allResults[contract]
+                for result in results:
+                    if isFailed(results[result]):
+                        print(f"Step {result} of {contract} failed: {results[result]}")
+                        continue
+                    exportResult(results[result], sink)
+
+    flushSpans()
+    print("\nLatency per phase:\n" + formatLatency(latencySummary(durations)))
+    return allResults
@@ -0,0 +1,395 @@
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+
+from pytezos.context.impl import ExecutionContext
+from pytezos.michelson.forge import forge_micheline
+from pytezos.michelson.instructions.base import MichelsonInstruction
+from pytezos.michelson.micheline import MichelineSequence, MichelsonRuntimeError
+from pytezos.michelson.program import MichelsonProgram
+from pytezos.michelson.stack import MichelsonStack
+
+from buildCache import ARTIFACTS
+from clientPool import getPool
+from contractUtils import parseParameters, MUTEZ_CONV
+from csvUtils import csvReader
+from michelsonCache import parseMichelson
+from simulateUtils import loadContract, walletAddress, DUMMY_SOURCE, DUMMY_CONTRACT, TRANSACTION_GAS, GAS_PER_BYTE, STORAGE_BYTE_COST
+from tracePlan import tezAmount
+
+# Approximate interpreter cost of one execution of each instruction, in
+# milligas: the constant part of the protocol's cost functions, without the
+# terms that grow with the size of the operands. Like the rest of the
+# offline model, only the node's figure is exact.
+INSTRUCTION_MILLIGAS = {
+    "COMPARE": 35, "ADD": 35, "SUB": 35, "SUB_MUTEZ": 20, "MUL": 50, "EDIV": 80, "ABS": 20, "NEG": 20,
+    "CONCAT": 50, "SIZE": 15, "SLICE": 30, "PACK": 300, "UNPACK": 300,
+    "GET": 15, "UPDATE": 20, "GET_AND_UPDATE": 60, "MEM": 45, "DIG": 15, "DUG": 15,
+    "MAP": 20, "ITER": 20, "LOOP": 10, "LOOP_LEFT": 10, "EXEC": 20, "APPLY": 140, "LAMBDA": 10,
+    "EMPTY_MAP": 300, "EMPTY_BIG_MAP": 300, "EMPTY_SET": 300,
+    "CONTRACT": 30, "TRANSFER_TOKENS": 60, "SET_DELEGATE": 30, "CREATE_CONTRACT": 60, "IMPLICIT_ACCOUNT": 10,
+    "FAILWITH": 170, "HASH_KEY": 600, "BLAKE2B": 450, "SHA256": 600, "SHA512": 700, "KECCAK": 1500, "SHA3": 1500,
+    "CHECK_SIGNATURE": 60000,
+}
+DEFAULT_MILLIGAS = 10
+# Pseudo-instructions for the parts of the cost that no instruction pays
+OPERATION_FRAME = "[operation]"
+BYTES_FRAME = "[script bytes]"
+INTERNAL_FRAME = "[internal operations]"
+DISPATCH_SECTION = "(dispatch)"
+TOP = 15
+
+INSTRUCTION_PRIM = re.compile(r'[A-Z][A-Z0-9_]*')
+INSTRUCTION_TOKEN = re.compile(r'(?<![\w%@:.])[A-Z][A-Z0-9_]*\b')
+STRING = re.compile(r'"(?:[^"\\]|\\.)*"')
+SECTION_COMMENT = re.compile(r'^==\s*(.+?)\s*==$')
+
+##Source map
+def isInstruction(prim):
+    return INSTRUCTION_PRIM.fullmatch(prim) is not None
+
+def instructionLabel(expr):
+    # "DUP 4", "GET 5", "PUSH", "IF_LEFT"
+    numbers = [a["int"] for a in expr.get("args", []) if isinstance(a, dict) and "int" in a]
+    return " ".join([expr["prim"], *numbers[:1]]) if expr["prim"] != "PUSH" else "PUSH"
+
+def preorder(expr):
+    # Every instruction primitive of a Micheline tree, in source order
+    if isinstance(expr, list):
+        for item in expr:
+            yield from preorder(item)
+    elif isinstance(expr, dict) and "prim" in expr:
+        if isInstruction(expr["prim"]):
+            yield expr
+        for arg in expr.get("args", []):
+            yield from preorder(arg)
+
+def sourceMap(michelsonText):
+    # -> [{"line", "section", "statement", "statementLine"}] for every
+    # instruction token of the code section, in source order. section is the
+    # enclosing SmartPy "# == name ==" comment, statement the last SmartPy
+    # comment line before the instruction in its block; both end with the
+    # block they were written in.
+    entries = []
+    sections = []
+    statements = []
+    depth = 0
+    inCode = False
+    for number, line in enumerate(michelsonText.splitlines(), start=1):
+        stripped = line.strip()
+        if not inCode:
+            if not stripped.startswith("code"):
+                continue
+            inCode = True
+            stripped = stripped[len("code"):]
+
+        if stripped.startswith("#"):
+            comment = stripped[1:].split(" # ")[0].strip()
+            section = SECTION_COMMENT.match(comment)
+            if section:
+                sections = [s for s in sections if s[0] < depth] + [(depth, section.group(1), number)]
+                statements = [s for s in statements if s[0] < depth]
+            elif comment:
+                statements = [s for s in statements if s[0] < depth] + [(depth, comment, number)]
+            continue
+
+        code = STRING.sub('""', stripped).split("#")[0]
+        for token in re.finditer(r'[{}]|' + INSTRUCTION_TOKEN.pattern, code):
+            if token.group() == "{":
+                depth += 1
+            elif token.group() == "}":
+                depth -= 1
+                sections = [s for s in sections if s[0] <= depth]
+                statements = [s for s in statements if s[0] <= depth]
+            else:
+                entries.append({
+                    "line": number,
+                    "section": sections[-1][1] if sections else DISPATCH_SECTION,
+                    "statement": statements[-1][1] if statements else None,
+                    "statementLine": statements[-1][2] if statements else None
+                })
+    return entries
+
+def codeSection(script):
+    return next(section["args"][0] for section in script if section.get("prim") == "code")
+
+##Instrumented interpreter
+def indexProgram(node, expr, nodes):
+    # Walks the instruction classes of a loaded program next to its
+    # Micheline: nodes gets (class, instruction index in source order, expr).
+    # Data arguments (PUSH values, lambdas in data) only advance the index.
+    if issubclass(node, MichelsonInstruction):
+        nodes.append((node, len(nodes), expr))
+        args = expr.get("args", [])
+    elif issubclass(node, MichelineSequence):
+        args = expr
+    else:
+        return
+    for arg, argExpr in zip(node.args, args):
+        if isinstance(arg, type) and issubclass(arg, (MichelsonInstruction, MichelineSequence)):
+            indexProgram(arg, argExpr, nodes)
+        else:
+            for nested in preorder(argExpr):
+                nodes.append((None, len(nodes), nested))
+
+def instrument(nodes, counts):
+    # Every instruction class of the program is its own type: wrap its
+    # execute so that each run counts one execution at its index
+    for node, index, _ in nodes:
+        if node is None:
+            continue
+        run = node.execute
+
+        def execute(cls, stack, stdout, context, run=run, index=index):
+            counts[index] = counts.get(index, 0) + 1
+            return run(stack, stdout, context)
+        node.execute = classmethod(execute)
+
+def runProfiled(script, storage, entrypoint, parameter, amount, sender=DUMMY_SOURCE, source=None,
+                balance=0, now=None, address=DUMMY_CONTRACT, level=None):
+    # Interpreter.run_code with counting instructions. -> (counts by
+    # instruction index, program nodes, operations, new storage)
+    context = ExecutionContext(
+        amount=amount,
+        source=source or sender,
+        sender=sender,
+        balance=balance,
+        script={'code': script, 'storage': storage},
+        now=now if now is not None else int(time.time()),
+        address=address,
+        level=level
+    )
+    program = MichelsonProgram.load(context, with_code=True)
+    nodes = []
+    indexProgram(program.code.args[0], codeSection(script), nodes)
+    counts = {}
+    instrument(nodes, counts)
+
+    stack, stdout = MichelsonStack(), []
+    res = program.instantiate(entrypoint=entrypoint, parameter=parameter, storage=storage)
+    res.begin(stack, stdout, context)
+    res.execute(stack, stdout, context)
+    operations, newStorage, _, _ = res.end(stack, stdout)
+    return counts, nodes, operations, newStorage
+
+def profileCall(michelsonCode, storage, entrypointName, parameters, tezAmount,
+                sender=DUMMY_SOURCE, balance=0, now=None, address=DUMMY_CONTRACT, level=None):
+    # One entrypoint call on the offline interpreter, same inputs as
+    # simulateUtils.interpretCall. -> {"frames": {(section, statement,
+    # statementLine, instruction, line): [count, milligas]}, "milligas",
+    # "storageDiff", "storage", "balance", "operations"}
+    contract = loadContract(michelsonCode)
+    entrypoint = getattr(contract, entrypointName)
+    parameters = parseParameters(parameters)
+    call = entrypoint(*parameters) if parameters else entrypoint()
+    amount = int(tezAmount * MUTEZ_CONV)
+    script = contract.context.script['code']
+    storageExpr = parseMichelson(storage) if isinstance(storage, str) else storage
+
+    try:
+        counts, nodes, operations, newStorage = runProfiled(
+            script, storageExpr, call.parameters['entrypoint'], call.parameters['value'], amount,
+            sender=sender, balance=balance, now=now, address=address, level=level)
+    except MichelsonRuntimeError as e:
+        raise Exception(f"{entrypointName} failed: {e.format_stdout()}") from None
+
+    lines = sourceMap(michelsonCode)
+    if len(lines) != len(nodes):
+        # comments or formatting the tokenizer does not follow: profile by
+        # instruction only
+        lines = [{"line": None, "section": DISPATCH_SECTION, "statement": None, "statementLine": None}] * len(nodes)
+
+    frames = {}
+    for index, count in counts.items():
+        expr = nodes[index][2]
+        source = lines[index]
+        key = (source["section"], source["statement"], source["statementLine"], instructionLabel(expr), source["line"])
+        frame = frames.setdefault(key, [0, 0])
+        frame[0] += count
+        frame[1] += count * INSTRUCTION_MILLIGAS.get(expr["prim"], DEFAULT_MILLIGAS)
+
+    scriptBytes = len(forge_micheline(script)) + len(forge_micheline(storageExpr)) + len(forge_micheline(call.parameters['value']))
+    frames[(None, None, None, OPERATION_FRAME, None)] = [1, TRANSACTION_GAS * 1000]
+    frames[(None, None, None, BYTES_FRAME, None)] = [scriptBytes, GAS_PER_BYTE * scriptBytes * 1000]
+    if operations:
+        frames[(None, None, None, INTERNAL_FRAME, None)] = [len(operations), len(operations) * TRANSACTION_GAS * 1000]
+
+    storageDiff = len(forge_micheline(newStorage)) - len(forge_micheline(storageExpr))
+    return {
+        "frames": frames,
+        "milligas": sum(frame[1] for frame in frames.values()),
+        "storageDiff": storageDiff,
+        "storage": newStorage,
+        "balance": balance + amount - sum(int(op.get("amount", 0)) for op in operations),
+        "operations": operations
+    }
+
+##Profiles
+def addCall(profiles, entrypointName, result):
+    # profiles: {entrypoint: {"calls", "milligas", "storageDiff", "frames"}}
+    profile = profiles.setdefault(entrypointName, {"calls": 0, "milligas": 0, "storageDiff": 0, "frames": {}})
+    profile["calls"] += 1
+    profile["milligas"] += result["milligas"]
+    profile["storageDiff"] += result["storageDiff"]
+    for key, (count, milligas) in result["frames"].items():
+        frame = profile["frames"].setdefault(key, [0, 0])
+        frame[0] += count
+        frame[1] += milligas
+
+def profileTrace(contract, rows, michelsonCode, initialStorage, wallets, initialBalance=0, level=None):
+    # Replays a trace like simulateUtils.interpretTraceCsv, threading storage
+    # and balance between the steps, and profiles every call.
+    # -> (profiles, {step: error})
+    profiles = {}
+    errors = {}
+    storage = initialStorage
+    balance = int(initialBalance * MUTEZ_CONV)
+    for element, row in rows.items():
+        entrypointSel = row[0]
+        try:
+            result = profileCall(michelsonCode, storage, entrypointSel, row[2:len(row)-1], tezAmount(row[len(row)-1]),
+                                 sender=walletAddress(wallets[str(row[1])]), balance=balance, level=level)
+        except Exception as e:
+            errors[element] = str(e)
+            continue
+        storage, balance = result["storage"], result["balance"]
+        addCall(profiles, entrypointSel, result)
+    return profiles, errors
+
+def fixedCosts(profile):
+    # -> {pseudo-instruction: milligas} of the cost outside the interpreter
+    return {instruction: milligas for (section, _, _, instruction, _), (_, milligas) in profile["frames"].items()
+            if section is None}
+
+def hotInstructions(profile):
+    # -> [(instruction, count, milligas)] of the interpreted instructions,
+    # most expensive first
+    totals = {}
+    for (section, _, _, instruction, _), (count, milligas) in profile["frames"].items():
+        if section is None:
+            continue
+        total = totals.setdefault(instruction, [0, 0])
+        total[0] += count
+        total[1] += milligas
+    return sorted(((i, c, m) for i, (c, m) in totals.items()), key=lambda t: (-t[2], t[0]))
+
+def hotStatements(profile):
+    # -> [(section, statement line, statement, count, milligas)] by SmartPy
+    # statement, most expensive first
+    totals = {}
+    for (section, statement, statementLine, instruction, _), (count, milligas) in profile["frames"].items():
+        if section is None:
+            continue
+        total = totals.setdefault((section, statementLine, statement), [0, 0])
+        total[0] += count
+        total[1] += milligas
+    return sorted(((*key, c, m) for key, (c, m) in totals.items()), key=lambda t: (-t[4], t[1] or 0))
+
+def frameName(text):
+    # folded stacks separate frames with ";" and end with " <weight>"
+    return re.sub(r'\s+', ' ', str(text).replace(";", ",")).strip()
+
+def foldedStacks(contract, profiles):
+    # Brendan Gregg's folded format, weighted in milligas:
+    # Contract;entrypoint;section;statement;INSTRUCTION milligas
+    stacks = {}
+    for entrypointName, profile in profiles.items():
+        for (section, statement, statementLine, instruction, _), (_, milligas) in profile["frames"].items():
+            frames = [contract, entrypointName]
+            if section is not None:
+                frames.append(section)
+            if statement is not None:
+                frames.append(f"L{statementLine} {statement}")
+            frames.append(instruction)
+            stack = ";".join(frameName(f) for f in frames)
+            stacks[stack] = stacks.get(stack, 0) + milligas
+    return [f"{stack} {milligas}" for stack, milligas in sorted(stacks.items())]
+
+def formatProfiles(contract, profiles, top=TOP):
+    lines = []
+    for entrypointName, profile in profiles.items():
+        calls = profile["calls"]
+        fixed = fixedCosts(profile)
+        interpreted = profile["milligas"] - sum(fixed.values())
+        total = interpreted or 1
+        # the headline is what the instructions below add up to; the fixed
+        # frames are constants of the offline model and usually dominate
+        lines.append(f"\n## {contract}.{entrypointName}: {calls} call(s), interpreter {interpreted / calls / 1000:.3f} gas per call, "
+                     f"storage diff {profile['storageDiff'] / calls:+.0f} bytes per call "
+                     f"({max(0, profile['storageDiff']) * STORAGE_BYTE_COST // calls} mutez burnt)")
+        lines.append("Fixed frames, modelled not measured: "
+                     + ", ".join(f"{name} {milligas / calls / 1000:.3f} gas" for name, milligas in fixed.items())
+                     + f" (model total {profile['milligas'] / calls / 1000:.3f} gas per call)")
+        lines.append("\n| Instruction | Count | Milligas | Share |")
+        lines.append("|:---|---:|---:|---:|")
+        for instruction, count, milligas in hotInstructions(profile)[:top]:
+            lines.append(f"| {instruction} | {count} | {milligas} | {milligas / total:.1%} |")
+        statements = hotStatements(profile)
+        if statements:
+            lines.append("\n| Section | Line | Statement | Instructions | Milligas | Share |")
+            lines.append("|:---|---:|:---|---:|---:|---:|")
+            for section, statementLine, statement, count, milligas in statements[:top]:
+                lines.append(f"| {section} | {statementLine or ''} | {(statement or '').replace('|', '/')} | {count} | "
+                             f"{milligas} | {milligas / total:.1%} |")
+    return "\n".join(lines) if lines else "No call profiled."
+
+def profileJson(profiles):
+    return {entrypointName: {
+        "calls": profile["calls"],
+        "interpreterMilligas": profile["milligas"] - sum(fixedCosts(profile).values()),
+        "modelMilligas": profile["milligas"],
+        "storageDiff": profile["storageDiff"],
+        "fixedModel": fixedCosts(profile),
+        "instructions": [{"instruction": i, "count": c, "milligas": m} for i, c, m in hotInstructions(profile)],
+        "statements": [{"section": s, "line": l, "statement": t, "count": c, "milligas": m}
+                       for s, l, t, c, m in hotStatements(profile)]
+    } for entrypointName, profile in profiles.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline gas/storage profile of a compiled contract, per entrypoint, Michelson instruction and SmartPy statement.")
+    parser.add_argument("contract", help="compiled contract folder, e.g. OracleBet")
+    parser.add_argument("--entrypoint", help="profile one call instead of replaying execution_traces/<contract>.csv")
+    parser.add_argument("--param", action="append", default=[], help="call parameter, as in the CSV traces, repeatable")
+    parser.add_argument("--amount", type=tezAmount, default=0, help="tez sent with the call, e.g. 0.5")
+    parser.add_argument("--sender", default=DUMMY_SOURCE)
+    parser.add_argument("--storage", help="Michelson storage of the call, defaults to the initial storage")
+    parser.add_argument("--balance", type=tezAmount, default=0, help="contract balance in tez before the first call")
+    parser.add_argument("--level", type=int, help="block level seen by LEVEL")
+    parser.add_argument("--top", type=int, default=TOP)
+    parser.add_argument("--folded", help="write flamegraph folded stacks to this file")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    michelsonPath, storagePath = (Path(args.contract) / artifact for artifact in ARTIFACTS)
+    if not michelsonPath.exists() or not storagePath.exists():
+        raise SystemExit(f"{args.contract} must be compiled before")
+    michelsonCode = michelsonPath.read_text()
+    storage = args.storage or storagePath.read_text()
+
+    if args.entrypoint:
+        profiles = {}
+        try:
+            result = profileCall(michelsonCode, storage, args.entrypoint, args.param, args.amount,
+                                 sender=args.sender, balance=int(args.balance * MUTEZ_CONV), level=args.level)
+        except Exception as e:
+            raise SystemExit(str(e))
+        addCall(profiles, args.entrypoint, result)
+    else:
+        rows = (csvReader() or {}).get(args.contract)
+        if rows is None:
+            raise SystemExit(f"no execution_traces/{args.contract}.csv, give --entrypoint")
+        profiles, errors = profileTrace(args.contract, rows, michelsonCode, storage, getPool().loadWallets(),
+                                        args.balance, args.level)
+        for element, error in errors.items():
+            print(f"step {element} not profiled: {error}")
+
+    print(json.dumps(profileJson(profiles), indent=4) if args.json else formatProfiles(args.contract, profiles, args.top))
+    if args.folded:
+        with open(args.folded, 'w', encoding='utf-8') as file:
+            file.writelines(line + "\n" for line in foldedStacks(args.contract, profiles))
+        print(f"\nFolded stacks written to {args.folded} (flamegraph.pl / speedscope, weights in milligas)")
+
+if __name__ == "__main__":
+    main()
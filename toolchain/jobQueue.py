@@ -0,0 +1,149 @@
+import itertools
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_JOBS = 4
+MAX_HISTORY = 50
+
+##Jobs
+class Job:
+    # State of one background job, read by the UI while the worker updates it
+    def __init__(self, jobId, label, wallets=()):
+        self.id = jobId
+        self.label = label
+        self.wallets = frozenset(str(w) for w in wallets)
+        self.status = "queued"
+        self.done = 0
+        self.total = None
+        self.messages = []
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.lock = threading.Lock()
+
+    def update(self, done=None, total=None, message=None):
+        with self.lock:
+            if done is not None:
+                self.done = done
+            if total is not None:
+                self.total = total
+            if message:
+                self.messages.append(message)
+
+    def stepDone(self, contract, stepId, result):
+        # traceExecutor onStepDone callback
+        with self.lock:
+            self.done += 1
+            failed = result is None or "error" in result
+            self.messages.append(f"{contract} step {stepId} {'failed' if failed else 'completed'}")
+
+    def progress(self):
+        with self.lock:
+            if self.status == "done":
+                return 1.0
+            if not self.total:
+                return 0.0
+            return min(1.0, self.done / self.total)
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "id": self.id,
+                "label": self.label,
+                "status": self.status,
+                "done": self.done,
+                "total": self.total,
+                "messages": list(self.messages),
+                "result": self.result,
+                "error": self.error,
+                "elapsed": round(self.elapsed(), 1)
+            }
+
+##Queue
+class JobQueue:
+    # Runs long operations (origination, calls, trace runs) on worker
+    # threads. fn(job, *args, **kwargs) reports progress through job.update
+    # and its return value becomes job.result. Jobs signing with a common
+    # wallet run one at a time, in submission order: two operations of one
+    # source would race for the same counter.
+    def __init__(self, maxWorkers=MAX_JOBS, maxHistory=MAX_HISTORY):
+        self.pool = ThreadPoolExecutor(max_workers=maxWorkers, thread_name_prefix="job")
+        self.maxHistory = maxHistory
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.jobs = {}
+        self.waiting = []
+        self.busyWallets = set()
+
+    def submit(self, label, fn, *args, wallets=(), **kwargs):
+        with self.lock:
+            job = Job(next(self.ids), label, wallets)
+            self.jobs[job.id] = job
+            # forget the oldest finished jobs beyond the history size
+            finished = [i for i, j in self.jobs.items() if j.finished]
+            for oldId in finished[:max(0, len(self.jobs) - self.maxHistory)]:
+                del self.jobs[oldId]
+            self.waiting.append((job, fn, args, kwargs))
+            self._dispatch()
+        return job
+
+    def _dispatch(self):
+        # Called with self.lock held: starts every waiting job whose wallets
+        # are neither busy nor claimed by an earlier waiting job
+        claimed = set(self.busyWallets)
+        for entry in list(self.waiting):
+            job = entry[0]
+            if job.wallets & claimed:
+                claimed |= job.wallets
+                continue
+            self.waiting.remove(entry)
+            self.busyWallets |= job.wallets
+            claimed |= job.wallets
+            self.pool.submit(self._run, *entry)
+
+    def _run(self, job, fn, args, kwargs):
+        with job.lock:
+            job.status = "running"
+            job.started = time.time()
+        try:
+            result = fn(job, *args, **kwargs)
+            with job.lock:
+                job.result = result
+                job.status = "done"
+        except Exception as e:
+            print(traceback.format_exc())
+            with job.lock:
+                job.error = str(e)
+                job.status = "failed"
+        finally:
+            with job.lock:
+                job.finished = time.time()
+            with self.lock:
+                self.busyWallets -= job.wallets
+                self._dispatch()
+
+    def get(self, jobId):
+        with self.lock:
+            return self.jobs.get(jobId)
+
+    def list(self):
+        # newest first
+        with self.lock:
+            return sorted(self.jobs.values(), key=lambda job: job.id, reverse=True)
+
+    def active(self):
+        return sum(1 for job in self.list() if job.status in ("queued", "running"))
+
+    def clearFinished(self):
+        with self.lock:
+            for jobId in [i for i, j in self.jobs.items() if j.finished]:
+                del self.jobs[jobId]
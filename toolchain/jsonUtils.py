@@ -1,50 +1,23 @@
 import json
 from folderScan import folderScan
+from contractCache import invalidateAddress
+from addressRegistry import getRegistry
 
-
-def addressUpdate(contract,newAddress):
-    addressList = "../contracts/addressList.json"
-    with open(addressList, 'r', encoding='utf-8') as file:
-        addressValid = json.load(file)
-
-    addressValid[contract] = newAddress
-        
-    with open(addressList, 'w', encoding='utf-8') as file:
-        json.dump(addressValid, file, indent=4)
-    
-    return addressValid
+# Addresses live in addressRegistry (one file per network, every deployment
+# kept); these are the name -> address views the toolchain has always used.
+def addressUpdate(contract, newAddress, codeHash=None, wallet=None):
+    registry = getRegistry()
+    invalidateAddress(registry.register(contract, newAddress, codeHash=codeHash, wallet=wallet))
+    return registry.addressMap()
 
 def getAddress():
-    addressList = "../contracts/addressList.json"
-    with open(addressList, 'r', encoding='utf-8') as file:
-        addressValid = json.load(file)
-        
-    return addressValid
+    # contract name -> current address
+    return getRegistry().addressMap()
 
+def getAliases():
+    # alias -> address, e.g. the "<Contract>#<n>" bulk instances
+    return getRegistry().aliasMap()
 
-def jsonWriter(fileName, opReport):
-    transactionsValid = {}
-    
-    try:
-        with open(fileName, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-            
-        if isinstance(data, dict):
-            transactionsValid = data
-    except(FileNotFoundError, json.JSONDecodeError):
-        pass
-        
-        
-    item = {
-        "Entrypoint" : opReport["entryPoint"],
-        "TotalCost" : opReport["TotalCost"],
-        "Weight" : opReport["Weight"],
-        "Hash" : opReport["Hash"]
-    }
-    transactionsValid[opReport["contract"]] = item
-    
-    with open(fileName, 'w', encoding='utf-8') as file:
-        json.dump(transactionsValid, file, indent=4)
 
 def jsonReader():
     executionTraces = folderScan("execution_traces")
@@ -52,6 +25,8 @@ def jsonReader():
     
     try:
         for trace in executionTraces:
+            if not trace.endswith(".json"):
+                continue
             fileName = "execution_traces/"+trace
             
             with open(fileName, 'r', encoding='utf-8') as file:
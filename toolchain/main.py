@@ -1,12 +1,13 @@
-from contractUtils import *    
+from execution import *
 from folderScan import *
-from csvUtils import *
-from jsonUtils import *
+import sys
+from buildCache import artifactStatus
+from bulkCompile import compileAll, summaryTable, MAX_JOBS
 
 def interactionSetup(client, contract):
     addressValid = getAddress()
     contractAddress = addressValid[contract]
-    contractInterface = pytezos.contract(contractAddress)
+    contractInterface = getContract(getReadClient(), contractAddress)
     entrypoints = contractInterface.entrypoints
     if len(entrypoints) > 1:
         del entrypoints["default"]
@@ -35,146 +36,84 @@ def interactionSetup(client, contract):
     infoResult["contract"] = contract
     infoResult["entryPoint"] = entryList[entrypointSel-1]
     return infoResult
-
-def executionSetupCsv(contract,rows):
-    infoResultDict = {}
-    for element in rows:
-        row = rows[element]
-        entrypointSel = row[0]
-        walletSel = row[1]
-        tezAmount = int(row[len(row)-1])
-        if row[2:len(row)-1] == []:
-            parameters = []
-        else:
-            parameters = row[2:len(row)-1]
-         
-        addressValid = getAddress()
-        contractAddress = addressValid[contract]
-        contractInterface = pytezos.contract(contractAddress)
-        entrypoints = contractInterface.entrypoints
-        if entrypointSel not in entrypoints:
-            raise "Entrypoint not found: " + entrypointSel
-        
-        with open("wallet.json", 'r', encoding='utf-8') as file:
-                wallet = json.load(file)
-        key = wallet[walletSel]
-        client = pytezos.using(shell="ghostnet", key=key)
-        
-        opResult = entrypointCall(client=client, contractAddress=contractAddress, entrypointName=entrypointSel, parameters=parameters, tezAmount=tezAmount)
-        infoResult = callInfoResult(opResult=opResult)
-        infoResult["contract"] = contract
-        infoResult["entryPoint"] = entrypointSel
-
-        infoResultDict[element] = infoResult
-
-    return infoResultDict
-
-def executionSetupJson(contract,rows):
-    infoResultDict = {}
-    
-    for element in rows:
-        entrypointSel = rows["entrypoint"]
-        walletSel = rows["wallet"]
-        addressValid = getAddress()
-        contractAddress = addressValid[contract]
-        contractInterface = pytezos.contract(contractAddress)
-        entrypoints = contractInterface.entrypoints
-        if entrypointSel not in entrypoints:
-            raise "Entrypoint not found: " + entrypointSel
-        
-        with open("wallet.json", 'r', encoding='utf-8') as file:
-                wallet = json.load(file)
-        key = wallet[walletSel]
-        client = pytezos.using(shell="ghostnet", key=key)
-        
-        opResult = entrypointCall(client=client, contractAddress=contractAddress, entrypointName=entrypointSel, parameters=parameters, tezAmount=tezAmount)
-        infoResult = callInfoResult(opResult=opResult)
-        infoResult["contract"] = contract
-        infoResult["entryPoint"] = entrypointSel
-
-        infoResultDict[element] = infoResult
-    
-    return infoResultDict
-
-def exportResult(opResult):
-    fileName = "transactionsOutput"
-    csvWriter(fileName=fileName+".csv", op_result=opResult)
-    print("\nCSV Updated!\n\n")
-    jsonWriter(fileName=fileName+".json", opReport=opResult)
-    print("\nJSON Updated!\n\n")
-        
-    
-      
 def main():
     print("Hi, welcome to the Tezos-Contract toolchain!\n")
     print("Here you can compile, deploy or interact with any contract from the archive.\n")
     
     stdPath = "../contracts/"
-    operationSel = int(input("Now, select an option: \n"
-        "1 Compile\n" 
-        "2 Deploy\n" 
-        "3 Interact\n"
-        "4 Use Execution Trace\n"))
+    while True:
+        operationSel = int(input("Now, select an option: \n"
+            "1 Compile\n" 
+            "2 Deploy\n" 
+            "3 Interact\n"
+            "4 Use Execution Trace\n"
+            "5 Compile all contracts\n"
+            "0 Exit\n"))
 
-    if operationSel != 4:
-        walletSel = input("Which account do you want to use?\n")
-        with open("wallet.json", 'r', encoding='utf-8') as file:
-            wallet = json.load(file)
-            
-        key = wallet[walletSel]
-        client = pytezos.using(shell="ghostnet", key=key)
-    
-        allContracts = folderScan("../contracts")
-        print("\nContracts avaiable: \n")
-        i = 1
-        for contract in allContracts:
-            print(i," " + contract)
-            i += 1
-   
-        contractSel = int(input("Which contract do you want to use?\n"))
-        contract = allContracts[contractSel-1]
-    
-    match operationSel:
-        case 1:
-            contractPath = stdPath+contract+"/"+contract+".py"
-            compileContract(contractPath=contractPath)
-            main()
+        if operationSel == 0:
+            return
+
+        if operationSel not in (4, 5):
+            walletSel = input("Which account do you want to use?\n")
+            client = getClient(walletSel)
         
-        case 2: 
-            if Path("./"+contract).exists():   
-                michelsonPath = Path(f"./{contract}/step_001_cont_0_contract.tz").read_text()
-                storagePath = Path(f"./{contract}/step_001_cont_0_storage.tz").read_text()
-                initialBalance = int(input("Insert an initial balance:"))
-                op_result = origination(client=client, michelsonCode=michelsonPath, initialStorage=storagePath, initialBalance=initialBalance)
-                contractInfo = contractInfoResult(op_result=op_result)
-                addressUpdate(contract=contract, newAddress=contractInfo["address"])
-            else:
-                print("\n\033[1m Contract must be compiled before \033[0m\n\n")
-            
-            main()
-            
-        case 3: 
-            op_report = interactionSetup(client=client, contract=contract)
-            sel = input("Do you want to export the result?(y/n):  ")
-            if sel == "y":
-                exportResult(opResult=op_report)
-            main()
+            allContracts = folderScan("../contracts")
+            print("\nContracts avaiable: \n")
+            i = 1
+            for contract in allContracts:
+                print(i," " + contract)
+                i += 1
+       
+            contractSel = int(input("Which contract do you want to use?\n"))
+            contract = allContracts[contractSel-1]
         
-        case 4:
-            formatSel = input("CSV(1) or JSON(2)?")
-            if formatSel == 1:
-                contractExecutionTraces = csvReader()
-            else:
-                contractExecutionTraces = jsonReader()
+        match operationSel:
+            case 1:
+                compileContract(contractPath=contractSource(contract, stdPath))
             
-            for contract in contractExecutionTraces:
-                results = executionSetupCsv(contract=contract, rows=contractExecutionTraces[contract])
-                for result in results:
-                    exportResult(results[result])
+            case 2: 
+                status = artifactStatus(contract)
+                if status == "stale":
+                    print("\n\033[1m The compiled artifacts are older than the contract source \033[0m\n")
+                    if input("Recompile before deploying?(y/n): ") == "y":
+                        compileContract(contractPath=contractSource(contract, stdPath), force=True)
+                if Path("./"+contract).exists():   
+                    initialBalance = int(input("Insert an initial balance:"))
+                    try:
+                        deployContract(contract, walletSel, initialBalance)
+                    except Exception as e:
+                        print(f"Error {e}")
+                else:
+                    print("\n\033[1m Contract must be compiled before \033[0m\n\n")
+                
+            case 3: 
+                op_report = interactionSetup(client=client, contract=contract)
+                if isFailed(op_report):
+                    print(f"Call failed: {op_report.get('error') if op_report else 'not included'}")
+                    continue
+                sel = input("Do you want to export the result?(y/n):  ")
+                if sel == "y":
+                    exportResult(opResult=op_report)
             
-            main()
-            
-    
-    
-        
-    
\ No newline at end of file
+            case 5:
+                results = compileAll(contractsPath=stdPath, jobs=MAX_JOBS)
+                print(summaryTable(results))
+
+            case 4:
+                formatSel = {"2": "json", "3": "cardano"}.get(input("CSV(1), JSON(2) or Cardano-based traces(3)?"), "csv")
+                modeSel = input("Inject(1), simulate on the node(2) or interpret offline(3)?")
+                mode = {"2": "simulate", "3": "interpret"}.get(modeSel, "inject")
+                if formatSel == "cardano" and mode == "interpret":
+                    mode = "simulate"
+                batchSel = "n"
+                if mode == "inject" and formatSel != "cardano":
+                    batchSel = input("Batch consecutive calls of the same wallet?(y/n): ")
+                runTraces(formatSel, mode=mode, batch=(batchSel == "y"))
+                print("\nReport Updated!\n\n")
+
+if __name__ == "__main__":
+    # Without arguments the interactive menu, otherwise the batch CLI
+    if len(sys.argv) > 1:
+        from cli import main as cliMain
+        sys.exit(cliMain())
+    main()
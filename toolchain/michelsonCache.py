@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+from pytezos.michelson.parse import michelson_to_micheline
+
+from buildCache import ARTIFACTS
+
+MICHELINE_DIR = "cache/micheline"
+# Section order of the .tz files; SmartPy's JSON lists storage first
+SECTIONS = ["parameter", "storage", "code"]
+
+_parsed = {}
+_parsedLock = threading.Lock()
+
+##Parse cache
+def textHash(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def parseMichelson(text, cacheDir=MICHELINE_DIR):
+    # michelson_to_micheline, memoized in memory and in a JSON file named
+    # after the hash of the source. The entry also carries that hash and is
+    # ignored when it does not match or is not readable: Micheline is plain
+    # JSON, nothing in the cache directory gets executed.
+    key = textHash(text)
+    with _parsedLock:
+        if key in _parsed:
+            return _parsed[key]
+
+    cacheFile = Path(cacheDir) / f"{key}.json"
+    micheline = None
+    try:
+        with open(cacheFile, 'r', encoding='utf-8') as file:
+            entry = json.load(file)
+        if isinstance(entry, dict) and entry.get("sha256") == key:
+            micheline = entry.get("micheline")
+    except (FileNotFoundError, json.JSONDecodeError, UnicodeDecodeError):
+        pass
+
+    if micheline is None:
+        micheline = michelson_to_micheline(text)
+        cacheFile.parent.mkdir(parents=True, exist_ok=True)
+        tmpFile = f"{cacheFile}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmpFile, 'w', encoding='utf-8') as file:
+            json.dump({"sha256": key, "micheline": micheline}, file)
+        os.replace(tmpFile, cacheFile)
+
+    with _parsedLock:
+        _parsed[key] = micheline
+    return micheline
+
+##Compiled artifacts
+def sectionOrder(micheline):
+    # parameter, storage, code as in the .tz, views after them, so that the
+    # forged script and its hash match the parsed .tz
+    if not isinstance(micheline, list) or not all(isinstance(s, dict) and "prim" in s for s in micheline):
+        return micheline
+    return sorted(micheline, key=lambda s: SECTIONS.index(s["prim"]) if s["prim"] in SECTIONS else len(SECTIONS))
+
+def loadArtifact(tzPath):
+    # Micheline of a compiled .tz: SmartPy's .json next to it when it is not
+    # older than the .tz, else the cached parse of the .tz text
+    tzPath = Path(tzPath)
+    jsonPath = tzPath.with_suffix(".json")
+    if jsonPath.exists() and jsonPath.stat().st_mtime >= tzPath.stat().st_mtime:
+        stat = jsonPath.stat()
+        key = (str(jsonPath.resolve()), stat.st_mtime_ns, stat.st_size)
+        with _parsedLock:
+            if key in _parsed:
+                return _parsed[key]
+        with open(jsonPath, 'r', encoding='utf-8') as file:
+            micheline = sectionOrder(json.load(file))
+        with _parsedLock:
+            _parsed[key] = micheline
+        return micheline
+    return parseMichelson(tzPath.read_text())
+
+def loadScript(contract):
+    # (code, storage) Micheline of ./<contract>/, ready for origination
+    return tuple(loadArtifact(Path(contract) / artifact) for artifact in ARTIFACTS)
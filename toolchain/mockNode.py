@@ -0,0 +1,574 @@
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+from pytezos.crypto.encoding import base58_encode
+from pytezos.crypto.key import blake2b_32
+from pytezos.michelson.forge import forge_micheline, unforge_address, unforge_public_key, unforge_micheline, unforge_array
+from pytezos.michelson.program import MichelsonProgram
+from pytezos.operation.forge import reserved_entrypoints
+from pytezos.rpc.kind import operation_tags
+from pytezos.rpc.node import RpcNode, RpcError, RpcNotFoundError
+
+from simulateUtils import executeScript, TRANSACTION_GAS, GAS_PER_BYTE, STORAGE_BYTE_COST
+
+MOCK_URI = "mock://local"
+CHAIN_ID = "NetXnHfVqm9iesp"
+PROTOCOL = "PsParisCZo7KAh1Z1smVd9ZMZ1HHn5gkzbM94V3PLCpknFWhUAi"
+BLOCK_TIME = 0
+FAUCET_BALANCE = 10_000_000_000
+REVEAL_GAS = 1000
+ORIGINATION_SIZE = 257
+HARD_GAS_LIMIT = 1040000
+HARD_STORAGE_LIMIT = 60000
+POLL_INTERVAL = 0.05
+
+CONSTANTS = {
+    "hard_gas_limit_per_operation": str(HARD_GAS_LIMIT),
+    "hard_gas_limit_per_block": "1386666",
+    "hard_storage_limit_per_operation": str(HARD_STORAGE_LIMIT),
+    "cost_per_byte": str(STORAGE_BYTE_COST),
+    "origination_size": ORIGINATION_SIZE,
+    "max_operations_time_to_live": 240
+}
+
+ENTRYPOINT_TAGS = {tag[0]: name for name, tag in reserved_entrypoints.items()}
+OPERATION_KINDS = {tag: kind for kind, tag in operation_tags.items()}
+
+##Binary decoding
+def unforgeNat(data, offset):
+    value, shift = 0, 0
+    while True:
+        byte = data[offset]
+        value |= (byte & 0x7F) << shift
+        offset += 1
+        shift += 7
+        if not byte & 0x80:
+            return value, offset
+
+def unforgeKeyHash(data, offset):
+    # tz_only key hashes drop the leading 0x00 that unforge_address expects:
+    # without it a hash starting with 0x00-0x04 reads as a curve tag
+    return unforge_address(b'\x00' + data[offset:offset + 21])
+
+def unforgeManagerHeader(data, offset, content):
+    content["source"] = unforgeKeyHash(data, offset)
+    offset += 21
+    for field in ("fee", "counter", "gas_limit", "storage_limit"):
+        value, offset = unforgeNat(data, offset)
+        content[field] = str(value)
+    return offset
+
+def unforgeOperationGroup(payload):
+    # Inverse of forge_operation_group + signature, limited to the manager
+    # operations the toolchain sends: reveal, transaction, origination
+    branch = base58_encode(payload[:32], b'B').decode()
+    data, offset = payload[:-64], 32
+    contents = []
+    while offset < len(data):
+        kind = OPERATION_KINDS.get(data[offset])
+        content = {"kind": kind}
+        offset = unforgeManagerHeader(data, offset + 1, content)
+
+        if kind == "reveal":
+            keyLength = 33 if data[offset] == 0 else 34
+            content["public_key"] = unforge_public_key(data[offset:offset + keyLength])
+            offset += keyLength
+            if data[offset]:
+                proof, length = unforge_array(data[offset + 1:])
+                offset += length
+            offset += 1
+        elif kind == "transaction":
+            amount, offset = unforgeNat(data, offset)
+            content["amount"] = str(amount)
+            content["destination"] = unforge_address(data[offset:offset + 22])
+            offset += 22
+            hasParameters = data[offset]
+            offset += 1
+            if hasParameters:
+                if data[offset] == 0xFF:
+                    name, length = unforge_array(data[offset + 1:], len_bytes=1)
+                    entrypoint = name.decode()
+                    offset += 1 + length
+                else:
+                    entrypoint = ENTRYPOINT_TAGS[data[offset]]
+                    offset += 1
+                value, length = unforge_array(data[offset:])
+                offset += length
+                content["parameters"] = {"entrypoint": entrypoint, "value": unforge_micheline(value)}
+        elif kind == "origination":
+            balance, offset = unforgeNat(data, offset)
+            content["balance"] = str(balance)
+            if data[offset]:
+                content["delegate"] = unforgeKeyHash(data, offset + 1)
+                offset += 21
+            offset += 1
+            code, length = unforge_array(data[offset:])
+            offset += length
+            storage, length = unforge_array(data[offset:])
+            offset += length
+            content["script"] = {"code": unforge_micheline(code), "storage": unforge_micheline(storage)}
+        else:
+            raise RpcError(f"Mock node: unsupported operation tag {data[offset]}")
+        contents.append(content)
+
+    return {"branch": branch, "contents": contents, "signature": base58_encode(payload[-64:], b'sig').decode()}
+
+def operationHash(payload):
+    return base58_encode(blake2b_32(payload).digest(), b'o').decode()
+
+def originatedAddress(opHash, index):
+    nonce = blake2b_32(opHash.encode() + index.to_bytes(4, 'big')).digest()[:20]
+    return base58_encode(nonce, b'KT1').decode()
+
+def scriptError(kind, **fields):
+    return dict({"kind": "temporary", "id": f"proto.alpha.{kind}"}, **fields)
+
+class OperationFailed(Exception):
+    def __init__(self, error):
+        super().__init__(error["id"])
+        self.error = error
+
+##Ledger
+class Overlay:
+    # Copy-on-write view of the ledger: changes are kept aside until commit(),
+    # so a failed content (or a simulation) leaves the chain untouched.
+    def __init__(self, parent):
+        self.parent = parent
+        self.accounts = {}
+        self.contracts = {}
+
+    def account(self, address):
+        if address.startswith("KT1"):
+            return self.contract(address)
+        if address not in self.accounts:
+            self.accounts[address] = dict(self.parent.account(address))
+        return self.accounts[address]
+
+    def contract(self, address):
+        if address not in self.contracts:
+            self.contracts[address] = dict(self.parent.contract(address))
+        return self.contracts[address]
+
+    def originate(self, address, entry):
+        self.contracts[address] = entry
+
+    def commit(self):
+        self.parent.accounts.update(self.accounts)
+        self.parent.contracts.update(self.contracts)
+
+
+class MockChain:
+    # In-process Tezos ledger: implicit accounts funded on first use,
+    # contracts run through the local Michelson interpreter, blocks baked on
+    # every injection (blockTime=0) or every blockTime seconds. Gas follows
+    # the offline model of simulateUtils, not the protocol.
+    def __init__(self, blockTime=BLOCK_TIME, faucetBalance=FAUCET_BALANCE):
+        self.lock = threading.RLock()
+        self.blockTime = blockTime
+        self.faucetBalance = faucetBalance
+        self.accounts = {}
+        self.contracts = {}
+        self.mempool = []
+        self.blocks = []
+        self.counters = {"injected": 0, "applied": 0, "failed": 0}
+        self.clockOffset = 0
+        self.bake()
+
+        if blockTime > 0:
+            threading.Thread(target=self.bakeLoop, daemon=True).start()
+
+    ##Ledger access
+    def account(self, address):
+        with self.lock:
+            if address.startswith("KT1"):
+                return self.contract(address)
+            return self.accounts.setdefault(address, {"balance": self.faucetBalance, "counter": 0, "manager": None})
+
+    def contract(self, address):
+        with self.lock:
+            entry = self.contracts.get(address)
+            if entry is None:
+                raise OperationFailed(scriptError("contract.non_existing_contract", contract=address))
+            return entry
+
+    ##Blocks
+    def head(self):
+        with self.lock:
+            return self.blocks[-1]
+
+    def block(self, blockId):
+        with self.lock:
+            blockId = str(blockId)
+            match = re.fullmatch(r"head(?:~(\d+))?", blockId)
+            if match:
+                level = len(self.blocks) - 1 - int(match.group(1) or 0)
+            elif blockId.isdigit():
+                level = int(blockId)
+            else:
+                level = next((b["header"]["level"] for b in self.blocks if b["hash"] == blockId), -1)
+            if not 0 <= level < len(self.blocks):
+                raise RpcNotFoundError(f"Not found: block {blockId}")
+            return self.blocks[level]
+
+    def bake(self):
+        with self.lock:
+            level = len(self.blocks)
+            predecessor = self.blocks[-1]["hash"] if self.blocks else base58_encode(bytes(32), b'B').decode()
+            blockHash = base58_encode(blake2b_32(f"{predecessor}{level}".encode()).digest(), b'B').decode()
+
+            # Groups are applied in injection order as long as their counter is
+            # the next one of their source; groups ahead of a missing counter
+            # wait for a later block, stale ones are dropped.
+            operations = []
+            progress = True
+            while progress:
+                progress = False
+                for entry in list(self.mempool):
+                    opHash, group = entry
+                    first = group["contents"][0]
+                    expected = self.account(first["source"])["counter"] + 1
+                    if int(first["counter"]) > expected:
+                        continue
+                    self.mempool.remove(entry)
+                    if int(first["counter"]) == expected:
+                        operations.append(self.applyGroup(group, opHash))
+                        progress = True
+
+            self.blocks.append({
+                "protocol": PROTOCOL,
+                "chain_id": CHAIN_ID,
+                "hash": blockHash,
+                "header": {
+                    "level": level,
+                    "predecessor": predecessor,
+                    "timestamp": datetime.fromtimestamp(self.now(), timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "protocol": PROTOCOL,
+                    "chain_id": CHAIN_ID
+                },
+                "operations": [[], [], [], operations]
+            })
+            return self.blocks[-1]
+
+    def now(self):
+        return int(time.time() + self.clockOffset)
+
+    def advance(self, seconds=0, blocks=1):
+        # Moves the chain clock forward and bakes `blocks` blocks, so that
+        # NOW- and LEVEL-based deadlines can be reached without waiting
+        with self.lock:
+            self.clockOffset += seconds
+            for _ in range(blocks):
+                self.bake()
+            return self.head()
+
+    def bakeLoop(self):
+        while True:
+            time.sleep(self.blockTime)
+            self.bake()
+
+    ##Operations
+    def inject(self, payloadHex):
+        payload = bytes.fromhex(payloadHex)
+        group = unforgeOperationGroup(payload)
+        opHash = operationHash(payload)
+        first = group["contents"][0]
+        with self.lock:
+            if int(first["counter"]) <= self.account(first["source"])["counter"]:
+                raise RpcError.from_errors([scriptError("contract.counter_in_the_past", contract=first["source"])])
+            self.mempool.append((opHash, group))
+            self.counters["injected"] += 1
+            if self.blockTime == 0:
+                self.bake()
+        return opHash
+
+    def runOperation(self, operation):
+        # helpers/scripts/run_operation: apply on a throw-away overlay
+        with self.lock:
+            group = {"branch": operation["branch"], "contents": operation["contents"]}
+            return self.applyGroup(group, operationHash(json.dumps(group, sort_keys=True).encode()), dryRun=True)
+
+    def applyGroup(self, group, opHash, dryRun=False):
+        ledger = Overlay(self)
+        contents = [dict(content) for content in group["contents"]]
+
+        # fees and counters are taken first and kept even if a content fails
+        for content in contents:
+            source = ledger.account(content["source"])
+            fee = int(content.get("fee", 0))
+            source["balance"] -= fee
+            source["counter"] = max(source["counter"], int(content["counter"]))
+            content["metadata"] = {"balance_updates": balanceUpdates(content["source"], fee, "block fees")}
+
+        applied = Overlay(ledger)
+        failed = False
+        for index, content in enumerate(contents):
+            if failed:
+                content["metadata"]["operation_result"] = {"status": "skipped"}
+                continue
+            try:
+                result = self.applyContent(applied, content, opHash, index)
+                internalResults = result.pop("internal_operation_results", None)
+                content["metadata"]["operation_result"] = result
+                if internalResults:
+                    content["metadata"]["internal_operation_results"] = internalResults
+            except OperationFailed as e:
+                failed = True
+                content["metadata"]["operation_result"] = {"status": "failed", "errors": [e.error]}
+                for previous in contents[:index]:
+                    previous["metadata"]["operation_result"]["status"] = "backtracked"
+
+        if not failed:
+            applied.commit()
+        if not dryRun:
+            ledger.commit()
+            self.counters["failed" if failed else "applied"] += 1
+
+        return {
+            "protocol": PROTOCOL,
+            "chain_id": CHAIN_ID,
+            "hash": opHash,
+            "branch": group["branch"],
+            "contents": contents,
+            "signature": group.get("signature")
+        }
+
+    def applyContent(self, ledger, content, opHash, index):
+        kind = content["kind"]
+        gasLimit = int(content.get("gas_limit", HARD_GAS_LIMIT))
+        storageLimit = int(content.get("storage_limit", HARD_STORAGE_LIMIT))
+
+        if kind == "reveal":
+            ledger.account(content["source"])["manager"] = content["public_key"]
+            result = {"status": "applied", "consumed_milligas": str(REVEAL_GAS * 1000)}
+        elif kind == "origination":
+            result = self.originate(ledger, content, opHash, index)
+        elif kind == "transaction":
+            result = self.transfer(ledger, content["source"], content["source"], content["destination"],
+                                   int(content["amount"]), content.get("parameters"))
+        else:
+            raise OperationFailed(scriptError("operation.not_supported_by_mock_node", kind=kind))
+
+        internalResults = [internal["result"] for internal in result.get("internal_operation_results", [])]
+        consumedGas = sum(int(r.get("consumed_milligas", 0)) for r in [result] + internalResults) // 1000
+        if consumedGas > gasLimit:
+            raise OperationFailed(scriptError("gas_exhausted.operation"))
+        paid = int(result.get("paid_storage_size_diff", 0)) + (ORIGINATION_SIZE if kind == "origination" else 0)
+        if paid > storageLimit:
+            raise OperationFailed(scriptError("storage_exhausted.operation"))
+        return result
+
+    def originate(self, ledger, content, opHash, index):
+        script = content["script"]
+        balance = int(content.get("balance", 0))
+        address = originatedAddress(opHash, index)
+
+        try:
+            MichelsonProgram.match(script["code"])
+        except Exception as e:
+            raise OperationFailed(scriptError("michelson_v1.ill_typed_contract", message=str(e)))
+
+        source = ledger.account(content["source"])
+        storageSize = len(forge_micheline(script["code"])) + len(forge_micheline(script["storage"]))
+        burn = (storageSize + ORIGINATION_SIZE) * STORAGE_BYTE_COST
+        if source["balance"] < balance + burn:
+            raise OperationFailed(scriptError("tez.subtraction_underflow"))
+        source["balance"] -= balance + burn
+
+        ledger.originate(address, {
+            "script": {"code": script["code"], "storage": script["storage"]},
+            "balance": balance,
+            "counter": 0,
+            "paidSize": storageSize
+        })
+        return {
+            "status": "applied",
+            "originated_contracts": [address],
+            "consumed_milligas": str((TRANSACTION_GAS + GAS_PER_BYTE * storageSize) * 1000),
+            "storage_size": str(storageSize),
+            "paid_storage_size_diff": str(storageSize),
+            "balance_updates": balanceUpdates(content["source"], balance + burn, "storage fees")
+        }
+
+    def transfer(self, ledger, sender, source, destination, amount, parameters, depth=0):
+        senderAccount = ledger.account(sender)
+        if senderAccount["balance"] < amount:
+            raise OperationFailed(scriptError("tez.subtraction_underflow"))
+        senderAccount["balance"] -= amount
+
+        if not destination.startswith("KT1"):
+            ledger.account(destination)["balance"] += amount
+            return {"status": "applied", "consumed_milligas": str(TRANSACTION_GAS * 1000)}
+
+        contract = ledger.contract(destination)
+        parameters = parameters or {"entrypoint": "default", "value": {"prim": "Unit"}}
+        try:
+            execution = executeScript(contract["script"]["code"], contract["script"]["storage"],
+                                      parameters["entrypoint"], parameters["value"], amount,
+                                      sender=sender, source=source, balance=contract["balance"] + amount,
+                                      now=self.now(), address=destination, level=len(self.blocks))
+        except Exception as e:
+            raise OperationFailed(scriptError("michelson_v1.script_rejected", location=0, message=str(e)))
+
+        contract["balance"] += amount
+        contract["script"] = {"code": contract["script"]["code"], "storage": execution["storage"]}
+        paidDiff = max(0, execution["storageSize"] + len(forge_micheline(contract["script"]["code"])) - contract["paidSize"])
+        contract["paidSize"] += paidDiff
+
+        internalResults = []
+        for nonce, operation in enumerate(execution["operations"]):
+            if operation["kind"] != "transaction" or depth > 10:
+                continue
+            internal = self.transfer(ledger, destination, source, operation["destination"],
+                                     int(operation["amount"]), operation.get("parameters"), depth + 1)
+            internalResults.append({
+                "kind": "transaction",
+                "source": destination,
+                "nonce": nonce,
+                "amount": operation["amount"],
+                "destination": operation["destination"],
+                "parameters": operation.get("parameters"),
+                "result": internal
+            })
+
+        result = {
+            "status": "applied",
+            "storage": execution["storage"],
+            "consumed_milligas": str(execution["consumedGas"] * 1000),
+            "storage_size": str(contract["paidSize"]),
+            "paid_storage_size_diff": str(paidDiff),
+            "balance_updates": balanceUpdates(sender, paidDiff * STORAGE_BYTE_COST, "storage fees") if paidDiff else []
+        }
+        if depth == 0 and internalResults:
+            result["internal_operation_results"] = internalResults
+        return result
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, level=len(self.blocks) - 1, contracts=len(self.contracts),
+                        accounts=len(self.accounts), mempool=len(self.mempool))
+
+def balanceUpdates(address, amount, category):
+    if not amount:
+        return []
+    return [
+        {"kind": "contract", "contract": address, "change": str(-amount), "origin": "block"},
+        {"kind": "accumulator" if category == "block fees" else "burned", "category": category,
+         "change": str(amount), "origin": "block"}
+    ]
+
+##RPC
+class MockResponse:
+    status_code = 200
+    headers = {"content-type": "application/json"}
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.text = json.dumps(payload)
+
+    def json(self):
+        return self.payload
+
+
+class MockRpcNode(RpcNode):
+    # Drop-in RpcNode answering the subset of the Tezos RPC used by pytezos
+    # and the toolchain (autofill, run_operation, injection, contract
+    # scripts/storage, block headers and manager operations).
+    pollInterval = POLL_INTERVAL
+
+    def __init__(self, chain=None, uri=MOCK_URI):
+        super().__init__(uri)
+        self.chain = chain or MockChain()
+
+    def request(self, method, path, **kwargs):
+        path = "/" + path.strip("/")
+        try:
+            return MockResponse(self.route(method, path, kwargs.get("json"), kwargs.get("params") or {}))
+        except OperationFailed as e:
+            raise RpcError.from_errors([e.error])
+
+    def route(self, method, path, body, params):
+        chain = self.chain
+        if path == "/version":
+            return {"network_version": {"chain_name": "TEZOS_MOCK_SANDBOXED", "distributed_db_version": 2,
+                                        "p2p_version": 1}}
+        if path == "/chains/main/chain_id":
+            return CHAIN_ID
+        if path == "/injection/operation" and method == "POST":
+            return chain.inject(body)
+        if path == "/chains/main/mempool/filter":
+            return {"minimal_fees": "100", "minimal_nanotez_per_gas_unit": ["100", "1"],
+                    "minimal_nanotez_per_byte": ["1000", "1"]}
+        if path.startswith("/chains/main/mempool/pending_operations"):
+            return {"validated": [], "refused": [], "outdated": [], "branch_refused": [],
+                    "branch_delayed": [], "unprocessed": []}
+
+        match = re.fullmatch(r"/chains/main/blocks/([^/]+)(/.*)?", path)
+        if not match:
+            raise RpcNotFoundError(f"Not found: {path}")
+        blockId, rest = match.group(1), match.group(2) or ""
+
+        if rest == "/helpers/scripts/run_operation" and method == "POST":
+            return chain.runOperation(body["operation"])
+
+        block = chain.block(blockId)
+        if rest == "":
+            return block
+        if rest == "/hash":
+            return block["hash"]
+        if rest == "/header":
+            return dict(block["header"], hash=block["hash"])
+        if rest == "/protocols":
+            return {"protocol": PROTOCOL, "next_protocol": PROTOCOL}
+        if rest == "/context/constants":
+            return dict(CONSTANTS, minimal_block_delay=str(max(1, chain.blockTime)))
+        if rest == "/operations":
+            return block["operations"]
+        match = re.fullmatch(r"/operations/(\d)", rest)
+        if match:
+            return block["operations"][int(match.group(1))]
+
+        match = re.fullmatch(r"/context/contracts/([^/]+)(/[a-z_]+)?", rest)
+        if match:
+            return self.contractRoute(match.group(1), match.group(2) or "")
+        raise RpcNotFoundError(f"Not found: {path}")
+
+    def contractRoute(self, address, field):
+        # Contract state is served from the current ledger whatever the block
+        with self.chain.lock:
+            if address.startswith("KT1"):
+                try:
+                    entry = self.chain.contract(address)
+                except OperationFailed:
+                    raise RpcNotFoundError(f"Not found: contract {address}")
+                state = {"balance": str(entry["balance"]), "script": entry["script"], "counter": "0"}
+            else:
+                entry = self.chain.account(address)
+                state = {"balance": str(entry["balance"]), "counter": str(entry["counter"])}
+
+        if field == "":
+            return state
+        if field == "/balance":
+            return state["balance"]
+        if field == "/counter":
+            return state["counter"]
+        if field == "/manager_key":
+            return entry.get("manager")
+        if field == "/script" and "script" in state:
+            return state["script"]
+        if field == "/storage" and "script" in state:
+            return state["script"]["storage"]
+        raise RpcNotFoundError(f"Not found: {address}{field}")
+
+
+_chains = {}
+_chainsLock = threading.Lock()
+
+def getChain(name="mock", blockTime=BLOCK_TIME):
+    # One ledger per name, shared by every client of the process
+    with _chainsLock:
+        if name not in _chains:
+            _chains[name] = MockChain(blockTime=blockTime)
+        return _chains[name]
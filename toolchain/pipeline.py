@@ -0,0 +1,244 @@
+import queue
+import time
+
+from clientPool import getClient
+from confirmationTracker import getTracker, TIMEOUT
+from contractUtils import buildCall, callInfoResult, operationWeight, errorReason
+from estimateCache import estimateKey, getEstimates
+from spans import span, tagged, recordSpan
+from traceExecutor import buildGraph
+
+PIPELINE_DEPTH = 4
+MAX_RESUBMITS = 2
+# Octez prevalidators admit one manager operation per source until it is
+# included: a second one from the same wallet is refused, not queued
+PER_SOURCE = 1
+
+##Submissions
+class Submission:
+    # One trace step on its way to a block. hash changes every time the
+    # step is rebuilt; an older attempt may still be included, so all the
+    # hashes it was sent with stay valid.
+    def __init__(self, contract, stepId, step):
+        self.contract = contract
+        self.stepId = stepId
+        self.step = step
+        self.hash = None
+        self.hashes = set()
+        self.counter = None
+        self.weight = None
+        self.limits = None
+        self.attempts = 0
+        self.injectedAt = None
+
+    @property
+    def key(self):
+        return (self.contract, self.stepId)
+
+class SourceState:
+    # Local view of one wallet: the last counter handed out and the
+    # submission injected but not yet included
+    def __init__(self, client):
+        self.client = client
+        self.counter = None
+        self.inFlight = []
+
+    def nextCounter(self):
+        if self.counter is None:
+            self.syncCounter()
+        self.counter += 1
+        return self.counter
+
+    def syncCounter(self):
+        source = self.client.key.public_key_hash()
+        self.counter = int(self.client.shell.contracts[source]()["counter"])
+
+##Pipeline
+class Pipeline:
+    # Injects trace steps without waiting for their inclusion: up to depth
+    # operations of different wallets are in flight at once, each wallet
+    # keeping its counter locally so the next operation is signed as soon as
+    # the previous one is included. A wallet has a single operation in
+    # flight (PER_SOURCE), and a step waits for the inclusion of every step
+    # it depends on. The gain comes from overlapping the wallets of a trace
+    # set, never from stacking the operations of one wallet.
+    def __init__(self, traces, depth=PIPELINE_DEPTH, timeout=TIMEOUT, onStepDone=None):
+        # traces: {contract: {stepId: tracePlan.PlannedStep}}
+        self.traces = traces
+        self.depth = max(1, depth)
+        self.timeout = timeout
+        self.onStepDone = onStepDone
+        self.steps, self.dependencies, self.dependents = buildGraph(traces, walletOf=lambda step: step.wallet)
+        self.submissions = {key: Submission(key[0], key[1], traces[key[0]][key[1]]) for key in self.steps}
+        self.sources = {}
+        self.injected = set()
+        self.results = {}
+        self.events = queue.Queue()
+
+    def source(self, wallet):
+        if wallet not in self.sources:
+            self.sources[wallet] = SourceState(getClient(wallet))
+        return self.sources[wallet]
+
+    def inFlight(self):
+        return sum(len(source.inFlight) for source in self.sources.values())
+
+    def ready(self, key):
+        if any(dep not in self.results for dep in self.dependencies[key]):
+            return False
+        wallet = self.submissions[key].step.wallet
+        return len(self.source(wallet).inFlight) < PER_SOURCE and self.inFlight() < self.depth
+
+    def waitsOnContract(self, key):
+        # True while an earlier step of the same contract is still in flight
+        return any(dep[0] == key[0] and dep not in self.results for dep in self.dependencies[key])
+
+    def limits(self, client, call, step):
+        # -> (gasLimit, storageLimit, source): the cached estimate with its
+        # margin, or on a miss the limits of the simulation just run
+        estimates = getEstimates()
+        cacheKey = estimateKey(client, step.address, call.parameters, call.amount)
+        estimate = estimates.lookup(cacheKey)
+        if estimate is not None:
+            return (*estimate, "cached")
+        # simulated on the current head, with the node's counter
+        with span("simulate"):
+            content = call.as_transaction().autofill().contents[0]
+        estimates.store(cacheKey, content["gas_limit"], content["storage_limit"])
+        return int(content["gas_limit"]), int(content["storage_limit"]), "simulated"
+
+    def inject(self, submission):
+        step = submission.step
+        with tagged(contract=submission.contract, entrypoint=step.entrypoint, wallet=step.wallet, step=submission.stepId):
+            self.send(submission)
+
+    def send(self, submission):
+        step = submission.step
+        source = self.source(step.wallet)
+        call = buildCall(source.client, step.address, step.entrypoint, step.parameters, step.amount)
+        gasLimit, storageLimit, submission.limits = self.limits(source.client, call, step)
+
+        counter = source.nextCounter()
+        try:
+            with span("fill"):
+                opg = call.as_transaction().fill(counter=counter, gas_limit=gasLimit, storage_limit=storageLimit)
+            with span("sign"):
+                opg = opg.sign()
+            with span("inject"):
+                opg.inject(prevalidate=False)
+        except Exception:
+            source.counter = counter - 1
+            raise
+
+        submission.hash = opg.hash()
+        submission.hashes.add(submission.hash)
+        submission.counter = counter
+        submission.weight = operationWeight(opg.contents)
+        submission.attempts += 1
+        submission.injectedAt = time.time()
+        source.inFlight.append(submission)
+        self.injected.add(submission.key)
+        print(f"Operation Send! Hash: {submission.hash} ({step.entrypoint}, wallet {step.wallet}, counter {counter})")
+
+        opHash = submission.hash
+        getTracker(source.client).watch(opHash, timeout=self.timeout,
+                                        callback=lambda future: self.events.put((submission.key, opHash, future)))
+
+    def finish(self, key, result):
+        self.results[key] = result
+        submission = self.submissions[key]
+        source = self.source(submission.step.wallet)
+        if submission in source.inFlight:
+            source.inFlight.remove(submission)
+        if self.onStepDone:
+            self.onStepDone(key[0], key[1], result)
+
+    def fail(self, key, error):
+        self.finish(key, {"contract": key[0], "step": key[1], "error": error})
+
+    def rebuild(self, submission):
+        # submission was not included (refused, dropped or timed out): it is
+        # sent again with the counter re-read from the node
+        source = self.source(submission.step.wallet)
+        source.inFlight.remove(submission)
+        source.syncCounter()
+
+        submission.hash = None
+        self.injected.discard(submission.key)
+        if submission.attempts > MAX_RESUBMITS:
+            self.fail(submission.key, f"not included after {submission.attempts} attempts")
+            return
+        print(f"Rebuilding {submission.step.entrypoint} of {submission.contract} (step {submission.stepId})")
+        try:
+            self.inject(submission)
+        except Exception as e:
+            self.fail(submission.key, errorReason(e))
+
+    def pump(self):
+        # Inject every step whose dependencies allow it
+        progress = True
+        while progress:
+            progress = False
+            for key in self.steps:
+                if key in self.results or key in self.injected or not self.ready(key):
+                    continue
+                try:
+                    self.inject(self.submissions[key])
+                    progress = True
+                except Exception as e:
+                    if self.waitsOnContract(key):
+                        # simulated before its predecessor was applied: retry
+                        # once the contract state has caught up
+                        continue
+                    print(f"Step {key[1]} of {key[0]} not sent: {errorReason(e)}")
+                    self.fail(key, errorReason(e))
+                    progress = True
+
+    def run(self):
+        self.pump()
+        while len(self.results) < len(self.steps):
+            if not any(source.inFlight for source in self.sources.values()):
+                # nothing can complete any more: the remaining steps wait on
+                # a failed simulation
+                for key in self.steps:
+                    if key not in self.results:
+                        self.fail(key, "dependency could not be sent")
+                break
+
+            key, opHash, future = self.events.get()
+            submission = self.submissions[key]
+            if key in self.results or opHash not in submission.hashes:
+                continue
+
+            try:
+                opResult = future.result()
+            except Exception as e:
+                if opHash != submission.hash:
+                    # an older attempt expired, the current one is pending
+                    continue
+                print(f"{submission.step.entrypoint} of {submission.contract} not included: {e}")
+                self.rebuild(submission)
+                self.pump()
+                continue
+
+            step = submission.step
+            recordSpan("inclusion", submission.injectedAt, time.time(), hash=opHash, contract=submission.contract,
+                       entrypoint=step.entrypoint, wallet=step.wallet, step=submission.stepId)
+            opResult["weight"] = submission.weight
+            opResult["limits"] = submission.limits
+            infoResult = callInfoResult(opResult=opResult)
+            infoResult["contract"] = submission.contract
+            infoResult["entryPoint"] = submission.step.entrypoint
+            infoResult["wallet"] = submission.step.wallet
+            infoResult["step"] = submission.stepId
+            self.finish(key, infoResult)
+            self.pump()
+
+        ordered = {}
+        for contract, stepId in self.steps:
+            ordered.setdefault(contract, {})[stepId] = self.results[(contract, stepId)]
+        return ordered
+
+def executePipelined(traces, depth=PIPELINE_DEPTH, timeout=TIMEOUT, onStepDone=None):
+    # Same result layout as traceExecutor.executeTraces
+    return Pipeline(traces, depth=depth, timeout=timeout, onStepDone=onStepDone).run()
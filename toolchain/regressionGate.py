@@ -0,0 +1,225 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from buildCache import ARTIFACTS
+from reportSink import readReports
+from resultsStore import getStore, median
+
+BASELINE_FILE = "cost_baseline.json"
+BASELINE_VERSION = 2
+# EstimatedFee rather than BakerFee: the fee paid depends on whether the
+# limits came from the estimate cache (+10% margin) or a simulation
+METRICS = ["Gas", "EstimatedFee", "Storage", "Weight"]
+# Relative increase tolerated before a metric counts as a regression.
+# Storage is deterministic: any extra byte burnt is reported.
+THRESHOLDS = {"Gas": 0.02, "EstimatedFee": 0.02, "Storage": 0.0, "Weight": 0.0, "CodeSize": 0.0}
+# Absolute increase tolerated on top of it: the forged size moves by a few
+# bytes with the zarith length of counter, fee and limits
+SLACK = {"Weight": 8}
+
+##Inputs
+def loadReports(inputFile):
+    # callInfoResult/contractInfoResult reports with "contract",
+    # "entryPoint", "mode" and "network" set, from a transactionsOutput.jsonl
+    # log or a benchmark.py artifact
+    if str(inputFile).endswith(".jsonl"):
+        return [r for r in readReports(inputFile) if "error" not in r]
+
+    with open(inputFile, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+
+    if not ("contracts" in data and "runs" in data):
+        # the transactionsOutput.json view only keeps TotalCost and Weight
+        raise ValueError(f"{inputFile}: not a benchmark.py artifact; gate the transactionsOutput.jsonl log instead")
+
+    reports = []
+    for result in data["contracts"]:
+        for entry in result["steps"]:
+            samples = entry["samples"]
+            # originations are injected even when the steps are simulated
+            mode = "inject" if entry["step"] == "origination" else data["mode"]
+            for i in range(len(samples["Gas"])):
+                report = {metric: values[i] for metric, values in samples.items()}
+                reports.append(dict(report, contract=result["contract"], entryPoint=entry["entrypoint"],
+                                    mode=mode, network=data["network"]))
+    return reports
+
+def storeReports(runId):
+    # Operations of one run of results.db, originations included
+    columns = {"Gas": "milligas", "BakerFee": "fee", "EstimatedFee": "estimated_fee", "Storage": "storage_burn", "Weight": "weight"}
+    return [dict({metric: op[column] for metric, column in columns.items()},
+                 contract=op["contract"], entryPoint=op["entrypoint"], mode=op["mode"], network=op["network"])
+            for op in getStore().operations(runId=runId)]
+
+def codeSize(contract):
+    michelson = Path(contract) / ARTIFACTS[0]
+    return michelson.stat().st_size if michelson.exists() else None
+
+##Baseline
+def summarizeReports(reports):
+    # {"Contract.entrypoint": {metric: median, "count": n, "mode": mode}},
+    # the network and the Michelson size of every contract seen. Reports
+    # must carry every gated metric and come from one network, and each
+    # entrypoint from one mode: nothing is silently left out or mixed.
+    groups = {}
+    networks = set()
+    for report in reports:
+        if report.get("contract") is None or report.get("entryPoint") is None:
+            continue
+        key = f"{report['contract']}.{report['entryPoint']}"
+        missing = [metric for metric in METRICS if report.get(metric) is None]
+        if missing or report.get("mode") is None or report.get("network") is None:
+            raise ValueError(f"{key}: report without {', '.join(missing + [f for f in ('mode', 'network') if report.get(f) is None])}")
+        networks.add(report["network"])
+        groups.setdefault(key, []).append(report)
+    if len(networks) > 1:
+        raise ValueError(f"reports of several networks: {sorted(networks)}")
+
+    entrypoints = {}
+    for key, group in sorted(groups.items()):
+        modes = {r["mode"] for r in group}
+        if len(modes) > 1:
+            raise ValueError(f"{key}: reports of several modes: {sorted(modes)}")
+        entry = {"count": len(group), "mode": modes.pop()}
+        for metric in METRICS:
+            entry[metric] = median(sorted(r[metric] for r in group))
+        entrypoints[key] = entry
+
+    contracts = sorted({key.split(".", 1)[0] for key in entrypoints})
+    return {"entrypoints": entrypoints, "network": networks.pop() if networks else None,
+            "codeSize": {c: codeSize(c) for c in contracts}}
+
+def buildBaseline(reports, label=None):
+    summary = summarizeReports(reports)
+    return dict(summary, version=BASELINE_VERSION, label=label, created=time.strftime("%Y-%m-%dT%H:%M:%S%z"))
+
+def loadBaseline(baselineFile=BASELINE_FILE):
+    with open(baselineFile, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+    if baseline.get("version") != BASELINE_VERSION:
+        raise ValueError(f"{baselineFile}: unsupported baseline version {baseline.get('version')}")
+    return baseline
+
+def saveBaseline(baseline, baselineFile=BASELINE_FILE):
+    with open(baselineFile, 'w', encoding='utf-8') as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+##Compare
+def delta(old, new):
+    if old is None or new is None:
+        return None
+    if old == 0:
+        return 0.0 if new == 0 else float("inf")
+    return (new - old) / old
+
+def compare(baseline, current, thresholds=THRESHOLDS, slack=SLACK):
+    # -> list of {"key", "metric", "baseline", "current", "delta", "status"};
+    # status is regression, improvement, missing (gone from the run) or new.
+    # Figures of another network or mode are not comparable: ValueError.
+    if baseline.get("network") != current.get("network"):
+        raise ValueError(f"baseline measured on {baseline.get('network')}, reports on {current.get('network')}")
+    for key, new in current["entrypoints"].items():
+        old = baseline["entrypoints"].get(key)
+        if old is not None and old.get("mode") != new.get("mode"):
+            raise ValueError(f"{key}: baseline measured in {old.get('mode')} mode, reports in {new.get('mode')} mode")
+    findings = []
+
+    def check(key, metric, old, new):
+        change = delta(old, new)
+        if change is None:
+            return
+        if change > thresholds.get(metric, 0.0) and new - old > slack.get(metric, 0):
+            status = "regression"
+        elif change < 0:
+            status = "improvement"
+        else:
+            return
+        findings.append({"key": key, "metric": metric, "baseline": old, "current": new,
+                         "delta": change, "status": status})
+
+    for key, old in baseline["entrypoints"].items():
+        new = current["entrypoints"].get(key)
+        if new is None:
+            findings.append({"key": key, "metric": None, "baseline": None, "current": None, "delta": None, "status": "missing"})
+            continue
+        for metric in METRICS:
+            check(key, metric, old.get(metric), new.get(metric))
+    for key in current["entrypoints"]:
+        if key not in baseline["entrypoints"]:
+            findings.append({"key": key, "metric": None, "baseline": None, "current": None, "delta": None, "status": "new"})
+
+    for contract, old in baseline.get("codeSize", {}).items():
+        check(contract, "CodeSize", old, current.get("codeSize", {}).get(contract))
+    return findings
+
+def formatFindings(findings):
+    if not findings:
+        return "No change beyond the thresholds."
+    lines = ["| Status | Contract.entrypoint | Metric | Baseline | Current | Change |",
+             "|:---|:---|:---|---:|---:|---:|"]
+    order = {"regression": 0, "missing": 1, "new": 2, "improvement": 3}
+    for f in sorted(findings, key=lambda f: (order[f["status"]], f["key"], f["metric"] or "")):
+        change = "" if f["delta"] is None else f"{f['delta']:+.1%}"
+        lines.append(f"| {f['status']} | {f['key']} | {f['metric'] or ''} | {'' if f['baseline'] is None else f['baseline']} | "
+                     f"{'' if f['current'] is None else f['current']} | {change} |")
+    regressions = sum(1 for f in findings if f["status"] == "regression")
+    lines.append(f"\n{regressions} regression(s)")
+    return "\n".join(lines)
+
+def parseThresholds(values, defaults=THRESHOLDS):
+    # ["Gas=0.05", "Storage=0"] -> defaults with those overridden
+    thresholds = dict(defaults)
+    for value in values or []:
+        metric, _, amount = value.partition("=")
+        if metric not in THRESHOLDS:
+            raise ValueError(f"unknown metric {metric}, expected one of {list(THRESHOLDS)}")
+        thresholds[metric] = float(amount)
+    return thresholds
+
+def collectReports(inputs, runs):
+    reports = []
+    for inputFile in inputs or []:
+        reports.extend(loadReports(inputFile))
+    for runId in runs or []:
+        reports.extend(storeReports(runId))
+    if not reports:
+        raise ValueError("no reports: give report files or --run")
+    return reports
+
+def main():
+    parser = argparse.ArgumentParser(description="Gas/fee/storage/bytes regression gate against a stored baseline.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    for name, description in (("baseline", "write a baseline from the given reports"),
+                              ("compare", "compare the given reports with the baseline")):
+        sub = subparsers.add_parser(name, help=description)
+        sub.add_argument("inputs", nargs="*", help="transactionsOutput.jsonl or benchmark.json files")
+        sub.add_argument("--run", action="append", help="a run of results.db, repeatable")
+        sub.add_argument("--baseline", default=BASELINE_FILE)
+    subparsers.choices["baseline"].add_argument("--label")
+    compare_ = subparsers.choices["compare"]
+    compare_.add_argument("--threshold", action="append", metavar="METRIC=FRACTION",
+                          help=f"tolerated relative increase, defaults {THRESHOLDS}")
+    compare_.add_argument("--slack", action="append", metavar="METRIC=AMOUNT",
+                          help=f"tolerated absolute increase, defaults {SLACK}")
+    compare_.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    reports = collectReports(args.inputs, args.run)
+    if args.command == "baseline":
+        baseline = buildBaseline(reports, args.label)
+        saveBaseline(baseline, args.baseline)
+        print(f"{len(baseline['entrypoints'])} entrypoints written to {args.baseline}")
+        return 0
+
+    findings = compare(loadBaseline(args.baseline), summarizeReports(reports),
+                       parseThresholds(args.threshold), parseThresholds(args.slack, SLACK))
+    print(json.dumps(findings, indent=4) if args.json else formatFindings(findings))
+    return 1 if any(f["status"] == "regression" for f in findings) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from spans import span
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+REPORT_FILE = "transactionsOutput"
+# Not transactionOutput.md: that one is the tracked sample table
+MARKDOWN_FILE = "transactionsReport.md"
+CSV_HEADER = ["Contract", "EntryPoint", "TotaleFees", "Bytes", "Hash"]
+
+_threadLocks = {}
+_threadLocksLock = threading.Lock()
+
+##Locking
+@contextmanager
+def lockedFile(fileName, mode):
+    # Thread lock per path plus an advisory flock, so concurrent writers in
+    # this process and in other processes never interleave their records.
+    path = os.path.abspath(fileName)
+    with _threadLocksLock:
+        lock = _threadLocks.setdefault(path, threading.Lock())
+
+    with lock:
+        with open(fileName, mode, newline='', encoding='utf-8') as file:
+            if fcntl:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield file
+                file.flush()
+                os.fsync(file.fileno())
+            finally:
+                if fcntl:
+                    fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+def csvRow(report):
+    return [report["contract"], report["entryPoint"], report["TotalCost"], report["Weight"], report["Hash"]]
+
+##Backends
+class JsonlSink:
+    # Append-only JSON Lines: one record per operation, nothing is rewritten
+    def __init__(self, fileName=REPORT_FILE + ".jsonl"):
+        self.fileName = fileName
+
+    def write(self, report):
+        record = dict(report)
+        record.setdefault("timestamp", time.time())
+        with lockedFile(self.fileName, 'a') as file:
+            file.write(json.dumps(record) + "\n")
+
+    def flush(self):
+        pass
+
+
+class CsvSink:
+    # Rows are buffered in memory and written with a single open/lock per flush
+    def __init__(self, fileName=REPORT_FILE + ".csv"):
+        self.fileName = fileName
+        self.rows = []
+        self.lock = threading.Lock()
+
+    def write(self, report):
+        with self.lock:
+            self.rows.append(csvRow(report))
+
+    def flush(self):
+        with self.lock:
+            rows, self.rows = self.rows, []
+        if not rows:
+            return
+        with lockedFile(self.fileName, 'a') as file:
+            writer = csv.writer(file)
+            if file.tell() == 0:
+                writer.writerow(CSV_HEADER)
+            writer.writerows(rows)
+
+
+class ReportSink:
+    # Fan-out used by the toolchain: every report goes to the JSONL log and to
+    # the CSV buffer; call flush() (or use it as a context manager) once per
+    # trace.
+    def __init__(self, fileName=REPORT_FILE, backends=None, extra=()):
+        if backends is None:
+            backends = [JsonlSink(fileName + ".jsonl"), CsvSink(fileName + ".csv")]
+        self.backends = list(backends) + list(extra)
+
+    def write(self, report):
+        # every record says which network it comes from; "mode" is set by
+        # callInfoResult
+        from clientPool import getNetwork
+        report = dict(report)
+        report.setdefault("network", getNetwork())
+        with span("report"):
+            for backend in self.backends:
+                backend.write(report)
+
+    def flush(self):
+        with span("report"):
+            for backend in self.backends:
+                backend.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+##Legacy views
+def readReports(fileName=REPORT_FILE + ".jsonl"):
+    reports = []
+    try:
+        with open(fileName, 'r', encoding='utf-8') as file:
+            for line in file:
+                line = line.strip()
+                if line:
+                    reports.append(json.loads(line))
+    except FileNotFoundError:
+        pass
+    return reports
+
+def materializeJson(jsonlFile=REPORT_FILE + ".jsonl", jsonFile=REPORT_FILE + ".json"):
+    # Same item shape as the original transactionsOutput.json, but every
+    # operation is kept: each contract maps to the list of its operations in
+    # execution order.
+    view = {}
+    for report in readReports(jsonlFile):
+        view.setdefault(report["contract"], []).append({
+            "Entrypoint": report["entryPoint"],
+            "TotalCost": report["TotalCost"],
+            "Weight": report["Weight"],
+            "Hash": report["Hash"]
+        })
+    with open(jsonFile, 'w', encoding='utf-8') as file:
+        json.dump(view, file, indent=4)
+    return view
+
+def materializeMarkdown(jsonlFile=REPORT_FILE + ".jsonl", mdFile=MARKDOWN_FILE):
+    lines = ["| " + " | ".join(CSV_HEADER) + " |", "|:---|:---|---:|---:|:---|"]
+    for report in readReports(jsonlFile):
+        lines.append("| " + " | ".join(str(value) for value in csvRow(report)) + " |")
+    with open(mdFile, 'w', encoding='utf-8') as file:
+        file.write("\n".join(lines))
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(description="Materialize the legacy report views from the JSONL log.")
+    parser.add_argument("--input", default=REPORT_FILE + ".jsonl")
+    parser.add_argument("--json", default=REPORT_FILE + ".json")
+    parser.add_argument("--md", default=MARKDOWN_FILE)
+    args = parser.parse_args()
+
+    view = materializeJson(args.input, args.json)
+    materializeMarkdown(args.input, args.md)
+    print(f"{sum(len(ops) for ops in view.values())} operations written to {args.json} and {args.md}")
+
+if __name__ == "__main__":
+    main()
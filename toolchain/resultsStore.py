@@ -0,0 +1,281 @@
+import argparse
+import json
+import math
+import sqlite3
+import threading
+import time
+import uuid
+
+DB_FILE = "results.db"
+# How a report was produced: injected on the node, simulated with
+# run_operation, or interpreted offline (estimated gas). Stats only ever
+# mix reports of one mode and network.
+MODES = ["inject", "simulate", "interpret"]
+STATS_METRICS = ["TotalCost", "BakerFee", "EstimatedFee", "Gas", "Storage", "Weight"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    label TEXT,
+    started_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS operations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    contract TEXT NOT NULL,
+    entrypoint TEXT NOT NULL,
+    wallet TEXT,
+    step TEXT,
+    fee INTEGER,
+    milligas INTEGER,
+    storage_burn INTEGER,
+    total_cost INTEGER,
+    weight INTEGER,
+    hash TEXT,
+    address TEXT,
+    executed_at REAL,
+    recorded_at REAL NOT NULL,
+    mode TEXT,
+    network TEXT,
+    estimated_fee INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_operations_contract_entrypoint ON operations (contract, entrypoint);
+CREATE INDEX IF NOT EXISTS idx_operations_run ON operations (run_id);
+"""
+# Columns added after the first schema: (name, type)
+ADDED_COLUMNS = [("mode", "TEXT"), ("network", "TEXT"), ("estimated_fee", "INTEGER")]
+
+COLUMNS = {
+    "TotalCost": "total_cost",
+    "BakerFee": "fee",
+    "EstimatedFee": "estimated_fee",
+    "Gas": "milligas",
+    "Storage": "storage_burn",
+    "Weight": "weight"
+}
+
+def percentile(sortedValues, fraction):
+    # Nearest-rank percentile on an already sorted list
+    if not sortedValues:
+        return None
+    index = max(0, min(len(sortedValues) - 1, math.ceil(fraction * len(sortedValues)) - 1))
+    return sortedValues[index]
+
+def median(sortedValues):
+    if not sortedValues:
+        return None
+    middle = len(sortedValues) // 2
+    if len(sortedValues) % 2:
+        return sortedValues[middle]
+    return (sortedValues[middle - 1] + sortedValues[middle]) / 2
+
+##Store
+class ResultsStore:
+    def __init__(self, dbFile=DB_FILE):
+        self.dbFile = dbFile
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(dbFile, check_same_thread=False, timeout=30)
+        self.connection.row_factory = sqlite3.Row
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.executescript(SCHEMA)
+            self._migrate()
+
+    def _migrate(self):
+        # Older databases lack the later columns: their rows stay NULL, i.e.
+        # unknown, and match no mode or network filter
+        existing = {row["name"] for row in self.connection.execute("PRAGMA table_info(operations)")}
+        for name, kind in ADDED_COLUMNS:
+            if name not in existing:
+                self.connection.execute(f"ALTER TABLE operations ADD COLUMN {name} {kind}")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS idx_operations_mode_network ON operations (mode, network)")
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def newRun(self, label=None):
+        runId = time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        with self.lock, self.connection:
+            self.connection.execute("INSERT INTO runs (run_id, label, started_at) VALUES (?, ?, ?)",
+                                    (runId, label, time.time()))
+        return runId
+
+    def recordCall(self, runId, callReport, wallet=None, step=None, mode=None, network=None):
+        # callReport: callInfoResult output with "contract"/"entryPoint" set;
+        # mode and network default to the report's own "mode"/"network"
+        self._insert(runId, "call", callReport.get("contract"), callReport.get("entryPoint"), callReport,
+                     wallet if wallet is not None else callReport.get("wallet"),
+                     step if step is not None else callReport.get("step"), mode, network)
+
+    def recordOrigination(self, runId, contract, deployReport, wallet=None, mode=None, network=None):
+        # deployReport: contractInfoResult output
+        self._insert(runId, "origination", contract, "origination", deployReport, wallet, None, mode, network)
+
+    def _insert(self, runId, kind, contract, entrypoint, report, wallet, step, mode, network):
+        now = time.time()
+        # a report without them is kept as unknown (NULL) and never counted
+        # in the per-mode stats
+        mode = mode if mode is not None else report.get("mode")
+        network = network if network is not None else report.get("network")
+        if mode is not None and mode not in MODES:
+            raise ValueError(f"unknown mode {mode}, expected one of {MODES}")
+        row = (
+            runId, kind, contract, entrypoint,
+            None if wallet is None else str(wallet),
+            None if step is None else str(step),
+            report.get("BakerFee"), report.get("Gas"), report.get("Storage", 0),
+            report.get("TotalCost"), report.get("Weight"),
+            report.get("Hash", report.get("hash")), report.get("address"),
+            report.get("timestamp", now), now, mode, network, report.get("EstimatedFee")
+        )
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO operations (run_id, kind, contract, entrypoint, wallet, step, fee, milligas, "
+                "storage_burn, total_cost, weight, hash, address, executed_at, recorded_at, mode, network, estimated_fee) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+
+    ##Queries
+    def runs(self):
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT r.run_id, r.label, r.started_at, COUNT(o.id) AS operations "
+                "FROM runs r LEFT JOIN operations o ON o.run_id = r.run_id "
+                "GROUP BY r.run_id ORDER BY r.started_at").fetchall()
+        return [dict(row) for row in rows]
+
+    def operations(self, contract=None, entrypoint=None, runId=None, mode=None, network=None):
+        query, params = self._filter("SELECT * FROM operations", contract, entrypoint, runId, mode, network)
+        with self.lock:
+            rows = self.connection.execute(query + " ORDER BY id", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def entrypointStats(self, contract=None, entrypoint=None, runId=None, metrics=STATS_METRICS, mode="inject", network=None):
+        # min/median/p95/max per (contract, entrypoint) for every metric, over
+        # the reports of one mode (default: injected) and, if given, one
+        # network, so that estimated and node figures are never mixed
+        columns = ", ".join(COLUMNS[m] for m in metrics)
+        query, params = self._filter(f"SELECT contract, entrypoint, {columns} FROM operations",
+                                     contract, entrypoint, runId, mode, network)
+        with self.lock:
+            rows = self.connection.execute(query + " ORDER BY contract, entrypoint", params).fetchall()
+
+        groups = {}
+        for row in rows:
+            groups.setdefault((row["contract"], row["entrypoint"]), []).append(row)
+
+        stats = []
+        for (contractName, entrypointName), groupRows in groups.items():
+            entry = {"contract": contractName, "entrypoint": entrypointName, "count": len(groupRows)}
+            for metric in metrics:
+                values = sorted(r[COLUMNS[metric]] for r in groupRows if r[COLUMNS[metric]] is not None)
+                entry[metric] = {
+                    "min": values[0] if values else None,
+                    "median": median(values),
+                    "p95": percentile(values, 0.95),
+                    "max": values[-1] if values else None
+                }
+            stats.append(entry)
+        return stats
+
+    def _filter(self, query, contract, entrypoint, runId, mode=None, network=None):
+        clauses, params = [], []
+        if mode is not None:
+            clauses.append("mode = ?")
+            params.append(mode)
+        if network is not None:
+            clauses.append("network = ?")
+            params.append(network)
+        if contract is not None:
+            clauses.append("contract = ?")
+            params.append(contract)
+        if entrypoint is not None:
+            clauses.append("entrypoint = ?")
+            params.append(entrypoint)
+        if runId is not None:
+            clauses.append("run_id = ?")
+            params.append(runId)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        return query, params
+
+
+##Report sink backend
+class StoreSink:
+    # ReportSink backend: every call report of a run goes into the store
+    def __init__(self, store, runId):
+        self.store = store
+        self.runId = runId
+
+    def write(self, report):
+        self.store.recordCall(self.runId, report)
+
+    def flush(self):
+        pass
+
+
+_store = None
+_storeLock = threading.Lock()
+
+def getStore(dbFile=DB_FILE):
+    global _store
+    with _storeLock:
+        if _store is None:
+            _store = ResultsStore(dbFile)
+        return _store
+
+def importJsonl(store, jsonlFile, label=None, mode=None, network=None):
+    # mode/network: for the records written before reports carried them
+    from reportSink import readReports
+    runId = store.newRun(label or f"import {jsonlFile}")
+    for report in readReports(jsonlFile):
+        store.recordCall(runId, report, mode=report.get("mode", mode), network=report.get("network", network))
+    return runId
+
+def formatStats(stats, metric="TotalCost"):
+    lines = [f"| Contract | Entrypoint | Count | {metric} min | median | p95 | max |",
+             "|:---|:---|---:|---:|---:|---:|---:|"]
+    for entry in stats:
+        values = entry[metric]
+        lines.append(f"| {entry['contract']} | {entry['entrypoint']} | {entry['count']} | "
+                     f"{values['min']} | {values['median']} | {values['p95']} | {values['max']} |")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the cost history stored in SQLite.")
+    parser.add_argument("--db", default=DB_FILE)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    stats = subparsers.add_parser("stats", help="per-entrypoint min/median/p95/max")
+    stats.add_argument("--contract")
+    stats.add_argument("--entrypoint")
+    stats.add_argument("--run")
+    stats.add_argument("--metric", default="TotalCost", choices=STATS_METRICS)
+    stats.add_argument("--mode", default="inject", choices=MODES)
+    stats.add_argument("--network", help="only this network (default: every network)")
+    stats.add_argument("--json", action="store_true")
+
+    subparsers.add_parser("runs", help="list the recorded runs")
+
+    importer = subparsers.add_parser("import", help="import a transactionsOutput.jsonl log as a new run")
+    importer.add_argument("file")
+    importer.add_argument("--label")
+    importer.add_argument("--mode", choices=MODES, help="mode of the records that do not carry one")
+    importer.add_argument("--network", help="network of the records that do not carry one")
+
+    args = parser.parse_args()
+    store = ResultsStore(args.db)
+
+    if args.command == "stats":
+        result = store.entrypointStats(args.contract, args.entrypoint, args.run, mode=args.mode, network=args.network)
+        print(json.dumps(result, indent=4) if args.json else formatStats(result, args.metric))
+    elif args.command == "runs":
+        print(json.dumps(store.runs(), indent=4))
+    elif args.command == "import":
+        print(importJsonl(store, args.file, args.label, args.mode, args.network))
+
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import math
+import time
+from functools import lru_cache
+
+from pytezos import ContractInterface
+from pytezos.crypto.key import Key
+from pytezos.michelson.forge import forge_micheline
+from pytezos.michelson.repl import Interpreter
+from pytezos.operation.fees import calculate_fee
+
+from spans import span
+from michelsonCache import parseMichelson
+from tracePlan import tezAmount as parseTez
+from contractUtils import buildCall, parseParameters, callInfoResult, operationWeight, MUTEZ_CONV, BRANCH_BYTES, SIGNATURE_BYTES
+
+STORAGE_BYTE_COST = 250
+SIMULATED_HASH = "simulated"
+DUMMY_SOURCE = "tz1grSQDByRpnVs7sPtaprNZRp531ZKz6Jmm"
+DUMMY_CONTRACT = "KT1LeAVyPJvwQ9wvHAT9sgh2EJ8oYiuNHGC1"
+
+# Coarse offline gas model (gas units): a fixed cost for the manager
+# operation, the (de)serialization of code, storage and parameter, and a
+# flat cost per interpreted instruction. These are the toolchain's own
+# round figures, not protocol constants: only the node simulation is exact,
+# and interpreted reports carry mode "interpret" so that they are never
+# aggregated with node figures.
+TRANSACTION_GAS = 1000
+GAS_PER_BYTE = 1
+GAS_PER_INSTRUCTION = 5
+
+##Node simulation
+def simulateCall(client, contractAddress, entrypointName, parameters, tezAmount):
+    # run_operation on the node: real gas and storage figures, nothing injected
+    print(f"\n Simulating {entrypointName} entrypoint...\n")
+
+    try:
+        with span("fill"):
+            opg = buildCall(client, contractAddress, entrypointName, parameters, tezAmount).as_transaction().fill()
+        with span("simulate"):
+            result = opg.run_operation()
+
+        content = dict(opg.contents[-1])
+        content["metadata"] = result["contents"][-1]["metadata"]
+        op_result_info = content["metadata"].get("operation_result", {})
+        if op_result_info.get("status") != "applied":
+            raise Exception(f"Simulation {op_result_info.get('status')}: {op_result_info.get('errors')}")
+
+        consumed_gas = math.ceil(int(op_result_info.get("consumed_milligas", 0)) / 1000)
+        content["fee"] = str(calculate_fee(content, consumed_gas, BRANCH_BYTES + SIGNATURE_BYTES))
+
+        return {
+            "hash": SIMULATED_HASH,
+            "mode": "simulate",
+            "contents": [content],
+            "weight": operationWeight([content])
+        }
+    except Exception as e:
+        return {"error": str(e)}
+
+##Offline interpreter
+@lru_cache(maxsize=32)
+def loadContract(michelsonCode):
+    return ContractInterface.from_michelson(michelsonCode)
+
+def walletAddress(key):
+    return Key.from_encoded_key(key).public_key_hash()
+
+def estimateGas(stdout, codeBytes, storageBytes, parameterBytes):
+    steps = sum(1 for line in stdout if not line.startswith(("BEGIN", "END")))
+    return TRANSACTION_GAS + GAS_PER_BYTE * (codeBytes + storageBytes + parameterBytes) + GAS_PER_INSTRUCTION * steps
+
+def executeScript(script, storage, entrypoint, parameter, amount, sender=DUMMY_SOURCE, source=None,
+                  balance=0, now=None, address=DUMMY_CONTRACT, level=None):
+    # One contract execution on the local interpreter. script is the
+    # Micheline code, storage and parameter are Micheline values, amounts in
+    # mutez. Raises the Michelson error if the contract fails.
+    operations, newStorage, lazyDiff, stdout, error = Interpreter.run_code(
+        parameter=parameter,
+        entrypoint=entrypoint,
+        storage=storage,
+        script=script,
+        amount=amount,
+        sender=sender,
+        source=source or sender,
+        balance=balance,
+        now=now if now is not None else int(time.time()),
+        address=address,
+        level=level
+    )
+    if error:
+        raise error
+
+    codeBytes = len(forge_micheline(script))
+    oldStorageBytes = len(forge_micheline(storage))
+    newStorageBytes = len(forge_micheline(newStorage))
+    parameterBytes = len(forge_micheline(parameter))
+    return {
+        "storage": newStorage,
+        "operations": operations,
+        "stdout": stdout,
+        "consumedGas": estimateGas(stdout, codeBytes, oldStorageBytes, parameterBytes),
+        "storageSize": newStorageBytes,
+        "storageDiff": newStorageBytes - oldStorageBytes
+    }
+
+def interpretCall(michelsonCode, storage, entrypointName, parameters, tezAmount,
+                  sender=DUMMY_SOURCE, balance=0, now=None, address=DUMMY_CONTRACT):
+    # Local Michelson interpreter run on the compiled .tz: no node involved.
+    # storage may be Michelson text or Micheline; the returned op result
+    # carries the new storage so trace steps can be chained.
+    contract = loadContract(michelsonCode)
+    entrypoint = getattr(contract, entrypointName)
+    parameters = parseParameters(parameters)
+    call = entrypoint(*parameters) if parameters else entrypoint()
+    amount = int(tezAmount * MUTEZ_CONV)
+
+    storageExpr = parseMichelson(storage) if isinstance(storage, str) else storage
+    execution = executeScript(contract.context.script['code'], storageExpr, call.parameters['entrypoint'],
+                              call.parameters['value'], amount, sender=sender, balance=balance, now=now,
+                              address=address)
+    consumed_gas = execution["consumedGas"]
+
+    content = {
+        "kind": "transaction",
+        "source": sender,
+        "fee": "0",
+        "counter": "1",
+        "gas_limit": str(consumed_gas),
+        "storage_limit": "0",
+        "amount": str(amount),
+        "destination": address,
+        "parameters": call.parameters
+    }
+    content["fee"] = str(calculate_fee(content, consumed_gas, BRANCH_BYTES + SIGNATURE_BYTES))
+    content["metadata"] = {
+        "operation_result": {
+            "status": "applied",
+            "consumed_milligas": str(consumed_gas * 1000),
+            "paid_storage_size_diff": str(max(0, execution["storageDiff"]))
+        }
+    }
+
+    return {
+        "hash": SIMULATED_HASH,
+        "mode": "interpret",
+        "contents": [content],
+        "weight": operationWeight([content]),
+        "storage": execution["storage"],
+        "operations": execution["operations"],
+        "balance": balance + amount,
+        "stdout": execution["stdout"]
+    }
+
+def interpretTraceCsv(contract, rows, michelsonCode, initialStorage, wallets, initialBalance=0):
+    # Replays a whole CSV trace offline, threading storage and balance from one
+    # step to the next. wallets: {walletId: private key}
+    infoResultDict = {}
+    storage = initialStorage
+    balance = int(initialBalance * MUTEZ_CONV)
+
+    for element in rows:
+        row = rows[element]
+        entrypointSel = row[0]
+        parameters = row[2:len(row)-1]
+
+        try:
+            tezAmount = parseTez(row[len(row)-1])
+            opResult = interpretCall(michelsonCode, storage, entrypointSel, parameters, tezAmount,
+                                     sender=walletAddress(wallets[row[1]]), balance=balance)
+        except Exception as e:
+            infoResultDict[element] = {"contract": contract, "step": element, "error": str(e)}
+            continue
+
+        storage = opResult["storage"]
+        balance = opResult["balance"] - sum(int(op.get("amount", 0)) for op in opResult["operations"])
+
+        infoResult = callInfoResult(opResult=opResult)
+        infoResult["contract"] = contract
+        infoResult["entryPoint"] = entrypointSel
+        infoResult["wallet"] = row[1]
+        infoResult["step"] = element
+        infoResultDict[element] = infoResult
+
+    return infoResultDict
@@ -0,0 +1,256 @@
+import argparse
+import atexit
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Spans are appended to this JSON Lines file; TOOLCHAIN_SPANS="" keeps them
+# in memory only
+SPAN_FILE = os.environ.get("TOOLCHAIN_SPANS", "spans.jsonl")
+FLUSH_EVERY = 500
+# Histogram bucket upper bounds, in milliseconds
+BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000]
+# Phases in the order an operation goes through them
+PHASES = ["compile", "parse", "fill", "simulate", "forge", "sign", "inject", "inclusion", "report"]
+
+_attributes = contextvars.ContextVar("spanAttributes", default={})
+_current = contextvars.ContextVar("spanCurrent", default=None)
+
+##Aggregates
+def phaseOrder(name):
+    return (PHASES.index(name) if name in PHASES else len(PHASES), name)
+
+def bucketLabel(index):
+    return f"<={BUCKETS[index]}ms" if index < len(BUCKETS) else f">{BUCKETS[-1]}ms"
+
+class PhaseStats:
+    # Running aggregates of one phase: no sample is kept, the percentiles are
+    # interpolated inside the histogram buckets
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.buckets[next((i for i, b in enumerate(BUCKETS) if duration <= b), len(BUCKETS))] += 1
+
+    def percentile(self, q):
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            if count and seen + count >= rank:
+                if index == len(BUCKETS):
+                    return self.max
+                lower = BUCKETS[index - 1] if index else 0
+                estimate = lower + (BUCKETS[index] - lower) * (rank - seen) / count
+                return round(min(estimate, self.max), 3)
+            seen += count
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "max": self.max,
+            "total": round(self.total, 3),
+            "buckets": {bucketLabel(i): count for i, count in enumerate(self.buckets) if count}
+        }
+
+class LatencyStats:
+    # {phase: PhaseStats}, fed with (name, ms) pairs
+    def __init__(self):
+        self.phases = {}
+
+    def add(self, name, duration):
+        self.phases.setdefault(name, PhaseStats()).add(duration)
+
+    def summary(self):
+        return {name: self.phases[name].summary() for name in sorted(self.phases, key=phaseOrder)}
+
+##Recorder
+class SpanRecorder:
+    # Finished spans are buffered and appended to spanFile in batches; the
+    # active collectors aggregate every (name, duration) for the summaries
+    def __init__(self, spanFile=SPAN_FILE, flushEvery=FLUSH_EVERY):
+        self.spanFile = spanFile
+        self.flushEvery = flushEvery
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.collectors = []
+
+    def record(self, record):
+        with self.lock:
+            for collector in self.collectors:
+                collector.add(record["name"], record["duration_ms"])
+            if not self.spanFile:
+                return
+            self.buffer.append(record)
+            full = len(self.buffer) >= self.flushEvery
+        if full:
+            self.flush()
+
+    def flush(self):
+        from reportSink import lockedFile
+        with self.lock:
+            records, self.buffer = self.buffer, []
+        if not records:
+            return
+        with lockedFile(self.spanFile, 'a') as file:
+            file.writelines(json.dumps(record) + "\n" for record in records)
+
+    @contextmanager
+    def collect(self):
+        # Aggregates of the spans finished while the block runs, in any thread
+        collector = LatencyStats()
+        with self.lock:
+            self.collectors.append(collector)
+        try:
+            yield collector
+        finally:
+            with self.lock:
+                self.collectors.remove(collector)
+
+
+_recorder = SpanRecorder()
+atexit.register(_recorder.flush)
+
+def getRecorder():
+    return _recorder
+
+##Spans
+def newId(size):
+    return os.urandom(size).hex()
+
+@contextmanager
+def tagged(**attributes):
+    # Attributes (contract, entrypoint, wallet, step, ...) inherited by the
+    # spans opened inside the block
+    token = _attributes.set(dict(_attributes.get(), **{k: v for k, v in attributes.items() if v is not None}))
+    try:
+        yield
+    finally:
+        _attributes.reset(token)
+
+def spanRecord(name, start, end, traceId, spanId, parentId, attributes, error=None):
+    # OpenTelemetry span fields, flattened to one JSON object
+    return {
+        "name": name,
+        "trace_id": traceId,
+        "span_id": spanId,
+        "parent_span_id": parentId,
+        "start_time_unix_nano": int(start * 1e9),
+        "end_time_unix_nano": int(end * 1e9),
+        "duration_ms": round((end - start) * 1000, 3),
+        "attributes": {k: v if isinstance(v, (str, int, float, bool)) else str(v) for k, v in attributes.items()},
+        "status": {"code": "ERROR", "message": error} if error else {"code": "OK"}
+    }
+
+@contextmanager
+def span(name, **attributes):
+    parent = _current.get()
+    traceId = parent[0] if parent else newId(16)
+    spanId = newId(8)
+    token = _current.set((traceId, spanId))
+    start = time.time()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        end = time.time()
+        _current.reset(token)
+        _recorder.record(spanRecord(name, start, end, traceId, spanId, parent[1] if parent else None,
+                                    dict(_attributes.get(), **attributes), error))
+
+def recordSpan(name, start, end, **attributes):
+    # A phase measured elsewhere (another process, a callback): recorded as a
+    # child of the current span
+    parent = _current.get()
+    _recorder.record(spanRecord(name, start, end, parent[0] if parent else newId(16), newId(8),
+                                parent[1] if parent else None, dict(_attributes.get(), **attributes)))
+
+async def bindContext(coroutine, attributes, current):
+    # Coroutines submitted to the asyncRpc loop run in the loop's context:
+    # carry over the caller's attributes and parent span
+    attributesToken = _attributes.set(attributes)
+    currentToken = _current.set(current)
+    try:
+        return await coroutine
+    finally:
+        _current.reset(currentToken)
+        _attributes.reset(attributesToken)
+
+def carryContext(coroutine):
+    return bindContext(coroutine, _attributes.get(), _current.get())
+
+def collectSpans():
+    return _recorder.collect()
+
+def flushSpans():
+    _recorder.flush()
+
+##Summaries
+def latencySummary(durations):
+    # durations: [(name, ms)] or LatencyStats -> {phase: count, p50, p95, max,
+    # total and bucket counts}, phases in PHASES order then the others
+    if not isinstance(durations, LatencyStats):
+        stats = LatencyStats()
+        for name, duration in durations:
+            stats.add(name, duration)
+        durations = stats
+    return durations.summary()
+
+def formatLatency(summary, width=30):
+    if not summary:
+        return "No spans recorded."
+    lines = ["| Phase | Count | p50 (ms) | p95 (ms) | max (ms) | total (ms) |",
+             "|:---|---:|---:|---:|---:|---:|"]
+    for name, entry in summary.items():
+        lines.append(f"| {name} | {entry['count']} | {entry['p50']:.1f} | {entry['p95']:.1f} | "
+                     f"{entry['max']:.1f} | {entry['total']:.1f} |")
+    for name, entry in summary.items():
+        lines.append(f"\n{name}")
+        peak = max(entry["buckets"].values())
+        for label, count in entry["buckets"].items():
+            lines.append(f"  {label:>10} {'#' * max(1, round(width * count / peak))} {count}")
+    return "\n".join(lines)
+
+def readSpans(spanFile=SPAN_FILE):
+    spans = []
+    try:
+        with open(spanFile, 'r', encoding='utf-8') as file:
+            for line in file:
+                line = line.strip()
+                if line:
+                    spans.append(json.loads(line))
+    except FileNotFoundError:
+        pass
+    return spans
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency summary of the recorded spans.")
+    parser.add_argument("--input", default=SPAN_FILE or "spans.jsonl")
+    parser.add_argument("--contract")
+    parser.add_argument("--entrypoint")
+    parser.add_argument("--wallet")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    filters = {"contract": args.contract, "entrypoint": args.entrypoint, "wallet": args.wallet}
+    durations = [(s["name"], s["duration_ms"]) for s in readSpans(args.input)
+                 if all(v is None or str(s["attributes"].get(k)) == v for k, v in filters.items())]
+    summary = latencySummary(durations)
+    print(json.dumps(summary, indent=4) if args.json else formatLatency(summary))
+
+if __name__ == "__main__":
+    main()
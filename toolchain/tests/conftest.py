@@ -0,0 +1,69 @@
+import json
+import os
+import sys
+
+import pytest
+
+# The modules import each other by name from the toolchain folder; the
+# tests never reach a real node and keep their spans in memory
+TOOLCHAIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOOLCHAIN_DIR)
+os.environ.setdefault("TOOLCHAIN_NETWORK", "mock")
+os.environ["TOOLCHAIN_SPANS"] = ""
+
+from pytezos.crypto.key import Key
+
+import addressRegistry
+import clientPool
+import estimateCache
+import resultsStore
+from clientPool import ClientPool
+from contractUtils import origination, contractInfoResult
+from estimateCache import EstimateCache
+from michelsonCache import loadScript
+from resultsStore import ResultsStore
+
+WALLETS = ["1", "2", "3"]
+
+
+@pytest.fixture
+def mockPool(tmp_path, monkeypatch):
+    # Fresh wallets on the in-process mock chain (implicit accounts are
+    # funded on first use); the registry, the estimates and the results
+    # store stay out of the repository
+    monkeypatch.chdir(TOOLCHAIN_DIR)
+    walletFile = tmp_path / "wallet.json"
+    walletFile.write_text(json.dumps({w: Key.generate(export=False).secret_key() for w in WALLETS}))
+    pool = ClientPool(walletFile=str(walletFile), network="mock")
+    monkeypatch.setattr(clientPool, "_pool", pool)
+    monkeypatch.setattr(addressRegistry, "_registries", {})
+    monkeypatch.setattr(estimateCache, "_estimates", EstimateCache(tmp_path / "estimates.json"))
+    monkeypatch.setattr(resultsStore, "_store", ResultsStore(str(tmp_path / "results.db")))
+    return pool
+
+@pytest.fixture
+def walletAddress(mockPool):
+    return lambda walletId: mockPool.getClient(walletId).key.public_key_hash()
+
+@pytest.fixture
+def deployOracleBet(mockPool):
+    # deployOracleBet(name) -> address of a new OracleBet registered as name
+    code, storage = loadScript("OracleBet")
+
+    def deploy(name="OracleBet", walletId="1"):
+        opResult = origination(client=mockPool.getClient(walletId), michelsonCode=code, initialStorage=storage, initialBalance=0)
+        address = contractInfoResult(op_result=opResult)["address"]
+        addressRegistry.getRegistry("mock").register(name, address)
+        return address
+    return deploy
+
+@pytest.fixture
+def betTrace(walletAddress):
+    # betTrace(player1, player2, oracle) -> the two deposits, deposit2 only
+    # succeeds once deposit is applied
+    def trace(player1="1", player2="2", oracle="3"):
+        return {
+            "1": ["deposit", player1, f"player2={walletAddress(player2)}", f"oracle={walletAddress(oracle)}", "1"],
+            "2": ["deposit2", player2, "1"]
+        }
+    return trace
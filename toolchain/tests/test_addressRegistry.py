@@ -0,0 +1,72 @@
+import json
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+import addressRegistry
+from addressRegistry import AddressRegistry, getRegistry
+
+WORKERS = 8
+DEPLOYS = 10
+
+
+def address(worker, index):
+    return f"KT1{worker:03d}{index:03d}"
+
+def deploy(registryFile, worker):
+    # a registry of its own, as a separate deployer process would have
+    registry = AddressRegistry(registryFile, "testnet")
+    for index in range(DEPLOYS):
+        registry.register("Auction", address(worker, index), wallet=worker)
+    registry.registerInstances("OracleBet", [(address(worker, DEPLOYS), worker)])
+
+def checkRegistry(registryFile):
+    data = json.loads(registryFile.read_text())
+    addresses = {entry["address"] for entry in data["deployments"]["Auction"]}
+    assert addresses == {address(w, i) for w in range(WORKERS) for i in range(DEPLOYS)}
+    # the bulk instances got distinct numbers
+    assert sorted(data["aliases"]) == sorted(f"OracleBet#{n}" for n in range(1, WORKERS + 1))
+    assert data["current"]["Auction"] in addresses
+
+def test_concurrent_threads_lose_no_deployment(tmp_path):
+    registryFile = tmp_path / "addressRegistry.json"
+    with ThreadPoolExecutor(WORKERS) as pool:
+        list(pool.map(lambda worker: deploy(registryFile, worker), range(WORKERS)))
+    checkRegistry(registryFile)
+
+def test_concurrent_processes_lose_no_deployment(tmp_path):
+    registryFile = tmp_path / "addressRegistry.json"
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=deploy, args=(registryFile, worker)) for worker in range(WORKERS)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+    checkRegistry(registryFile)
+
+def test_reads_follow_other_writers(tmp_path):
+    registryFile = tmp_path / "addressRegistry.json"
+    reader = AddressRegistry(registryFile, "testnet")
+    writer = AddressRegistry(registryFile, "testnet")
+    writer.register("Auction", "KT1first")
+    assert reader.lookup("Auction") == "KT1first"
+    writer.register("Auction", "KT1second", aliases=["Auction@old"])
+    assert reader.lookup("Auction") == "KT1second"
+    assert reader.addressMap() == {"Auction": "KT1second"}
+    assert reader.aliasMap() == {"Auction@old": "KT1second"}
+
+def test_memory_only_registry_writes_nothing(tmp_path, monkeypatch):
+    # the mock chain's registry: no registry, lock or legacy file anywhere
+    # around the working directory
+    workDir = tmp_path / "toolchain"
+    workDir.mkdir()
+    monkeypatch.chdir(workDir)
+    monkeypatch.setattr(addressRegistry, "_registries", {})
+    registry = getRegistry("mock")
+    assert registry.registryFile is None and registry.lockFile is None
+
+    registry.register("Auction", "KT1mock", aliases=["Auction@mock"])
+    registry.registerInstances("Auction", [("KT1mock2", "1")])
+    assert registry.lookup("Auction") == "KT1mock"
+    assert registry.aliasMap() == {"Auction@mock": "KT1mock", "Auction#1": "KT1mock2"}
+    assert [path.name for path in tmp_path.rglob("*")] == ["toolchain"]
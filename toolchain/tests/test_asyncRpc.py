@@ -0,0 +1,37 @@
+from pytezos.rpc.node import RpcError
+
+import asyncRpc
+from asyncRpc import getAsyncRpc, feeThresholds, runSync, isTransient, responseError, ThreadTransport
+
+
+def test_mock_node_runs_on_worker_threads(mockPool):
+    assert isinstance(getAsyncRpc(mockPool.getClient("1")).transport, ThreadTransport)
+
+def test_fee_thresholds_are_read_once_per_node(mockPool, walletAddress, monkeypatch):
+    client = mockPool.getClient("1")
+    rpc = getAsyncRpc(client)
+    monkeypatch.setattr(rpc, "feeThresholds", None)
+    monkeypatch.setattr(client.context, "fee_thresholds", "node")
+    reads = []
+    mempoolFilter = rpc.mempoolFilter
+
+    async def countedFilter():
+        reads.append(1)
+        return await mempoolFilter()
+    monkeypatch.setattr(rpc, "mempoolFilter", countedFilter)
+
+    operations = [client.transaction(destination=walletAddress("2"), amount=i) for i in (1, 2)]
+    thresholds = [runSync(feeThresholds(rpc, opg)) for opg in operations]
+    assert thresholds[0] is not None and thresholds[0] is thresholds[1]
+    assert len(reads) == 1
+
+def test_only_temporary_shell_errors_are_retried():
+    temporary = '[{"kind": "temporary", "id": "node.prevalidation.busy"}]'
+    assert isTransient(temporary, True)
+    assert not isTransient('[{"kind": "temporary", "id": "proto.alpha.counter_in_the_future"}]', True)
+    assert not isTransient(temporary, False)
+
+def test_error_answers_become_rpc_errors():
+    error = responseError('[{"kind": "permanent", "id": "proto.alpha.michelson_v1.script_rejected"}]', True)
+    assert isinstance(error, RpcError) and "script_rejected" in str(error)
+    assert "bad gateway" in str(responseError("bad gateway", False))
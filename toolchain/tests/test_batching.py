@@ -0,0 +1,33 @@
+from execution import executionSetupAll
+from traceExecutor import groupConsecutive, isFailed
+
+
+def test_consecutive_steps_of_one_wallet_form_a_group():
+    rows = {"1": ["a", "1"], "2": ["b", "1"], "3": ["c", "2"], "4": ["d", "1"], "5": ["e", "1"]}
+    groups = groupConsecutive(rows)
+    assert {groupId: [stepId for stepId, _ in group] for groupId, group in groups.items()} == {
+        "1": ["1", "2"], "3": ["3"], "4": ["4", "5"]}
+
+def test_batch_is_one_operation_split_per_step(deployOracleBet, walletAddress):
+    # wallet 1 is both players: deposit and deposit2 go in one group
+    deployOracleBet()
+    rows = {"1": ["deposit", "1", f"player2={walletAddress('1')}", f"oracle={walletAddress('3')}", "1"],
+            "2": ["deposit2", "1", "1"]}
+    results = executionSetupAll({"OracleBet": rows}, batch=True)["OracleBet"]
+
+    assert not any(isFailed(r) for r in results.values()), results
+    first, second = results["1"], results["2"]
+    assert first["Hash"] == second["Hash"]
+    assert (first["BatchIndex"], second["BatchIndex"]) == (0, 1)
+    assert first["SignatureBytes"] + second["SignatureBytes"] == 64
+    assert first["Gas"] > 0 and second["Gas"] > 0
+
+def test_failed_batch_fails_every_step_with_the_reason(deployOracleBet, walletAddress):
+    deployOracleBet()
+    rows = {"1": ["deposit", "1", f"player2={walletAddress('2')}", f"oracle={walletAddress('3')}", "1"],
+            "2": ["withdraw", "1", "0"]}
+    results = executionSetupAll({"OracleBet": rows}, batch=True)["OracleBet"]
+
+    for stepId, result in results.items():
+        assert result["step"] == stepId
+        assert "The oracle didn't select any winner yet" in result["error"]
@@ -0,0 +1,38 @@
+import pytest
+
+from addressRegistry import getRegistry
+from bulkDeploy import packOriginations, bulkDeployContract, mutez
+
+CONSTANTS = {
+    "max_operation_data_length": 1000,
+    "hard_gas_limit_per_block": "10000",
+    "hard_gas_limit_per_operation": "3000",
+    "hard_storage_limit_per_operation": "60000"
+}
+
+
+def test_groups_respect_size_and_gas():
+    # 1000 bytes less branch and signature leave 904 per group
+    assert packOriginations([400, 400, 400, 100], 1000, 300, CONSTANTS) == [[0, 1], [2, 3]]
+    # the per-operation gas limit caps a group at 3 originations
+    assert packOriginations([10] * 7, 1000, 300, CONSTANTS) == [[0, 1, 2], [3, 4, 5], [6]]
+
+def test_oversized_origination_is_refused():
+    with pytest.raises(ValueError, match="over the 904 bytes"):
+        packOriginations([905], 1000, 300, CONSTANTS)
+
+def test_balances_are_exact_mutez():
+    assert mutez(1.001) == 1001000
+    assert mutez("0.5") == 500000
+
+def test_instances_are_originated_and_registered(mockPool):
+    reports = bulkDeployContract("OracleBet", 3, wallets=("1", "2"), balances=0.5)
+    assert [r["instance"] for r in reports] == [0, 1, 2]
+    assert all("error" not in r for r in reports)
+    # one group fits the three, so the first wallet sends it
+    assert {r["wallet"] for r in reports} == {"1"} and reports[0]["BatchSize"] == 3
+    assert [r["name"] for r in reports] == ["OracleBet#1", "OracleBet#2", "OracleBet#3"]
+    registry = getRegistry()
+    assert [registry.lookup(r["name"]) for r in reports] == [r["address"] for r in reports]
+    client = mockPool.getClient("1")
+    assert client.contract(reports[0]["address"]).context.get_balance() == 500000
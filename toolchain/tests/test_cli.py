@@ -0,0 +1,47 @@
+import json
+from decimal import Decimal
+
+import pytest
+
+from cli import buildParser, main
+
+
+def runCli(capsys, *argv):
+    code = main(list(argv))
+    return code, json.loads(capsys.readouterr().out)
+
+def test_amounts_are_exact_tez():
+    args = buildParser().parse_args(["call", "OracleBet", "deposit2", "--wallet", "2", "--amount", "0.5"])
+    assert args.amount == Decimal("0.5")
+    with pytest.raises(SystemExit):
+        buildParser().parse_args(["call", "OracleBet", "deposit2", "--wallet", "2", "--amount", "0.0000001"])
+
+def test_single_calls_are_never_interpreted():
+    with pytest.raises(SystemExit):
+        buildParser().parse_args(["call", "OracleBet", "deposit2", "--wallet", "2", "--mode", "interpret"])
+    assert buildParser().parse_args(["trace", "run", "--mode", "interpret"]).mode == "interpret"
+
+def test_pipeline_option_keeps_its_old_name():
+    parser = buildParser()
+    assert parser.parse_args(["trace", "run", "--pipeline-wallets", "3"]).pipeline == 3
+    assert parser.parse_args(["trace", "run", "--pipeline", "2"]).pipeline == 2
+
+def test_manifest_jobs_run_in_order(mockPool, walletAddress, tmp_path, capsys):
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(json.dumps({"network": "mock", "jobs": [
+        {"command": "deploy", "contract": "OracleBet", "wallet": "1"},
+        {"command": "call", "contract": "OracleBet", "wallet": "1", "entrypoint": "deposit", "amount": 1,
+         "parameters": [f"player2={walletAddress('2')}", f"oracle={walletAddress('3')}"]},
+        {"command": "call", "contract": "OracleBet", "wallet": "2", "entrypoint": "deposit2", "amount": "1"}
+    ]}))
+    code, output = runCli(capsys, "run", str(manifest))
+    assert code == 0 and output["ok"]
+    assert [r["job"]["command"] for r in output["results"]] == ["deploy", "call", "call"]
+    assert output["results"][2]["result"]["entryPoint"] == "deposit2"
+
+def test_failed_call_exits_non_zero_with_the_reason(mockPool, deployOracleBet, capsys):
+    deployOracleBet()
+    capsys.readouterr()
+    code, output = runCli(capsys, "call", "OracleBet", "deposit2", "--wallet", "2", "--amount", "0.5")
+    assert code == 1 and not output["ok"]
+    assert "wait for player1 deposit first" in output["results"]["result"]["error"]
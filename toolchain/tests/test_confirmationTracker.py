@@ -0,0 +1,46 @@
+from confirmationTracker import ConfirmationTracker, ScriptedRpc
+
+
+class RecordingRpc(ScriptedRpc):
+    # ScriptedRpc that remembers which levels were downloaded
+    def __init__(self, blocks=None):
+        super().__init__(blocks)
+        self.levels = []
+
+    def blockOperations(self, level):
+        self.levels.append(level)
+        return super().blockOperations(level)
+
+def tracker(rpc, **kwargs):
+    return ConfirmationTracker(rpc, pollInterval=0.01, **kwargs)
+
+def test_one_follower_serves_every_pending_operation():
+    rpc = RecordingRpc([[]])
+    confirmations = tracker(rpc)
+    futures = [confirmations.watch(f"op{i}", timeout=5) for i in range(3)]
+    rpc.bake([{"hash": "op0"}, {"hash": "op1"}])
+    rpc.bake([{"hash": "op2"}])
+
+    assert [f.result(timeout=5)["hash"] for f in futures] == ["op0", "op1", "op2"]
+    # every block is downloaded once, whatever the number of waiters
+    assert len(rpc.levels) == len(set(rpc.levels))
+
+def test_already_included_operation_is_found_in_the_lookback():
+    rpc = ScriptedRpc([[{"hash": "old"}], [], []])
+    assert tracker(rpc).wait("old", timeout=5)["hash"] == "old"
+
+def test_waits_for_the_confirmation_depth():
+    rpc = ScriptedRpc([[]])
+    confirmations = tracker(rpc, confirmations=3)
+    future = confirmations.watch("op", timeout=5)
+    rpc.bake([{"hash": "op"}])
+    rpc.bake()
+    assert not future.done()
+    rpc.bake()
+    assert future.result(timeout=5)["hash"] == "op"
+
+def test_times_out_when_never_included():
+    rpc = ScriptedRpc([[]])
+    confirmations = tracker(rpc)
+    assert confirmations.wait("missing", timeout=0.2) is None
+    assert confirmations.stats()["pending"] == 0
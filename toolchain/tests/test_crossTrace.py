@@ -0,0 +1,40 @@
+from decimal import Decimal
+
+import pytest
+
+from crossTrace import parseTrace
+
+WALLETS = ["1", "2", "3"]
+
+
+def trace(*sections, actors=({"seller": "alice"}, {"bidder": "bob"}, {"bidder": "carol"})):
+    return {
+        "trace_actors": list(actors),
+        "trace_execution": [{"sequence_id": str(i + 1), "function_name": "bid", "waiting_time": i, "tezos": section}
+                            for i, section in enumerate(sections)]
+    }
+
+def step(signer="seller", amount=0, **section):
+    return dict({"signer": signer, "parameters": [], "amount": amount}, **section)
+
+def test_fractional_amounts_are_kept_exact():
+    contract, steps = parseTrace(trace(step(amount=0.5), step(amount="1.25"), step(amount=2)), "auction", WALLETS)
+    assert contract == "Auction"
+    assert [row[-1] for _, _, row in steps] == [Decimal("0.5"), Decimal("1.25"), Decimal("2")]
+
+def test_bad_amount_rejects_the_trace():
+    with pytest.raises(ValueError, match="auction step 1: invalid tez amount"):
+        parseTrace(trace(step(amount="half")), "auction", WALLETS)
+
+def test_signers_map_to_wallets():
+    _, steps = parseTrace(trace(step("seller"), step("bidder"), step("bidder"), step("alice", entrypoint="close")),
+                          "auction", WALLETS)
+    # alice, bob, carol get wallets 1, 2, 3; the bidder role rotates
+    assert [(stepId, wait, row[:2]) for stepId, wait, row in steps] == [
+        ("1", 0.0, ["bid", "1"]), ("2", 1.0, ["bid", "2"]), ("3", 2.0, ["bid", "3"]), ("4", 3.0, ["close", "1"])]
+
+def test_unmapped_steps_are_rejected():
+    with pytest.raises(ValueError, match="no tezos signer"):
+        parseTrace(trace({"parameters": [], "amount": 0}), "auction", WALLETS)
+    with pytest.raises(ValueError, match="cannot sign"):
+        parseTrace(trace(step("auction_info account")), "auction", WALLETS)
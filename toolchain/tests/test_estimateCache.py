@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+
+from estimateCache import EstimateCache, estimateKey, parameterShape
+
+ADDRESS = "KT18rj7BbbW6TyYjrA3aFANufnJZB3Pv3opG"
+
+
+def client(uri="mock://local"):
+    return SimpleNamespace(shell=SimpleNamespace(node=SimpleNamespace(uri=[uri])))
+
+def call(value, entrypoint="deposit"):
+    return {"entrypoint": entrypoint, "value": value}
+
+def test_shape_keeps_structure_and_lengths_not_values():
+    value = {"prim": "Pair", "args": [{"string": "tz1aLPm3WynyHRXFvjjdHZDKEjHZVvQMGxqU"}, {"int": "10"}]}
+    other = {"prim": "Pair", "args": [{"string": "tz1ZNfCeehri4t8oFNB187DDEAqtdu3Ayc1z"}, {"int": "99999"}]}
+    assert parameterShape(value) == parameterShape(other) == ["Pair", ["string:36", "int"]]
+    assert parameterShape({"bytes": "00ff"}) != parameterShape({"bytes": "00"})
+
+def test_key_separates_network_entrypoint_and_amount():
+    unit = call({"prim": "Unit"})
+    key = estimateKey(client(), ADDRESS, unit, 0)
+    assert key == estimateKey(client(), ADDRESS, unit, 0)
+    assert key.startswith("mock://local|")
+    assert key != estimateKey(client("http://localhost:8732"), ADDRESS, unit, 0)
+    assert key != estimateKey(client(), ADDRESS, call({"prim": "Unit"}, "withdraw"), 0)
+    assert key != estimateKey(client(), ADDRESS, unit, 1)
+    # only zero/non-zero matters
+    assert estimateKey(client(), ADDRESS, unit, 1) == estimateKey(client(), ADDRESS, unit, 5000000)
+
+def test_cached_limits_carry_the_margin(tmp_path):
+    estimates = EstimateCache(tmp_path / "estimates.json", margin=0.1)
+    assert estimates.lookup("k") is None
+    estimates.store("k", 2000, 300)
+    assert estimates.lookup("k") == (2200, 330)
+    # persisted for the next process
+    assert EstimateCache(tmp_path / "estimates.json", margin=0).lookup("k") == (2000, 300)
+
+def test_invalidated_entry_is_simulated_again(tmp_path):
+    estimates = EstimateCache(tmp_path / "estimates.json")
+    estimates.store("k", 2000, 300)
+    estimates.invalidate("k")
+    assert estimates.lookup("k") is None
+    assert EstimateCache(tmp_path / "estimates.json").lookup("k") is None
+    assert estimates.stats()["retries"] == 1
@@ -0,0 +1,30 @@
+from decimal import Decimal
+
+import pytest
+
+import execution
+from tracePlan import PlannedStep
+
+STEP = PlannedStep("deposit", "1", "KT18rj7BbbW6TyYjrA3aFANufnJZB3Pv3opG", {"entrypoint": "deposit", "value": {"prim": "Unit"}}, Decimal(1))
+
+
+@pytest.fixture(autouse=True)
+def noWallets(monkeypatch):
+    monkeypatch.setattr(execution, "getClient", lambda walletId: None)
+
+@pytest.mark.parametrize("opResult, error", [
+    ({"error": "proto.alpha.michelson_v1.script_rejected"}, "proto.alpha.michelson_v1.script_rejected"),
+    (None, "no operation result"),
+])
+def test_failed_call_reports_its_reason(opResult, error):
+    result = execution.executionStepPlanned("OracleBet", "2", STEP, callFunction=lambda **kwargs: opResult)
+    assert result == {"contract": "OracleBet", "entryPoint": "deposit", "wallet": "1", "step": "2", "error": error}
+
+def test_failed_batch_reports_every_step(monkeypatch):
+    monkeypatch.setattr(execution, "entrypointBatchCall", lambda client, calls: {"error": "proto.alpha.counter_in_the_past"})
+    group = [("3", STEP), ("4", STEP._replace(entrypoint="withdraw"))]
+    results = execution.executionBatchPlanned("OracleBet", "3", group)
+    assert results == {
+        "3": {"contract": "OracleBet", "entryPoint": "deposit", "wallet": "1", "step": "3", "error": "proto.alpha.counter_in_the_past"},
+        "4": {"contract": "OracleBet", "entryPoint": "withdraw", "wallet": "1", "step": "4", "error": "proto.alpha.counter_in_the_past"},
+    }
@@ -0,0 +1,31 @@
+from pathlib import Path
+
+from pytezos.crypto.key import Key
+
+from gasProfiler import profileCall, profileTrace, fixedCosts, hotInstructions
+from simulateUtils import walletAddress
+
+CONTRACT_DIR = Path(__file__).resolve().parent.parent / "OracleBet"
+CODE = (CONTRACT_DIR / "step_001_cont_0_contract.tz").read_text()
+STORAGE = (CONTRACT_DIR / "step_001_cont_0_storage.tz").read_text()
+
+
+def test_frames_add_up_to_the_call_gas():
+    player2, oracle = (walletAddress(Key.generate(export=False).secret_key()) for _ in range(2))
+    parameters = [f"player2={player2}", f"oracle={oracle}"]
+    profile = profileCall(CODE, STORAGE, "deposit", parameters, 1)
+    assert sum(milligas for _, milligas in profile["frames"].values()) == profile["milligas"]
+    assert profile["balance"] == 1000000
+    assert hotInstructions({"frames": profile["frames"]})
+
+def test_trace_profiles_every_step_and_reports_the_others():
+    wallets = {w: Key.generate(export=False).secret_key() for w in ("1", "2", "3")}
+    rows = {
+        "1": ["deposit", "1", f"player2={walletAddress(wallets['2'])}", f"oracle={walletAddress(wallets['3'])}", "1"],
+        "2": ["deposit2", "2", "0.5"],
+        "3": ["deposit2", "2", "1.0"]
+    }
+    profiles, errors = profileTrace("OracleBet", rows, CODE, STORAGE, wallets)
+    assert set(profiles) == {"deposit", "deposit2"}
+    assert list(errors) == ["2"] and "Amount incorrect" in errors["2"]
+    assert fixedCosts(profiles["deposit2"])
@@ -0,0 +1,57 @@
+import pytest
+from pytezos.crypto.key import Key
+from pytezos.michelson.forge import forge_address
+from pytezos.operation.forge import forge_operation_group
+from pytezos.rpc.errors import RpcError
+
+from contractUtils import entrypointCall, callInfoResult
+from mockNode import getChain, unforgeOperationGroup
+
+BRANCH = "BLockGenesisGenesisGenesisGenesisGenesisf79b5d1CoW2"
+
+def storage(client, address):
+    return client.contract(address).storage()
+
+def test_origination_and_calls_change_the_ledger(mockPool, deployOracleBet, walletAddress):
+    client = mockPool.getClient("1")
+    address = deployOracleBet()
+    assert storage(client, address)["player1"] is None
+
+    parameters = [f"player2={walletAddress('2')}", f"oracle={walletAddress('3')}"]
+    report = callInfoResult(entrypointCall(client, address, "deposit", parameters, 1))
+    assert "error" not in report and report["Gas"] > 0
+    assert storage(client, address)["player1"] == walletAddress("1")
+    assert client.contract(address).context.get_balance() == 1000000
+
+def test_rejected_call_leaves_the_storage_alone(mockPool, deployOracleBet):
+    client = mockPool.getClient("2")
+    address = deployOracleBet()
+    report = entrypointCall(client, address, "deposit2", [], 1)
+    assert "script_rejected" in report["error"]
+    assert "wait for player1 deposit first" in report["error"]
+    assert storage(client, address)["player2Deposit"] is False
+
+def test_replayed_operation_is_refused(mockPool, walletAddress):
+    client = mockPool.getClient("1")
+    signed = client.transaction(destination=walletAddress("2"), amount=1000).autofill().sign()
+    signed.inject()
+    with pytest.raises(RpcError, match="counter_in_the_past"):
+        signed.inject()
+
+def test_sources_round_trip_whatever_their_first_byte():
+    # a tz_only key hash starting with 0x00-0x04 looks like a curve tag
+    key = Key.generate(export=False)
+    while forge_address(key.public_key_hash())[2] > 4:
+        key = Key.generate(export=False)
+    pkh = key.public_key_hash()
+    content = {"kind": "transaction", "source": pkh, "fee": "400", "counter": "5", "gas_limit": "1000",
+               "storage_limit": "0", "amount": "1", "destination": pkh}
+    payload = forge_operation_group({"branch": BRANCH, "contents": [content]})
+    assert unforgeOperationGroup(payload + bytes(64))["contents"][0]["source"] == pkh
+
+def test_chain_clock_and_level_advance():
+    chain = getChain()
+    level, now = chain.head()["header"]["level"], chain.now()
+    chain.advance(seconds=3600, blocks=2)
+    assert chain.head()["header"]["level"] == level + 2
+    assert chain.now() >= now + 3600
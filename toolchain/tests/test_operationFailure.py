@@ -0,0 +1,53 @@
+from contractUtils import callInfoResult, batchInfoResult
+from estimateCache import isExhausted, operationFailure
+
+
+def transaction(status="applied", errors=(), internal=(), fee="656"):
+    result = {"status": status, "consumed_milligas": "2685000", "paid_storage_size_diff": "121"}
+    if errors:
+        result["errors"] = [{"id": error, "kind": "temporary"} for error in errors]
+    return {
+        "kind": "transaction", "source": "tz1aLPm3WynyHRXFvjjdHZDKEjHZVvQMGxqU", "fee": fee, "counter": "1",
+        "gas_limit": "3000", "storage_limit": "400", "amount": "0",
+        "destination": "KT18rj7BbbW6TyYjrA3aFANufnJZB3Pv3opG",
+        "metadata": {"operation_result": result,
+                     "internal_operation_results": [{"result": {"status": s}} for s in internal]}
+    }
+
+def receipt(*contents, limits="cached"):
+    return {"hash": "ooT8N33b4aD8aMcJvoAC8ezWYCkYG1h7MveJHXL1d7QhryzTXip", "contents": list(contents),
+            "limits": limits, "weight": 240, "weights": [240] * len(contents)}
+
+def test_applied_operation_is_a_cost_report():
+    report = callInfoResult(receipt(transaction()))
+    assert "error" not in report
+    assert report["Gas"] == 2685000
+    assert report["Storage"] == 121 * 250
+    assert report["Limits"] == "cached"
+
+def test_script_rejected_operation_is_an_error_report():
+    # sent with cached limits, included, fee paid, call not applied
+    opResult = receipt(transaction("failed", ["proto.alpha.michelson_v1.script_rejected"]))
+    assert operationFailure(opResult) == "failed: proto.alpha.michelson_v1.script_rejected"
+    assert not isExhausted(opResult)
+
+    report = callInfoResult(opResult)
+    assert report["error"] == "failed: proto.alpha.michelson_v1.script_rejected"
+    assert report["BakerFee"] == 656
+    assert "Gas" not in report
+
+def test_failed_internal_operation_fails_the_call():
+    opResult = receipt(transaction(internal=["applied", "backtracked"]))
+    assert operationFailure(opResult) == "backtracked"
+    assert "error" in callInfoResult(opResult)
+
+def test_exhausted_limits_are_told_apart():
+    opResult = receipt(transaction("failed", ["proto.alpha.gas_exhausted.operation"]))
+    assert isExhausted(opResult)
+    assert operationFailure(opResult).startswith("failed")
+
+def test_batch_reports_each_failed_content():
+    opResult = receipt(transaction(), transaction("backtracked"), transaction("skipped"))
+    reports = batchInfoResult(opResult)
+    assert ["error" in r for r in reports] == [False, True, True]
+    assert reports[1]["error"] == "backtracked"
@@ -0,0 +1,35 @@
+from execution import executionSetupAll
+from traceExecutor import isFailed
+
+
+def test_pipelined_traces_are_all_included(mockPool, deployOracleBet, betTrace, walletAddress):
+    # wallet 2 signs in both bets: its counter is kept locally between them
+    deployOracleBet("OracleBet")
+    deployOracleBet("OracleBet@second")
+    traces = {"OracleBet": betTrace("1", "2", "3"), "OracleBet@second": betTrace("2", "3", "1")}
+    counters = {w: int(mockPool.getClient(w).account()["counter"]) for w in ("1", "2", "3")}
+
+    done = []
+    results = executionSetupAll(traces, pipeline=3, onStepDone=lambda contract, stepId, result: done.append((contract, stepId)))
+    for contract in traces:
+        for result in results[contract].values():
+            assert not isFailed(result), result
+    assert done.index(("OracleBet", "2")) < done.index(("OracleBet@second", "1"))
+    assert {w: int(mockPool.getClient(w).account()["counter"]) - counters[w] for w in counters} == {"1": 1, "2": 2, "3": 1}
+
+def test_limits_come_from_the_simulation_on_a_miss(deployOracleBet, betTrace):
+    deployOracleBet("OracleBet")
+    deployOracleBet("OracleBet@second")
+    first = executionSetupAll({"OracleBet": betTrace("1", "2", "3")}, pipeline=2)["OracleBet"]
+    second = executionSetupAll({"OracleBet@second": betTrace("1", "2", "3")}, pipeline=2)["OracleBet@second"]
+    assert [r["Limits"] for r in first.values()] == ["simulated", "simulated"]
+    # same code, entrypoints and parameter shapes: the estimates are reused
+    assert [r["Limits"] for r in second.values()] == ["cached", "cached"]
+    assert all(r["BakerFee"] >= r["EstimatedFee"] for r in second.values())
+
+def test_rejected_step_fails_with_its_reason(deployOracleBet, betTrace):
+    deployOracleBet()
+    rows = dict(betTrace("1", "2", "3"), **{"3": ["withdraw", "1", "0"]})
+    results = executionSetupAll({"OracleBet": rows}, pipeline=2)["OracleBet"]
+    assert not isFailed(results["1"]) and not isFailed(results["2"])
+    assert "The oracle didn't select any winner yet" in results["3"]["error"]
@@ -0,0 +1,66 @@
+import pytest
+
+from regressionGate import compare, parseThresholds, summarizeReports, THRESHOLDS
+
+
+def report(contract="Auction", entryPoint="bid", mode="inject", network="mock", **metrics):
+    values = {"Gas": 1000000, "EstimatedFee": 500, "Storage": 0, "Weight": 200}
+    values.update(metrics)
+    return dict(values, contract=contract, entryPoint=entryPoint, mode=mode, network=network)
+
+def summary(*reports):
+    return summarizeReports(list(reports))
+
+def statuses(findings):
+    return {(f["key"], f["metric"]): f["status"] for f in findings}
+
+def test_medians_per_entrypoint():
+    current = summary(report(Gas=1000000), report(Gas=1200000), report(Gas=1100000))
+    entry = current["entrypoints"]["Auction.bid"]
+    assert entry["Gas"] == 1100000
+    assert entry["count"] == 3
+    assert current["network"] == "mock"
+
+def test_gas_within_threshold_passes():
+    baseline = summary(report(Gas=1000000))
+    assert compare(baseline, summary(report(Gas=1019000))) == []
+    assert statuses(compare(baseline, summary(report(Gas=1021000)))) == {("Auction.bid", "Gas"): "regression"}
+
+def test_thresholds_can_be_raised():
+    baseline = summary(report(Gas=1000000))
+    thresholds = parseThresholds(["Gas=0.05"])
+    assert thresholds["EstimatedFee"] == THRESHOLDS["EstimatedFee"]
+    assert compare(baseline, summary(report(Gas=1040000)), thresholds) == []
+    with pytest.raises(ValueError, match="unknown metric"):
+        parseThresholds(["Latency=1"])
+
+def test_weight_slack_absorbs_counter_growth():
+    # a longer zarith counter adds a byte or two: below the slack
+    baseline = summary(report(Weight=200))
+    assert compare(baseline, summary(report(Weight=208))) == []
+    assert statuses(compare(baseline, summary(report(Weight=209)))) == {("Auction.bid", "Weight"): "regression"}
+
+def test_any_storage_growth_is_a_regression():
+    baseline = summary(report(Storage=250))
+    assert statuses(compare(baseline, summary(report(Storage=500)))) == {("Auction.bid", "Storage"): "regression"}
+    assert statuses(compare(baseline, summary(report(Storage=0)))) == {("Auction.bid", "Storage"): "improvement"}
+
+def test_missing_and_new_entrypoints():
+    baseline = summary(report(entryPoint="bid"))
+    findings = statuses(compare(baseline, summary(report(entryPoint="close"))))
+    assert findings == {("Auction.bid", None): "missing", ("Auction.close", None): "new"}
+
+def test_incomplete_or_mixed_reports_are_rejected():
+    with pytest.raises(ValueError, match="without EstimatedFee"):
+        summary(report(EstimatedFee=None))
+    with pytest.raises(ValueError, match="several networks"):
+        summary(report(network="mock"), report(network="ghostnet"))
+    with pytest.raises(ValueError, match="several modes"):
+        summary(report(mode="inject"), report(mode="simulate"))
+
+def test_other_network_or_mode_is_not_comparable():
+    baseline = summary(report())
+    with pytest.raises(ValueError, match="baseline measured on"):
+        compare(baseline, summary(report(network="ghostnet")))
+    with pytest.raises(ValueError, match="mode"):
+        compare(baseline, summary(report(mode="simulate")))
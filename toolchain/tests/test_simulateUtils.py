@@ -0,0 +1,28 @@
+from pathlib import Path
+
+import pytest
+from pytezos.crypto.key import Key
+
+from simulateUtils import interpretTraceCsv, walletAddress
+
+CONTRACT_DIR = Path(__file__).resolve().parent.parent / "OracleBet"
+
+
+@pytest.fixture
+def interpretBet():
+    wallets = {w: Key.generate(export=False).secret_key() for w in ("1", "2", "3")}
+    code = (CONTRACT_DIR / "step_001_cont_0_contract.tz").read_text()
+    storage = (CONTRACT_DIR / "step_001_cont_0_storage.tz").read_text()
+    deposit = ["deposit", "1", f"player2={walletAddress(wallets['2'])}", f"oracle={walletAddress(wallets['3'])}", "1"]
+    return lambda rows: interpretTraceCsv("OracleBet", {"1": deposit, **rows}, code, storage, wallets)
+
+def test_interpreted_steps_thread_storage(interpretBet):
+    results = interpretBet({"2": ["deposit2", "2", "1"]})
+    assert [r["entryPoint"] for r in results.values()] == ["deposit", "deposit2"]
+    assert all("error" not in r for r in results.values())
+
+def test_bad_amounts_fail_their_step_only(interpretBet):
+    results = interpretBet({"2": ["deposit2", "2", "abc"], "3": ["deposit2", "2", "0.5"], "4": ["deposit2", "2", "1"]})
+    assert "invalid tez amount abc" in results["2"]["error"]
+    assert "Amount incorrect" in results["3"]["error"]
+    assert "error" not in results["4"]
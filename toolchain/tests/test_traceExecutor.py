@@ -0,0 +1,102 @@
+import threading
+import time
+
+from execution import executionSetupAll
+from traceExecutor import buildGraph, executeTraces, isFailed, scheduleTraces
+
+TRACES = {
+    "A": {"1": ["deposit", "1"], "2": ["deposit2", "2"]},
+    "B": {"1": ["deposit", "2"], "2": ["deposit2", "3"]},
+    "C": {"1": ["deposit", "4"]},
+}
+
+
+def test_steps_wait_for_their_contract_and_wallet():
+    steps, dependencies, dependents = buildGraph(TRACES)
+    assert steps == [("A", "1"), ("A", "2"), ("B", "1"), ("B", "2"), ("C", "1")]
+    assert dependencies[("A", "2")] == {("A", "1")}
+    # wallet 2 signs A.2 before B.1
+    assert dependencies[("B", "1")] == {("A", "2")}
+    assert dependencies[("B", "2")] == {("B", "1")}
+    assert dependencies[("C", "1")] == set()
+    assert dependents[("A", "1")] == [("A", "2")]
+
+def test_execution_respects_the_graph_and_overlaps_the_rest():
+    events = []
+    lock = threading.Lock()
+    # A.1 and C.1 are independent: both must be running at the same time
+    meet = threading.Barrier(2, timeout=5)
+
+    def runStep(contract, stepId, row):
+        with lock:
+            events.append(("start", contract, stepId))
+        if (contract, stepId) in (("A", "1"), ("C", "1")):
+            meet.wait()
+        time.sleep(0.01)
+        with lock:
+            events.append(("end", contract, stepId))
+        return {"contract": contract, "step": stepId}
+
+    results = executeTraces(TRACES, runStep, maxWorkers=4)
+    assert {c: list(steps) for c, steps in results.items()} == {"A": ["1", "2"], "B": ["1", "2"], "C": ["1"]}
+
+    _, dependencies, _ = buildGraph(TRACES)
+    for step, deps in dependencies.items():
+        for dep in deps:
+            assert events.index(("end", *dep)) < events.index(("start", *step))
+
+def test_failed_step_does_not_stop_the_run():
+    def runStep(contract, stepId, row):
+        if (contract, stepId) == ("A", "1"):
+            raise RuntimeError("node down")
+        return {"contract": contract, "step": stepId}
+
+    results = executeTraces(TRACES, runStep)
+    assert results["A"]["1"] == {"contract": "A", "step": "1", "error": "node down"}
+    assert not any(isFailed(results[c][s]) for c, s in [("A", "2"), ("B", "1"), ("B", "2"), ("C", "1")])
+
+def test_mock_traces_run_in_dependency_order(deployOracleBet, betTrace):
+    # wallet 2 is player 2 of the first bet and player 1 of the second one
+    deployOracleBet("OracleBet")
+    deployOracleBet("OracleBet@second")
+    traces = {"OracleBet": betTrace("1", "2", "3"), "OracleBet@second": betTrace("2", "3", "1")}
+
+    done = []
+    results = executionSetupAll(traces, maxWorkers=4, onStepDone=lambda contract, stepId, result: done.append((contract, stepId)))
+    for contract in traces:
+        for stepId, result in results[contract].items():
+            assert not isFailed(result), result
+            assert result["mode"] == "inject"
+    assert done.index(("OracleBet", "2")) < done.index(("OracleBet@second", "1"))
+
+##Timeline scheduling
+def recordingStep(events, lock, duration=0.02):
+    def runStep(trace, stepId, row):
+        start = time.monotonic()
+        time.sleep(duration)
+        with lock:
+            events[(trace, stepId)] = (start, time.monotonic(), row[1])
+        return {"contract": trace, "step": stepId}
+    return runStep
+
+def test_steps_are_due_after_their_waiting_time():
+    events, lock = {}, threading.Lock()
+    timelines = {"T": [("1", 0, ["a", "1"]), ("2", 2, ["b", "2"])]}
+    results = scheduleTraces(timelines, recordingStep(events, lock), timeScale=0.1)
+    assert list(results["T"]) == ["1", "2"]
+    assert events[("T", "2")][0] - events[("T", "1")][1] >= 0.2 - 0.01
+
+def test_waits_of_different_traces_overlap():
+    events, lock = {}, threading.Lock()
+    timelines = {trace: [("1", 3, ["a", trace]), ("2", 3, ["b", trace])] for trace in ("T", "U", "V")}
+    start = time.monotonic()
+    scheduleTraces(timelines, recordingStep(events, lock), timeScale=0.1)
+    # 0.6 s of waits per trace; run one after the other they would take 1.8 s
+    assert time.monotonic() - start < 1.2
+
+def test_due_steps_of_one_wallet_never_overlap():
+    events, lock = {}, threading.Lock()
+    timelines = {trace: [("1", 0, ["a", "1"]), ("2", 0, ["b", "1"])] for trace in ("T", "U")}
+    scheduleTraces(timelines, recordingStep(events, lock), maxWorkers=4)
+    spans = sorted((start, end) for start, end, _ in events.values())
+    assert all(previous[1] <= following[0] for previous, following in zip(spans, spans[1:]))
@@ -0,0 +1,64 @@
+from decimal import Decimal
+
+import pytest
+from pytezos.michelson.parse import michelson_to_micheline
+from pytezos.michelson.sections.parameter import ParameterSection
+
+from tracePlan import TracePlan, PlannedStep, typedArguments, typedValue, tezAmount
+
+PARAMETER = """parameter (or (pair %deposit (address %oracle) (nat %amount))
+                         (or (bool %flag)
+                             (or (option %maybe nat)
+                                 (or (pair %two int string) (mutez %fund)))))"""
+ORACLE = "tz1ZNfCeehri4t8oFNB187DDEAqtdu3Ayc1z"
+
+
+@pytest.fixture(scope="module")
+def types():
+    return ParameterSection.match(michelson_to_micheline(PARAMETER)).list_entrypoints()
+
+def test_scalar_cells_are_typed(types):
+    assert typedValue(types["fund"], "1500") == 1500
+    assert typedValue(types["flag"], "True") is True
+    assert typedValue(types["flag"], "false") is False
+    assert typedValue(types["maybe"], "None") is None
+    assert typedValue(types["maybe"], "7") == 7
+    # already typed values (JSON traces) are left alone
+    assert typedValue(types["fund"], 3) == 3
+
+def test_bad_cells_are_rejected(types):
+    with pytest.raises(ValueError):
+        typedValue(types["fund"], "1.5")
+    with pytest.raises(ValueError):
+        typedValue(types["flag"], "yes")
+
+def test_named_and_positional_arguments(types):
+    assert typedArguments(types["deposit"], [f"oracle={ORACLE}", "amount=10"]) == {"oracle": ORACLE, "amount": 10}
+    assert typedArguments(types["two"], ["-3", "text"]) == (-3, "text")
+    assert typedArguments(types["flag"], ["true"]) is True
+    assert typedArguments(types["flag"], []) is None
+
+def test_argument_mismatches_are_rejected(types):
+    with pytest.raises(ValueError, match="unknown parameters"):
+        typedArguments(types["deposit"], [f"oracle={ORACLE}", "value=10"])
+    with pytest.raises(ValueError, match="expected 2 parameters"):
+        typedArguments(types["two"], ["1", "a", "b"])
+    with pytest.raises(ValueError, match="named parameters"):
+        typedArguments(types["fund"], ["amount=1"])
+
+def test_tez_amounts_are_exact_to_the_mutez():
+    assert tezAmount("1") == Decimal("1")
+    assert tezAmount(" 0.000001 ") == Decimal("0.000001")
+    assert tezAmount(1.5) * 1000000 == 1500000
+    for cell in ("-1", "0.0000001", "one"):
+        with pytest.raises(ValueError):
+            tezAmount(cell)
+
+def test_plan_rejects_whole_contracts_and_is_read_only():
+    step = PlannedStep("deposit", "1", "KT1...", {}, Decimal(0))
+    plan = TracePlan({"Good": {"1": step}, "Bad": {"1": step}}, [("Bad", "2", "Wallet not found: 9")])
+
+    assert list(plan.runnable()) == ["Good"]
+    assert plan.rejected() == {"Bad": {"2": {"contract": "Bad", "step": "2", "error": "Wallet not found: 9"}}}
+    with pytest.raises(TypeError):
+        plan.traces["Good"]["2"] = step
@@ -0,0 +1,196 @@
+import heapq
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+MAX_WORKERS = 4
+
+##Dependency graph
+def stepWallet(row):
+    # CSV rows are [entrypoint, wallet, *parameters, tezAmount]
+    return str(row[1])
+
+def buildGraph(traces, walletOf=stepWallet):
+    # Every step is identified by (contract, stepId). A step depends on the
+    # previous step of the same contract (trace order) and on the previous
+    # step signed by the same wallet (counter/nonce order).
+    steps = []
+    dependencies = {}
+    lastByContract = {}
+    lastByWallet = {}
+
+    for contract in traces:
+        for stepId, row in traces[contract].items():
+            step = (contract, stepId)
+            wallet = walletOf(row)
+            deps = set()
+            if contract in lastByContract:
+                deps.add(lastByContract[contract])
+            if wallet is not None and wallet in lastByWallet:
+                deps.add(lastByWallet[wallet])
+
+            steps.append(step)
+            dependencies[step] = deps
+            lastByContract[contract] = step
+            if wallet is not None:
+                lastByWallet[wallet] = step
+
+    dependents = {step: [] for step in steps}
+    for step, deps in dependencies.items():
+        for dep in deps:
+            dependents[dep].append(step)
+
+    return steps, dependencies, dependents
+
+##Executor
+def executeTraces(traces, runStep, maxWorkers=MAX_WORKERS, walletOf=stepWallet, onStepDone=None):
+    # runStep(contract, stepId, row) -> infoResult
+    # Returns {contract: {stepId: infoResult}} in the original trace order,
+    # whatever the completion order was.
+    steps, dependencies, dependents = buildGraph(traces, walletOf=walletOf)
+    remaining = {step: len(dependencies[step]) for step in steps}
+    results = {}
+
+    def run(step):
+        contract, stepId = step
+        try:
+            return runStep(contract, stepId, traces[contract][stepId])
+        except Exception as e:
+            print(traceback.format_exc())
+            return {"contract": contract, "step": stepId, "error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=maxWorkers) as pool:
+        running = {}
+        for step in steps:
+            if remaining[step] == 0:
+                running[pool.submit(run, step)] = step
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                results[step] = future.result()
+                if onStepDone:
+                    onStepDone(step[0], step[1], results[step])
+
+                for dependent in dependents[step]:
+                    remaining[dependent] -= 1
+                    if remaining[dependent] == 0:
+                        running[pool.submit(run, dependent)] = dependent
+
+    ordered = {}
+    for contract, stepId in steps:
+        ordered.setdefault(contract, {})[stepId] = results[(contract, stepId)]
+    return ordered
+
+def isFailed(result):
+    return result is None or "error" in result
+
+##Batching
+def groupConsecutive(rows, walletOf=stepWallet):
+    # Consecutive rows signed by the same wallet form one group, keyed by the
+    # id of its first step: {groupId: [(stepId, row), ...]}
+    groups = {}
+    groupId = None
+    lastWallet = None
+    for stepId, row in rows.items():
+        wallet = walletOf(row)
+        if groupId is None or wallet != lastWallet:
+            groupId = stepId
+            groups[groupId] = []
+        groups[groupId].append((stepId, row))
+        lastWallet = wallet
+    return groups
+
+def executeBatchedTraces(traces, runBatch, maxWorkers=MAX_WORKERS, walletOf=stepWallet, onStepDone=None):
+    # runBatch(contract, groupId, [(stepId, row), ...]) -> {stepId: infoResult}
+    grouped = {contract: groupConsecutive(traces[contract], walletOf) for contract in traces}
+
+    def groupDone(contract, groupId, result):
+        for stepId, _ in grouped[contract][groupId]:
+            onStepDone(contract, stepId, result if isFailed(result) else result.get(stepId))
+
+    groupResults = executeTraces(grouped, runStep=runBatch, maxWorkers=maxWorkers,
+                                 walletOf=lambda group: walletOf(group[0][1]),
+                                 onStepDone=groupDone if onStepDone else None)
+
+    ordered = {}
+    for contract in traces:
+        ordered[contract] = {}
+        for groupId, group in grouped[contract].items():
+            result = groupResults[contract][groupId]
+            for stepId, _ in group:
+                if isFailed(result):
+                    ordered[contract][stepId] = result
+                else:
+                    ordered[contract][stepId] = result.get(stepId, {"contract": contract, "step": stepId, "error": "missing batch result"})
+    return ordered
+
+##Timeline scheduling
+def scheduleTraces(timelines, runStep, maxWorkers=MAX_WORKERS, walletOf=stepWallet, timeScale=1.0,
+                   clock=time.monotonic, onStepDone=None):
+    # timelines: {trace: [(stepId, waitingTime, row), ...]}. A step becomes
+    # due waitingTime seconds (times timeScale) after the previous step of its
+    # trace completed; due steps start as soon as their wallet is free. The
+    # loop only wakes up on completions or on the next due time, so the
+    # waits of different traces overlap instead of adding up.
+    results = {}
+    due = []
+    blocked = []
+    busyWallets = set()
+    order = 0
+
+    def run(trace, stepId, row):
+        try:
+            return runStep(trace, stepId, row)
+        except Exception as e:
+            print(traceback.format_exc())
+            return {"contract": trace, "step": stepId, "error": str(e)}
+
+    def schedule(trace, index, after):
+        nonlocal order
+        if index < len(timelines[trace]):
+            waitingTime = float(timelines[trace][index][1] or 0) * timeScale
+            heapq.heappush(due, (after + waitingTime, order, trace, index))
+            order += 1
+
+    start = clock()
+    for trace in timelines:
+        schedule(trace, 0, start)
+
+    with ThreadPoolExecutor(max_workers=maxWorkers) as pool:
+        running = {}
+        while due or blocked or running:
+            now = clock()
+            while due and due[0][0] <= now:
+                _, position, trace, index = heapq.heappop(due)
+                blocked.append((position, trace, index))
+            blocked.sort()
+
+            for entry in list(blocked):
+                _, trace, index = entry
+                stepId, _, row = timelines[trace][index]
+                wallet = walletOf(row)
+                if wallet is not None and wallet in busyWallets:
+                    continue
+                blocked.remove(entry)
+                if wallet is not None:
+                    busyWallets.add(wallet)
+                running[pool.submit(run, trace, stepId, row)] = (trace, index, wallet)
+
+            timeout = max(0.0, due[0][0] - clock()) if due else None
+            if not running:
+                time.sleep(timeout or 0)
+                continue
+
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                trace, index, wallet = running.pop(future)
+                stepId = timelines[trace][index][0]
+                results[(trace, stepId)] = future.result()
+                busyWallets.discard(wallet)
+                if onStepDone:
+                    onStepDone(trace, stepId, results[(trace, stepId)])
+                schedule(trace, index + 1, clock())
+
+    return {trace: {stepId: results[(trace, stepId)] for stepId, _, _ in steps} for trace, steps in timelines.items()}
@@ -0,0 +1,148 @@
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+from types import MappingProxyType
+
+from pytezos.michelson.sections.parameter import ParameterSection
+
+from clientPool import getReadClient, getPool
+from contractCache import getContract
+from contractUtils import entrypointAnalyse, parseParameters, MUTEZ_CONV
+from jsonUtils import getAddress, getAliases
+
+# One resolved trace row. Indexing matches the CSV row layout for the first
+# two fields (entrypoint, wallet), so traceExecutor's stepWallet still works;
+# parameters is the typed Micheline {entrypoint, value} sent as is.
+PlannedStep = namedtuple("PlannedStep", ["entrypoint", "wallet", "address", "parameters", "amount"])
+
+##Typed encoding
+def typedValue(ty, value):
+    # Trace cells are strings: convert them to the Python value pytezos
+    # expects for the Michelson type. Other types (address, string, bytes as
+    # hex, key_hash, ...) are taken as is.
+    if not isinstance(value, str):
+        return value
+    prim = ty.prim
+    if prim in ("nat", "int", "mutez"):
+        return int(value)
+    if prim == "bool":
+        if value.lower() not in ("true", "false"):
+            raise ValueError(f"expected true or false, got {value}")
+        return value.lower() == "true"
+    if prim == "timestamp" and value.isdigit():
+        return int(value)
+    if prim == "option":
+        return None if value in ("", "None") else typedValue(ty.args[0], value)
+    return value
+
+def tezAmount(cell):
+    # "1", "0.5" or 1.5 tez -> Decimal, exact down to the mutez
+    try:
+        amount = Decimal(str(cell).strip())
+    except InvalidOperation:
+        raise ValueError(f"invalid tez amount {cell}")
+    if amount < 0 or (amount * MUTEZ_CONV) % 1:
+        raise ValueError(f"invalid tez amount {cell}")
+    return amount
+
+def typedArguments(ty, cells):
+    # cells: the parameter cells of a row, "value" or "name=value"
+    parameters = parseParameters(list(cells))
+    if not parameters:
+        return None
+
+    if isinstance(parameters[0], dict):
+        fields = ty.get_flat_args() if ty.prim == "pair" else None
+        if not isinstance(fields, dict):
+            raise ValueError(f"named parameters given for an unnamed {ty.prim}")
+        unknown = set(parameters[0]) - set(fields)
+        if unknown:
+            raise ValueError(f"unknown parameters {sorted(unknown)}, expected {list(fields)}")
+        return {name: typedValue(fields[name], value) for name, value in parameters[0].items()}
+
+    if len(parameters) == 1:
+        return typedValue(ty, parameters[0])
+
+    fields = ty.get_flat_args(force_tuple=True) if ty.prim == "pair" else []
+    if len(fields) != len(parameters):
+        raise ValueError(f"expected {max(len(fields), 1)} parameters, got {len(parameters)}")
+    return tuple(typedValue(field, value) for field, value in zip(fields, parameters))
+
+##Planning
+class ContractPlanner:
+    # Everything resolved once per contract: address, interface, entrypoint
+    # schema and parameter types
+    def __init__(self, client, contract, address, walletIds):
+        self.contract = contract
+        self.address = address
+        self.walletIds = set(walletIds)
+        self.interface = getContract(client, address)
+        self.schema = entrypointAnalyse(client=client, contractAddress=address) or {}
+        self.types = ParameterSection.match(self.interface.context.parameter_expr).list_entrypoints()
+
+    def planStep(self, row):
+        entrypointSel = row[0]
+        walletSel = str(row[1])
+        if entrypointSel not in self.schema:
+            raise ValueError(f"Entrypoint not found: {entrypointSel}")
+        if walletSel not in self.walletIds:
+            raise ValueError(f"Wallet not found: {walletSel}")
+
+        amount = tezAmount(row[len(row)-1])
+        pyObject = typedArguments(self.types[entrypointSel], row[2:len(row)-1])
+        parameters = getattr(self.interface, entrypointSel).encode(pyObject)
+        return PlannedStep(entrypointSel, walletSel, self.address, parameters, amount)
+
+class TracePlan:
+    # Immutable result of buildPlan: {contract: {stepId: PlannedStep}} for the
+    # contracts whose rows all validated, and (contract, stepId, error) for
+    # the rows that did not.
+    def __init__(self, traces, errors):
+        self.traces = MappingProxyType({contract: MappingProxyType(dict(steps)) for contract, steps in traces.items()})
+        self.errors = tuple(errors)
+
+    def rejected(self):
+        # A contract with a bad row is not run at all: its later steps would
+        # depend on the one that cannot be sent
+        failed = {}
+        for contract, stepId, error in self.errors:
+            failed.setdefault(contract, {})[stepId] = {"contract": contract, "step": stepId, "error": error}
+        return failed
+
+    def runnable(self):
+        failed = {contract for contract, _, _ in self.errors}
+        return {contract: steps for contract, steps in self.traces.items() if contract not in failed}
+
+def buildPlan(contractExecutionTraces, client=None):
+    # contractExecutionTraces: {contract: {stepId: row}} as read by csvReader
+    client = client or getReadClient()
+    # traces may target a bulk instance by its alias
+    addressValid = dict(getAliases(), **getAddress())
+    walletIds = getPool().walletIds()
+
+    traces = {}
+    errors = []
+    for contract, rows in contractExecutionTraces.items():
+        if contract not in addressValid:
+            errors.extend((contract, stepId, "contract not deployed") for stepId in rows)
+            continue
+        try:
+            planner = ContractPlanner(client, contract, addressValid[contract], walletIds)
+        except Exception as e:
+            errors.extend((contract, stepId, f"contract not loaded: {e}") for stepId in rows)
+            continue
+
+        traces[contract] = {}
+        for stepId, row in rows.items():
+            try:
+                traces[contract][stepId] = planner.planStep(row)
+            except Exception as e:
+                errors.append((contract, stepId, str(e)))
+
+    return TracePlan(traces, errors)
+
+def planRow(contract, row, client=None):
+    # Single-row plan for interactive calls and jobs; raises on a bad row
+    plan = buildPlan({contract: {None: row}}, client=client)
+    if plan.errors:
+        raise Exception(plan.errors[0][2])
+    return plan.traces[contract][None]